@@ -1,27 +1,41 @@
 import os
 import sys
 import json
-from flask import Flask, request, jsonify
+import hmac
+from functools import wraps
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import cv2
 import numpy as np
 from PIL import Image
-import tensorflow as tf
 import io
+import time
+from datetime import datetime
 import base64
+import hashlib
 
 # Import configuration
 from config import get_config
-from utils import allowed_file, get_safe_filename
+from utils import allowed_file, get_safe_filename, keyset_paginate, page_limit
+from image_store import ImageStore, is_digest
+import child_summary
 from ai_chatbot import AIChatbot
 
 # Add parent directory to path so we can import ml_model
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from ml_model.autism_detector import AutismDetector
+from ml_model.model_registry import ModelRegistry, ModelHotReloader
+from ml_model.ensemble import parse_member_specs
+from ml_model.explain import AnalysisNotFound, Explainer
+from ml_model.scheduler import (BACKGROUND, BATCH, INTERACTIVE, PriorityScheduler,
+                                parse_lane_settings)
+from inference_client import InferenceClient, InferenceError, InferenceUnavailable
+from job_queue import JobQueue, JobFailed, DONE, FAILED
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -39,9 +53,150 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Initialize extensions
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
+image_store = ImageStore(config_obj.IMAGE_STORE_DIR, config_obj.THUMBNAIL_SIZES)
 
 # Initialize ML model
-autism_detector = AutismDetector()
+model_registry = ModelRegistry(config_obj.MODEL_REGISTRY_DIR)
+if config_obj.INFERENCE_SOCKET:
+    # Inference runs in ml_model/inference_server.py; this process never
+    # imports TensorFlow
+    inference_client = InferenceClient(
+        config_obj.INFERENCE_SOCKET,
+        pool_size=config_obj.INFERENCE_POOL_SIZE,
+        timeout=config_obj.INFERENCE_TIMEOUT,
+        retries=config_obj.INFERENCE_RETRIES
+    )
+    autism_detector = None
+    model_reloader = None
+    analysis_scheduler = None
+else:
+    # The face detectors load here; the CNN (and TensorFlow's device setup) is
+    # loaded by load_serving_model(), which gunicorn runs in each worker after fork
+    from ml_model.autism_detector import AutismDetector
+    inference_client = None
+    # Interactive uploads, queued jobs and background work share the CPU by lane
+    analysis_scheduler = PriorityScheduler(
+        config_obj.ANALYSIS_CONCURRENCY,
+        weights=parse_lane_settings(config_obj.LANE_WEIGHTS),
+        caps=parse_lane_settings(config_obj.LANE_CAPS, int)
+    )
+    autism_detector = AutismDetector(init_model=False, variant=config_obj.MODEL_VARIANT)
+    model_reloader = ModelHotReloader(autism_detector, model_registry, config_obj.MODEL_REGISTRY_POLL_SECONDS)
+    explainer = Explainer(
+        autism_detector, image_store, config_obj.ANALYSIS_CACHE_DIR,
+        max_prepared=config_obj.ANALYSIS_CACHE_SIZE,
+        max_age=config_obj.ANALYSIS_CACHE_TTL,
+        max_bytes=int(config_obj.ANALYSIS_CACHE_MAX_MB * 1024 * 1024)
+    )
+
+def load_serving_model():
+    """Load the registry's active version, or the model file if there is none"""
+    if model_reloader:
+        model_reloader.load_initial()
+        if config_obj.ENSEMBLE_MODELS:
+            autism_detector.load_ensemble(
+                parse_member_specs(config_obj.ENSEMBLE_MODELS),
+                primary_weight=config_obj.ENSEMBLE_PRIMARY_WEIGHT,
+                deadline_ms=config_obj.ENSEMBLE_DEADLINE_MS
+            )
+        if config_obj.SHADOW_MODEL_PATH:
+            autism_detector.load_shadow(
+                config_obj.SHADOW_MODEL_PATH,
+                config_obj.SHADOW_LOG_PATH,
+                sample_rate=config_obj.SHADOW_SAMPLE_RATE,
+                max_queue=config_obj.SHADOW_QUEUE_SIZE,
+                scheduler=analysis_scheduler
+            )
+
+def decode_image(image_bytes):
+    """Uploaded image bytes as an RGB array; ValueError if they aren't an image"""
+    try:
+        return np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+    except OSError as e:  # Includes PIL's UnidentifiedImageError
+        raise ValueError(f"Could not read the image: {e}")
+
+def run_analysis(image_bytes, owner, lane=INTERACTIVE):
+    """AutismDetector.predict result for image bytes uploaded by owner (a user id)"""
+    if inference_client:
+        return inference_client.analyze(image_bytes, lane, owner)
+    image_array = decode_image(image_bytes)
+    with analysis_scheduler.slot(lane):
+        result, prepared = autism_detector.predict(image_array, return_prepared=True)
+    if prepared is not None and result['status'] != 'error':
+        # Lets /api/analyze/<analysis_id>/explanation find the image
+        analysis_id = explainer.remember(image_bytes, prepared, owner)
+        if analysis_id:
+            result['analysis_id'] = analysis_id
+    return result
+
+def run_multi_analysis(images, owner, lane=INTERACTIVE):
+    """Per-image results and their aggregate for several photos of one child"""
+    if inference_client:
+        return inference_client.analyze_multi(images, lane, owner)
+    arrays = [decode_image(image_bytes) for image_bytes in images]
+    with analysis_scheduler.slot(lane):
+        results, prepared_inputs = autism_detector.predict_batch(arrays, return_prepared=True)
+    for image_bytes, result, prepared in zip(images, results, prepared_inputs):
+        analysis_id = explainer.remember(image_bytes, prepared, owner) if prepared is not None else None
+        if analysis_id:
+            result['analysis_id'] = analysis_id
+    return {'results': results, 'aggregate': autism_detector.aggregate_results(results)}
+
+def run_explanation(analysis_id, owner, lane=BACKGROUND):
+    """Grad-CAM heatmap of one of the owner's analyses as (png bytes, etag)"""
+    if inference_client:
+        return inference_client.explain(analysis_id, owner, lane)
+    with analysis_scheduler.slot(lane):
+        return explainer.explain(analysis_id, owner)
+
+def serving_status():
+    """Served model of this process, or of the inference server"""
+    if inference_client:
+        try:
+            return inference_client.status()['model']
+        except (InferenceError, InferenceUnavailable) as e:
+            return {'error': str(e)}
+    return model_reloader.status()
+
+def lane_status():
+    """Slots, waiting work and wait p95 per priority lane"""
+    if inference_client:
+        try:
+            return inference_client.status()['lanes']
+        except (InferenceError, InferenceUnavailable) as e:
+            return {'error': str(e)}
+    return analysis_scheduler.stats()
+
+def model_loaded():
+    if inference_client:
+        try:
+            return inference_client.status()['model_loaded']
+        except (InferenceError, InferenceUnavailable):
+            return False
+    return autism_detector.model is not None
+
+def run_analysis_job(image_bytes, user_id):
+    """Job handler of the analysis queue; the result is the /api/analyze body"""
+    try:
+        result = run_analysis(image_bytes, user_id, BATCH)
+    except ValueError as e:
+        # Not an image; retrying won't help
+        raise JobFailed(str(e))
+    body, status_code = analysis_response(result)
+    if status_code != 200:
+        raise JobFailed(body['error'], body)
+    return body
+
+job_queue = JobQueue(
+    config_obj.JOB_QUEUE_PATH,
+    run_analysis_job,
+    workers=config_obj.JOB_WORKERS,
+    max_attempts=config_obj.JOB_MAX_ATTEMPTS
+)
+
+if not config_obj.DEFER_MODEL_LOAD:
+    load_serving_model()
+    job_queue.start()
 
 # Initialize AI Chatbot (Google Gemini)
 gemini_api_key = config_obj.GEMINI_API_KEY
@@ -70,23 +225,99 @@ class User(db.Model):
 
 class Child(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    parent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    parent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     name = db.Column(db.String(255), nullable=False)
     age = db.Column(db.Integer)
     gender = db.Column(db.String(10))
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     assessments = db.relationship('Assessment', backref='child', lazy=True, cascade='all, delete-orphan')
     notes = db.relationship('Note', backref='child', lazy=True, cascade='all, delete-orphan')
+    summary = db.relationship('ChildAssessmentSummary', uselist=False, cascade='all, delete-orphan')
 
 class Assessment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     child_id = db.Column(db.Integer, db.ForeignKey('child.id'), nullable=False)
-    assessment_date = db.Column(db.DateTime, default=db.func.current_timestamp())
+    # Set in Python so every value has the same stored form (see keyset_paginate)
+    assessment_date = db.Column(db.DateTime, default=datetime.utcnow)
     autism_score = db.Column(db.Float)  # Probability score
-    facial_features = db.Column(db.Text)  # JSON string
+    facial_features = db.Column(db.Text)  # JSON string, rows saved before AssessmentFeature only
     status = db.Column(db.String(20))  # 'positive', 'negative', 'inconclusive'
     image_path = db.Column(db.String(500))
-    recommendations = db.Column(db.Text)  # JSON string
+    recommendations = db.Column(db.Text)  # JSON string, rows saved before AssessmentRecommendation only
+    job_id = db.Column(db.String(32))  # Analysis job the result came from; saved once
+    features = db.relationship('AssessmentFeature', uselist=False, lazy='joined', cascade='all, delete-orphan')
+    recommendation_links = db.relationship('AssessmentRecommendation', order_by='AssessmentRecommendation.position',
+                                           cascade='all, delete-orphan')
+    __table_args__ = (
+        db.Index('ix_assessment_child_date', 'child_id', 'assessment_date', 'id'),
+        db.Index('ix_assessment_job_id', 'job_id', unique=True),
+    )
+    
+    def feature_dict(self):
+        """facial_features as saved, without the columns that were not set"""
+        if self.features is None:
+            return json.loads(self.facial_features) if self.facial_features else {}
+        return {name: getattr(self.features, name) for name in FEATURE_COLUMNS
+                if getattr(self.features, name) is not None}
+    
+    def recommendation_list(self):
+        if not self.recommendation_links and self.recommendations:
+            return json.loads(self.recommendations)
+        return [link.recommendation.text for link in self.recommendation_links]
+
+# Keys of an analysis result's facial_features stored in AssessmentFeature
+FEATURE_COLUMNS = ('face_count', 'eye_contact', 'face_symmetry', 'expression_intensity', 'face_area_ratio',
+                   'head_position')
+
+class AssessmentFeature(db.Model):
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), primary_key=True)
+    face_count = db.Column(db.Integer)
+    eye_contact = db.Column(db.Float)
+    face_symmetry = db.Column(db.Float)
+    expression_intensity = db.Column(db.Float)
+    face_area_ratio = db.Column(db.Float)
+    head_position = db.Column(db.String(20))
+    confidence = db.Column(db.Float)
+    model_version = db.Column(db.String(100))
+
+class Recommendation(db.Model):
+    # One row per distinct text; assessments link to it
+    id = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.String(1000), nullable=False, unique=True)
+
+class AssessmentRecommendation(db.Model):
+    assessment_id = db.Column(db.Integer, db.ForeignKey('assessment.id'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    recommendation_id = db.Column(db.Integer, db.ForeignKey('recommendation.id'), nullable=False)
+    recommendation = db.relationship('Recommendation', lazy='joined')
+
+class ChildAssessmentSummary(db.Model):
+    """Running statistics of a child's assessments, see child_summary.py"""
+    child_id = db.Column(db.Integer, db.ForeignKey('child.id'), primary_key=True)
+    assessment_count = db.Column(db.Integer, nullable=False, default=0)
+    first_assessment_at = db.Column(db.DateTime)
+    latest_assessment_at = db.Column(db.DateTime)
+    latest_score = db.Column(db.Float)
+    latest_status = db.Column(db.String(20))
+    positive_count = db.Column(db.Integer, default=0)
+    inconclusive_count = db.Column(db.Integer, default=0)
+    negative_count = db.Column(db.Integer, default=0)
+    score_count = db.Column(db.Integer, default=0)
+    score_mean = db.Column(db.Float)
+    score_m2 = db.Column(db.Float)
+    score_ema = db.Column(db.Float)
+    eye_contact_count = db.Column(db.Integer, default=0)
+    eye_contact_mean = db.Column(db.Float)
+    eye_contact_m2 = db.Column(db.Float)
+    face_symmetry_count = db.Column(db.Integer, default=0)
+    face_symmetry_mean = db.Column(db.Float)
+    face_symmetry_m2 = db.Column(db.Float)
+    expression_intensity_count = db.Column(db.Integer, default=0)
+    expression_intensity_mean = db.Column(db.Float)
+    expression_intensity_m2 = db.Column(db.Float)
+    face_area_ratio_count = db.Column(db.Integer, default=0)
+    face_area_ratio_mean = db.Column(db.Float)
+    face_area_ratio_m2 = db.Column(db.Float)
 
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -94,14 +325,16 @@ class Note(db.Model):
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     note_type = db.Column(db.String(50))  # 'observation', 'milestone', 'concern'
     content = db.Column(db.Text)
+    __table_args__ = (db.Index('ix_note_child_created', 'child_id', 'created_at'),)
 
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text)
     response = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user = db.relationship('User', backref='chat_messages')
+    __table_args__ = (db.Index('ix_chat_message_user_created', 'user_id', 'created_at', 'id'),)
 
 # ============== ROOT ROUTE ==============
 
@@ -116,6 +349,8 @@ def root():
             'register': '/api/auth/register',
             'login': '/api/auth/login',
             'analyze': '/api/analyze',
+            'explanation': '/api/analyze/<analysis_id>/explanation',
+            'analysis_jobs': '/api/analyze/jobs',
             'chat': '/api/chat',
             'chat_history': '/api/chat/history',
             'chat_suggestions': '/api/chat/suggestions'
@@ -126,7 +361,8 @@ def root():
 def health():
     return jsonify({
         'status': 'healthy',
-        'service': 'Autism Detection Platform API'
+        'service': 'Autism Detection Platform API',
+        'model_loaded': model_loaded()
     }), 200
 
 # ============== AUTHENTICATION ROUTES ==============
@@ -211,7 +447,7 @@ def get_profile():
             'email': user.email,
             'full_name': user.full_name,
             'phone': user.phone,
-            'children_count': len(user.children)
+            'children_count': Child.query.filter_by(parent_id=user.id).count()
         }), 200
     
     except Exception as e:
@@ -235,31 +471,365 @@ def analyze_image():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Allowed: jpg, jpeg, png, gif, bmp'}), 400
         
-        # Read and process image
-        image = Image.open(file.stream).convert('RGB')
-        image_array = np.array(image)
+        # Optional: save the result as an assessment of this child right away
+        child = None
+        if request.form.get('child_id'):
+            if not request.form['child_id'].isdigit():
+                return jsonify({'error': 'Child ID must be a number'}), 400
+            child = Child.query.filter_by(id=int(request.form['child_id']), parent_id=get_jwt_identity()).first()
+            if not child:
+                return jsonify({'error': 'Child not found'}), 404
         
         # Detect faces and analyze
-        result = autism_detector.predict(image_array)
+        image_bytes = file.read()
+        result = run_analysis(image_bytes, get_jwt_identity())
+        body, status_code = analysis_response(result)
         
-        if result['status'] == 'no_face_detected':
-            return jsonify({
-                'error': 'Make Sure the face is clearly visible with eyes open in the image.',
+        if child and status_code == 200:
+            assessment = new_assessment(
+                child.id, result['score'], result['status'], result['features'], result['recommendations'],
+                image_path=image_store.put(image_bytes), confidence=result['confidence'],
+                model_version=result.get('model_version')
+            )
+            db.session.add(assessment)
+            db.session.commit()
+            body['assessment_id'] = assessment.id
+        
+        return jsonify(body), status_code
+    
+    except ValueError as e:
+        # Not an image (from this process or the inference server)
+        return jsonify({'error': str(e)}), 400
+    
+    except InferenceUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def analysis_response(result):
+    """/api/analyze response body and status code for a prediction result"""
+    if result['status'] == 'no_face_detected':
+        return {
+            'error': 'Make Sure the face is clearly visible with eyes open in the image.',
+            'recommendations': result['recommendations']
+        }, 400
+    
+    response = {
+        'success': True,
+        'autism_score': float(result['score']),
+        'status': result['status'],
+        'facial_features': result['features'],
+        'recommendations': result['recommendations'],
+        'confidence': float(result['confidence'])
+    }
+    if 'ensemble' in result:
+        # Member scores and the members left out of the vote
+        response['ensemble'] = result['ensemble']
+    if 'analysis_id' in result:
+        response['analysis_id'] = result['analysis_id']
+    return response, 200
+
+@app.route('/api/analyze/jobs', methods=['POST'])
+@jwt_required()
+def submit_analysis_job():
+    """Queue an image for analysis; poll the job or stream its events for the result"""
+    try:
+        user_id = get_jwt_identity()
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image provided'}), 400
+        
+        file = request.files['image']
+        
+        if file.filename == '':
+            return jsonify({'error': 'No image selected'}), 400
+        
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Allowed: jpg, jpeg, png, gif, bmp'}), 400
+        
+        image_bytes = file.read()
+        # A retried request returns the job it already created
+        idempotency_key = request.headers.get('Idempotency-Key') or hashlib.sha256(image_bytes).hexdigest()
+        job, created = job_queue.submit(user_id, image_bytes, idempotency_key)
+        
+        return jsonify({
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': f"/api/analyze/jobs/{job['id']}",
+            'events_url': f"/api/analyze/jobs/{job['id']}/events"
+        }), 202 if created else 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def job_response(job):
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'queued_seconds': round((job['started_at'] or time.time()) - job['created_at'], 3)
+    }
+    if job['finished_at']:
+        response['duration_seconds'] = round(job['finished_at'] - job['created_at'], 3)
+    if job['status'] in (DONE, FAILED):
+        response['result'] = job['result']
+        response['error'] = job['error']
+    return response
+
+@app.route('/api/analyze/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_analysis_job(job_id):
+    try:
+        job = job_queue.get(job_id, get_jwt_identity())
+        
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job_response(job)), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze/jobs/<job_id>/events', methods=['GET'])
+@jwt_required()
+def stream_analysis_job(job_id):
+    """
+    Server-sent events: the job on every status change, until it finishes
+    
+    A stream holds a request thread, so it ends with a timeout event after
+    JOB_EVENTS_TIMEOUT seconds; EventSource clients reconnect on their own
+    after the retry delay.
+    """
+    user_id = get_jwt_identity()
+    if not job_queue.get(job_id, user_id):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        deadline = time.monotonic() + config_obj.JOB_EVENTS_TIMEOUT
+        last_status, polls = None, 0
+        yield "retry: 1000\n\n"
+        while time.monotonic() < deadline:
+            job = job_queue.get(job_id, user_id)
+            if job is None:
+                # Purged while the stream was open
+                yield f"event: not_found\ndata: {json.dumps({'job_id': job_id, 'error': 'Job not found'})}\n\n"
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"event: {last_status}\ndata: {json.dumps(job_response(job))}\n\n"
+                if last_status in (DONE, FAILED):
+                    return
+            elif polls % 30 == 0:
+                # Keeps proxies from closing an idle connection
+                yield ": waiting\n\n"
+            polls += 1
+            time.sleep(0.5)
+        yield "event: timeout\ndata: {}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/analyze/multi', methods=['POST'])
+@jwt_required()
+def analyze_multiple_images():
+    """Analyze several photos of one child and combine them into one result"""
+    try:
+        user_id = get_jwt_identity()
+        files = request.files.getlist('images')
+        
+        if not files or all(f.filename == '' for f in files):
+            return jsonify({'error': 'No images provided'}), 400
+        
+        if len(files) > config_obj.MULTI_ANALYSIS_MAX_IMAGES:
+            return jsonify({'error': f'At most {config_obj.MULTI_ANALYSIS_MAX_IMAGES} images per request'}), 400
+        
+        for file in files:
+            if not allowed_file(file.filename):
+                return jsonify({'error': f'Invalid file type: {file.filename}. Allowed: jpg, jpeg, png, gif, bmp'}), 400
+        
+        # Optional: save the combined result as an assessment of this child
+        child = None
+        if request.form.get('child_id'):
+            if not request.form['child_id'].isdigit():
+                return jsonify({'error': 'Child ID must be a number'}), 400
+            child = Child.query.filter_by(id=int(request.form['child_id']), parent_id=user_id).first()
+            if not child:
+                return jsonify({'error': 'Child not found'}), 404
+        
+        # All photos go through one batched model pass
+        analysis = run_multi_analysis([file.read() for file in files], user_id)
+        aggregate = analysis['aggregate']
+        
+        images = []
+        for file, result in zip(files, analysis['results']):
+            image = {
+                'filename': file.filename,
+                'status': result['status'],
+                'autism_score': float(result['score']),
+                'confidence': float(result['confidence']),
+                'facial_features': result['features'],
                 'recommendations': result['recommendations']
+            }
+            if 'analysis_id' in result:
+                image['analysis_id'] = result['analysis_id']
+            images.append(image)
+        
+        if aggregate is None:
+            return jsonify({
+                'error': 'Make Sure the face is clearly visible with eyes open in at least one image.',
+                'images': images
             }), 400
         
-        return jsonify({
+        response = {
             'success': True,
-            'autism_score': float(result['score']),
-            'status': result['status'],
-            'facial_features': result['features'],
-            'recommendations': result['recommendations'],
-            'confidence': float(result['confidence'])
+            'autism_score': aggregate['score'],
+            'median_score': aggregate['median_score'],
+            'score_range': aggregate['score_range'],
+            'status': aggregate['status'],
+            'confidence': aggregate['confidence'],
+            'agreement': aggregate['agreement'],
+            'images_scored': aggregate['images_scored'],
+            'facial_features': aggregate['features'],
+            'recommendations': aggregate['recommendations'],
+            'images': images
+        }
+        
+        if child:
+            assessment = new_assessment(
+                child.id, aggregate['score'], aggregate['status'], aggregate['features'],
+                aggregate['recommendations'], confidence=aggregate['confidence'],
+                model_version=aggregate.get('model_version')
+            )
+            db.session.add(assessment)
+            db.session.commit()
+            response['assessment_id'] = assessment.id
+        
+        return jsonify(response), 200
+    
+    except ValueError as e:
+        # Not an image (from this process or the inference server)
+        return jsonify({'error': str(e)}), 400
+    
+    except InferenceUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analyze/<analysis_id>/explanation', methods=['GET'])
+@jwt_required()
+def get_explanation(analysis_id):
+    """Grad-CAM heatmap PNG of which facial regions drove the score"""
+    try:
+        # Computed on the first request, then served from the analysis
+        # cache; only the user who uploaded the image can fetch it
+        png, etag = run_explanation(analysis_id, get_jwt_identity())
+        
+        response = send_file(io.BytesIO(png), mimetype='image/png')
+        response.headers['Cache-Control'] = 'private, max-age=86400'
+        if etag:
+            response.set_etag(etag)
+            response.make_conditional(request)
+        return response
+    
+    except AnalysisNotFound:
+        return jsonify({'error': 'Analysis not found. Please analyze the image again.'}), 404
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    
+    except InferenceUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ============== ADMIN ROUTES ==============
+
+def admin_required(f):
+    """Require the X-Admin-Token header to match ADMIN_TOKEN"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not config_obj.ADMIN_TOKEN:
+            return jsonify({'error': 'Admin API is disabled. Set ADMIN_TOKEN to enable it.'}), 403
+        token = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(token, config_obj.ADMIN_TOKEN):
+            return jsonify({'error': 'Invalid admin token'}), 401
+        return f(*args, **kwargs)
+    
+    return decorated
+
+@app.route('/api/admin/models', methods=['GET'])
+@admin_required
+def list_models():
+    try:
+        return jsonify({
+            'versions': model_registry.versions(),
+            **serving_status()
         }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/models/<version>/activate', methods=['POST'])
+@admin_required
+def activate_model(version):
+    try:
+        if version not in [v['version'] for v in model_registry.versions()]:
+            return jsonify({'error': 'Model version not found'}), 404
+        
+        # Loading and warm-up happen in the background; the current model
+        # keeps serving until the new one is swapped in
+        if model_reloader:
+            model_reloader.run_in_background(model_reloader.activate, version)
+        else:
+            # The inference server follows the registry
+            model_registry.activate(version)
+        
+        return jsonify({
+            'message': f'Loading model {version}',
+            **serving_status()
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/jobs', methods=['GET'])
+@admin_required
+def analysis_job_stats():
+    """Queue depth and latency of the analysis job queue, and the priority lanes"""
+    try:
+        stats = job_queue.stats()
+        stats['lanes'] = lane_status()
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/models/rollback', methods=['POST'])
+@admin_required
+def rollback_model():
+    try:
+        previous = model_registry.previous_version()
+        if not previous:
+            return jsonify({'error': 'No previous model version to roll back to'}), 400
+        
+        if model_reloader:
+            model_reloader.run_in_background(model_reloader.rollback)
+        else:
+            model_registry.rollback()
+        
+        return jsonify({
+            'message': f'Rolling back to model {previous}',
+            **serving_status()
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============== CHILD PROFILE ROUTES ==============
 
 @app.route('/api/children', methods=['POST'])
@@ -301,7 +871,11 @@ def add_child():
 def get_children():
     try:
         user_id = int(get_jwt_identity())
-        children = Child.query.filter_by(parent_id=user_id).all()
+        # Counted in the same statement rather than loading each child's assessments
+        assessments_count = db.session.query(db.func.count(Assessment.id)).filter(
+            Assessment.child_id == Child.id
+        ).correlate(Child).scalar_subquery()
+        children = db.session.query(Child, assessments_count).filter(Child.parent_id == user_id).all()
         
         return jsonify({
             'children': [{
@@ -309,8 +883,8 @@ def get_children():
                 'name': child.name,
                 'age': child.age,
                 'gender': child.gender,
-                'assessments_count': len(child.assessments)
-            } for child in children]
+                'assessments_count': count
+            } for child, count in children]
         }), 200
     
     except Exception as e:
@@ -321,7 +895,9 @@ def get_children():
 def get_child_details(child_id):
     try:
         user_id = get_jwt_identity()
-        child = Child.query.filter_by(id=child_id, parent_id=user_id).first()
+        child = Child.query.options(
+            selectinload(Child.assessments).selectinload(Assessment.recommendation_links), selectinload(Child.notes)
+        ).filter_by(id=child_id, parent_id=user_id).first()
         
         if not child:
             return jsonify({'error': 'Child not found'}), 404
@@ -331,7 +907,8 @@ def get_child_details(child_id):
             'date': a.assessment_date.isoformat(),
             'score': a.autism_score,
             'status': a.status,
-            'recommendations': json.loads(a.recommendations) if a.recommendations else []
+            'recommendations': a.recommendation_list(),
+            'image_url': image_url(a.image_path)
         } for a in child.assessments]
         
         notes = [{
@@ -357,6 +934,73 @@ def get_child_details(child_id):
 
 # ============== ASSESSMENT ROUTES ==============
 
+def image_url(image_path):
+    """URL of an assessment image in the image store, None for other paths"""
+    digest = image_store.digest_of(image_path)
+    return f'/api/images/{digest}' if digest else None
+
+def locked_child_summary(child_id):
+    """
+    The child's summary row, created if it is missing, for an update in this transaction
+    
+    The row is made with INSERT ... ON CONFLICT DO NOTHING, so concurrent
+    first saves for a child don't both insert it. On PostgreSQL the select
+    then locks the row; SQLite has no row locks, but the insert already
+    took the database's write lock, which holds until the transaction ends.
+    """
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        summary = ChildAssessmentSummary.query.filter_by(child_id=child_id).with_for_update().first()
+        if summary is None:
+            summary = ChildAssessmentSummary(child_id=child_id)
+            db.session.add(summary)
+        return summary
+    
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    db.session.execute(
+        insert(ChildAssessmentSummary).values(child_id=child_id).on_conflict_do_nothing(index_elements=['child_id'])
+    )
+    return ChildAssessmentSummary.query.filter_by(child_id=child_id).with_for_update().one()
+
+def new_assessment(child_id, score, status, features, recommendations, image_path=None,
+                   confidence=None, model_version=None):
+    """Assessment row for a result; the caller adds it to the session"""
+    features = features if isinstance(features, dict) else {}
+    recommendations = [str(text) for text in recommendations or []]
+    # Texts seen before are shared; new ones are added with the assessment
+    shared = {}
+    if recommendations:
+        shared = {r.text: r for r in Recommendation.query.filter(Recommendation.text.in_(recommendations))}
+    for text in recommendations:
+        if text not in shared:
+            shared[text] = Recommendation(text=text)
+            db.session.add(shared[text])
+    
+    # Counted in the child's summary in the same transaction
+    summary = locked_child_summary(child_id)
+    assessed_at = datetime.utcnow()
+    child_summary.add_assessment(summary, score, status, features, assessed_at, config_obj.SCORE_TREND_ALPHA)
+    
+    return Assessment(
+        child_id=child_id,
+        assessment_date=assessed_at,
+        autism_score=score,
+        status=status,
+        image_path=image_path,
+        features=AssessmentFeature(
+            confidence=confidence,
+            model_version=model_version,
+            **{name: features.get(name) for name in FEATURE_COLUMNS}
+        ),
+        recommendation_links=[
+            AssessmentRecommendation(position=i, recommendation=shared[text])
+            for i, text in enumerate(recommendations)
+        ]
+    )
+
 @app.route('/api/assessment/save', methods=['POST'])
 @jwt_required()
 def save_assessment():
@@ -364,21 +1008,84 @@ def save_assessment():
         user_id = get_jwt_identity()
         data = request.get_json()
         
+        # Several finished analysis jobs ({"assessments": [{"child_id", "job_id"}, ...]})
+        # are saved in one transaction, with the results the server computed
+        if data and isinstance(data.get('assessments'), list):
+            items = data['assessments']
+            if not items or any(not isinstance(item, dict) or not item.get('child_id') or not item.get('job_id')
+                                for item in items):
+                return jsonify({'error': 'Child ID and job ID are required for every assessment'}), 400
+            
+            try:
+                child_ids = {int(item['child_id']) for item in items}
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Child ID must be a number'}), 400
+            owned = {child.id for child in Child.query.filter(
+                Child.id.in_(child_ids), Child.parent_id == user_id
+            ).with_entities(Child.id)}
+            if owned != child_ids:
+                return jsonify({'error': 'Child not found'}), 404
+            
+            job_ids = [str(item['job_id']) for item in items]
+            if len(set(job_ids)) != len(job_ids):
+                return jsonify({'error': 'A job can only be saved once'}), 409
+            saved = {a.job_id for a in Assessment.query.filter(Assessment.job_id.in_(job_ids))
+                     .with_entities(Assessment.job_id)}
+            if saved:
+                return jsonify({'error': f"Job {sorted(saved)[0]} is already saved"}), 409
+            
+            jobs = []
+            for job_id in job_ids:
+                job = job_queue.get(job_id, user_id)
+                if not job:
+                    return jsonify({'error': f"Job {job_id} not found"}), 404
+                if job['status'] != DONE:
+                    return jsonify({'error': f"Job {job_id} has no result to save ({job['status']})"}), 409
+                jobs.append(job)
+            
+            assessments = []
+            for item, job in zip(items, jobs):
+                result = job['result']
+                image_bytes = job_queue.image(job['id'], user_id)
+                assessment = new_assessment(
+                    int(item['child_id']), result['autism_score'], result['status'], result['facial_features'],
+                    result['recommendations'], image_path=image_store.put(image_bytes) if image_bytes else None,
+                    confidence=result.get('confidence')
+                )
+                assessment.job_id = job['id']
+                assessments.append(assessment)
+            db.session.add_all(assessments)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent request saved one of the jobs first
+                db.session.rollback()
+                return jsonify({'error': 'A job in this request is already saved'}), 409
+            
+            return jsonify({
+                'message': f'{len(assessments)} assessments saved successfully',
+                'assessment_ids': [assessment.id for assessment in assessments]
+            }), 201
+        
+        # Legacy single save: the client posts back the /api/analyze result and
+        # its scores are stored as sent. New clients should pass child_id to
+        # /api/analyze instead, which saves the server's result.
         if not data or not data.get('child_id'):
             return jsonify({'error': 'Child ID is required'}), 400
         
-        child = Child.query.filter_by(id=data['child_id'], parent_id=user_id).first()
+        try:
+            child_id = int(data['child_id'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Child ID must be a number'}), 400
+        
+        child = Child.query.filter_by(id=child_id, parent_id=user_id).first()
         
         if not child:
             return jsonify({'error': 'Child not found'}), 404
         
-        assessment = Assessment(
-            child_id=child.id,
-            autism_score=data.get('autism_score'),
-            facial_features=json.dumps(data.get('facial_features', {})),
-            status=data.get('status'),
-            image_path=data.get('image_path'),
-            recommendations=json.dumps(data.get('recommendations', []))
+        assessment = new_assessment(
+            child.id, data.get('autism_score'), data.get('status'), data.get('facial_features'),
+            data.get('recommendations'), data.get('image_path'), data.get('confidence')
         )
         
         db.session.add(assessment)
@@ -393,6 +1100,47 @@ def save_assessment():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics/children', methods=['GET'])
+@jwt_required()
+def get_children_analytics():
+    """Score trend, latest status and feature averages of every child, one row each"""
+    try:
+        user_id = get_jwt_identity()
+        rows = db.session.query(Child, ChildAssessmentSummary).outerjoin(
+            ChildAssessmentSummary, ChildAssessmentSummary.child_id == Child.id
+        ).filter(Child.parent_id == user_id).all()
+        
+        return jsonify({
+            'children': [dict(
+                child_summary.describe(summary or ChildAssessmentSummary()),
+                child_id=child.id, name=child.name
+            ) for child, summary in rows]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/children/<int:child_id>', methods=['GET'])
+@jwt_required()
+def get_child_analytics(child_id):
+    try:
+        user_id = get_jwt_identity()
+        row = db.session.query(Child, ChildAssessmentSummary).outerjoin(
+            ChildAssessmentSummary, ChildAssessmentSummary.child_id == Child.id
+        ).filter(Child.id == child_id, Child.parent_id == user_id).first()
+        
+        if not row:
+            return jsonify({'error': 'Child not found'}), 404
+        
+        child, summary = row
+        return jsonify(dict(
+            child_summary.describe(summary or ChildAssessmentSummary()),
+            child_id=child.id, name=child.name
+        )), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/assessment/<int:child_id>', methods=['GET'])
 @jwt_required()
 def get_assessments(child_id):
@@ -403,7 +1151,15 @@ def get_assessments(child_id):
         if not child:
             return jsonify({'error': 'Child not found'}), 404
         
-        assessments = Assessment.query.filter_by(child_id=child_id).all()
+        # ?limit=N&before=<next_cursor>: newest page first, oldest first within it
+        try:
+            assessments, next_cursor = keyset_paginate(
+                Assessment.query.options(selectinload(Assessment.recommendation_links)).filter_by(child_id=child_id),
+                Assessment.assessment_date, Assessment.id,
+                limit=page_limit(request.args.get('limit')), before=request.args.get('before')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'assessments': [{
@@ -411,14 +1167,58 @@ def get_assessments(child_id):
                 'date': a.assessment_date.isoformat(),
                 'score': a.autism_score,
                 'status': a.status,
-                'facial_features': json.loads(a.facial_features) if a.facial_features else {},
-                'recommendations': json.loads(a.recommendations) if a.recommendations else []
-            } for a in assessments]
+                'facial_features': a.feature_dict(),
+                'recommendations': a.recommendation_list(),
+                'image_url': image_url(a.image_path)
+            } for a in assessments],
+            'next_cursor': next_cursor
         }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/images/<digest>', methods=['GET'])
+@jwt_required()
+def get_image(digest):
+    """An assessment image, or its thumbnail with ?size=N (one of THUMBNAIL_SIZES)"""
+    try:
+        if not is_digest(digest):
+            return jsonify({'error': 'Image not found'}), 404
+        
+        # Only images of the user's own assessments
+        owned = Assessment.query.join(Child).filter(
+            Child.parent_id == get_jwt_identity(),
+            Assessment.image_path.like(f'{digest[:2]}/{digest}.%')
+        ).first()
+        original = image_store.original(digest) if owned else None
+        if not original:
+            return jsonify({'error': 'Image not found'}), 404
+        
+        size = request.args.get('size', type=int)
+        if size is not None and size not in config_obj.THUMBNAIL_SIZES:
+            return jsonify({'error': f'Size must be one of {config_obj.THUMBNAIL_SIZES}'}), 400
+        
+        path, mimetype, etag = original[0], original[1], digest
+        if size:
+            thumbnail = image_store.thumbnail(digest, size)
+            if thumbnail:
+                path, mimetype, etag = thumbnail, 'image/jpeg', f'{digest}-{size}'
+            else:
+                etag = None  # Full image until the thumbnail is ready
+        
+        response = send_file(path, mimetype=mimetype)
+        if etag:
+            # The content behind a digest never changes
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+            response.make_conditional(request)
+        else:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============== CHATBOT ROUTES ==============
 
 @app.route('/api/chat', methods=['POST'])
@@ -468,7 +1268,15 @@ def chat():
 def get_chat_history():
     try:
         user_id = get_jwt_identity()
-        messages = ChatMessage.query.filter_by(user_id=user_id).order_by(ChatMessage.created_at).all()
+        # ?limit=N&before=<next_cursor>: newest page first, oldest first within it
+        try:
+            messages, next_cursor = keyset_paginate(
+                ChatMessage.query.filter_by(user_id=user_id),
+                ChatMessage.created_at, ChatMessage.id,
+                limit=page_limit(request.args.get('limit')), before=request.args.get('before')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'messages': [{
@@ -476,7 +1284,8 @@ def get_chat_history():
                 'message': m.message,
                 'response': m.response,
                 'timestamp': m.created_at.isoformat()
-            } for m in messages]
+            } for m in messages],
+            'next_cursor': next_cursor
         }), 200
     
     except Exception as e:
@@ -563,6 +1372,8 @@ def server_error(error):
 # ============== MAIN ==============
 
 if __name__ == '__main__':
+    from migrations import migrate
     with app.app_context():
         db.create_all()
+        migrate(db.engine)
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,86 @@
+"""
+Incremental per-child assessment statistics
+
+A ChildAssessmentSummary row is updated in the same transaction as every
+assessment saved for the child, so analytics read one row per child instead
+of scanning its assessments. Means and variances use Welford's online
+algorithm (count, mean and sum of squared differences M2), and the score
+trend is an exponential moving average weighting the newest assessment by
+alpha.
+"""
+
+import math
+
+# Numeric facial features with running statistics
+TRACKED_FEATURES = ('eye_contact', 'face_symmetry', 'expression_intensity', 'face_area_ratio')
+STATUSES = ('positive', 'inconclusive', 'negative')
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+        return None
+    return float(value)
+
+
+def _add_value(summary, prefix, value):
+    """Welford update of <prefix>_count, <prefix>_mean and <prefix>_m2"""
+    count = (getattr(summary, f'{prefix}_count') or 0) + 1
+    mean = getattr(summary, f'{prefix}_mean') or 0.0
+    delta = value - mean
+    mean += delta / count
+    setattr(summary, f'{prefix}_count', count)
+    setattr(summary, f'{prefix}_mean', mean)
+    setattr(summary, f'{prefix}_m2', (getattr(summary, f'{prefix}_m2') or 0.0) + delta * (value - mean))
+
+
+def add_assessment(summary, score, status, features, assessed_at, alpha):
+    """Fold one assessment, newer than all before it, into a summary row"""
+    summary.assessment_count = (summary.assessment_count or 0) + 1
+    if summary.first_assessment_at is None:
+        summary.first_assessment_at = assessed_at
+    summary.latest_assessment_at = assessed_at
+    summary.latest_status = status
+    if status in STATUSES:
+        setattr(summary, f'{status}_count', (getattr(summary, f'{status}_count') or 0) + 1)
+
+    score = _number(score)
+    summary.latest_score = score
+    if score is not None:
+        _add_value(summary, 'score', score)
+        summary.score_ema = score if summary.score_ema is None else alpha * score + (1 - alpha) * summary.score_ema
+
+    features = features if isinstance(features, dict) else {}
+    for name in TRACKED_FEATURES:
+        value = _number(features.get(name))
+        if value is not None:
+            _add_value(summary, name, value)
+
+
+def _stats(summary, prefix):
+    count = getattr(summary, f'{prefix}_count') or 0
+    m2 = getattr(summary, f'{prefix}_m2') or 0.0
+    variance = m2 / (count - 1) if count > 1 else None
+    return {
+        'count': count,
+        'mean': getattr(summary, f'{prefix}_mean') if count else None,
+        'variance': variance,
+        'std': math.sqrt(variance) if variance is not None else None
+    }
+
+
+def describe(summary):
+    """Analytics response body of a summary row"""
+    score = _stats(summary, 'score')
+    score['moving_average'] = summary.score_ema
+    return {
+        'assessment_count': summary.assessment_count or 0,
+        'first_assessment_at': summary.first_assessment_at.isoformat() if summary.first_assessment_at else None,
+        'latest': {
+            'score': summary.latest_score,
+            'status': summary.latest_status,
+            'date': summary.latest_assessment_at.isoformat() if summary.latest_assessment_at else None
+        },
+        'status_counts': {status: getattr(summary, f'{status}_count') or 0 for status in STATUSES},
+        'score': score,
+        'features': {name: _stats(summary, name) for name in TRACKED_FEATURES}
+    }
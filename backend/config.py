@@ -20,12 +20,74 @@ class Config:
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
     ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp'}
+    # Grad-CAM explanations (see ml_model/explain.py): index and heatmaps on
+    # disk, seconds an analysis can be explained for, most heatmap megabytes
+    # kept and recent analyses whose model input is kept in memory
+    ANALYSIS_CACHE_DIR = os.getenv('ANALYSIS_CACHE_DIR', os.path.join(UPLOAD_FOLDER, 'analyses'))
+    ANALYSIS_CACHE_TTL = float(os.getenv('ANALYSIS_CACHE_TTL', '3600'))
+    ANALYSIS_CACHE_MAX_MB = float(os.getenv('ANALYSIS_CACHE_MAX_MB', '256'))
+    ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', '64'))
+    # Priority lanes of the analysis path (see ml_model/scheduler.py): slots
+    # per process, share of contended slots and most slots per lane
+    ANALYSIS_CONCURRENCY = int(os.getenv('ANALYSIS_CONCURRENCY', '2'))
+    LANE_WEIGHTS = os.getenv('LANE_WEIGHTS', 'interactive:8,batch:2,background:1')
+    LANE_CAPS = os.getenv('LANE_CAPS', 'batch:1,background:1')
+    # Queue of /api/analyze/jobs (see job_queue.py), worker threads per process
+    JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(os.path.dirname(__file__), 'analysis_jobs.db'))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    # How long an events stream (and the request thread serving it) waits
+    # for its job before the client reconnects
+    JOB_EVENTS_TIMEOUT = float(os.getenv('JOB_EVENTS_TIMEOUT', '30'))
+    # Content-addressed store of assessment images (see image_store.py) and
+    # the thumbnail sizes made for each image
+    IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', os.path.join(UPLOAD_FOLDER, 'images'))
+    THUMBNAIL_SIZES = [int(size) for size in os.getenv('THUMBNAIL_SIZES', '256').split(',') if size.strip()]
+    # Weight of the newest score in a child's moving average (child_summary.py)
+    SCORE_TREND_ALPHA = float(os.getenv('SCORE_TREND_ALPHA', '0.3'))
+    # Photos accepted by one /api/analyze/multi request
+    MULTI_ANALYSIS_MAX_IMAGES = int(os.getenv('MULTI_ANALYSIS_MAX_IMAGES', '10'))
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
     
     # ML Model
     MODEL_PATH = os.getenv('MODEL_PATH', 'ml_model/autism_model.h5')
+    # 'standard' (MobileNetV2) or 'fast' (distilled student, see ml_model/distill.py)
+    MODEL_VARIANT = os.getenv('MODEL_VARIANT', 'standard')
+    # Versioned models (ml_model/model_registry.py); when the registry has an
+    # active version it is served instead of MODEL_VARIANT
+    MODEL_REGISTRY_DIR = os.getenv(
+        'MODEL_REGISTRY_DIR',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml_model', 'registry')
+    )
+    MODEL_REGISTRY_POLL_SECONDS = float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '10'))
+    # Set by gunicorn.conf.py: the app is preloaded in the master and each
+    # worker loads the TensorFlow model after fork (see wsgi.py)
+    DEFER_MODEL_LOAD = os.getenv('DEFER_MODEL_LOAD', 'false').lower() == 'true'
+    
+    # Extra models voting with the served one, "path[:weight],..." (see
+    # ml_model/ensemble.py); members slower than the deadline are left out
+    ENSEMBLE_MODELS = os.getenv('ENSEMBLE_MODELS', '')
+    ENSEMBLE_PRIMARY_WEIGHT = float(os.getenv('ENSEMBLE_PRIMARY_WEIGHT', '1.0'))
+    ENSEMBLE_DEADLINE_MS = float(os.getenv('ENSEMBLE_DEADLINE_MS', '200'))
+    
+    # Candidate model scoring a sample of the inputs in the background; the
+    # scores of both models are logged for `python shadow.py report`
+    SHADOW_MODEL_PATH = os.getenv('SHADOW_MODEL_PATH', '')
+    SHADOW_SAMPLE_RATE = float(os.getenv('SHADOW_SAMPLE_RATE', '0.1'))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '100'))
+    SHADOW_LOG_PATH = os.getenv('SHADOW_LOG_PATH', os.path.join(os.path.dirname(__file__), 'shadow_scores.db'))
+    
+    # Local inference server (ml_model/inference_server.py); when set the web
+    # workers send images to it instead of loading the model themselves
+    INFERENCE_SOCKET = os.getenv('INFERENCE_SOCKET', '')
+    INFERENCE_POOL_SIZE = int(os.getenv('INFERENCE_POOL_SIZE', '4'))
+    INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', '30'))
+    INFERENCE_RETRIES = int(os.getenv('INFERENCE_RETRIES', '2'))
+    
+    # Admin API (model reload/rollback); disabled when empty
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
     
     # AI Chatbot Configuration (Google Gemini)
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
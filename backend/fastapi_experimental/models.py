@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, func
+import json
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from .database import Base
 from passlib.context import CryptContext
@@ -27,7 +29,7 @@ class User(Base):
 class Child(Base):
     __tablename__ = "child"
     id = Column(Integer, primary_key=True, index=True)
-    parent_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    parent_id = Column(Integer, ForeignKey('user.id'), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     age = Column(Integer)
     gender = Column(String(10))
@@ -41,14 +43,89 @@ class Assessment(Base):
     __tablename__ = "assessment"
     id = Column(Integer, primary_key=True, index=True)
     child_id = Column(Integer, ForeignKey('child.id'), nullable=False)
-    assessment_date = Column(DateTime, default=func.now())
+    assessment_date = Column(DateTime, default=datetime.utcnow)
     autism_score = Column(Float)
-    facial_features = Column(Text)  # JSON string
+    facial_features = Column(Text)  # JSON string, rows saved before AssessmentFeature only
     status = Column(String(20))
     image_path = Column(String(500))
-    recommendations = Column(Text)  # JSON string
+    recommendations = Column(Text)  # JSON string, rows saved before AssessmentRecommendation only
     
     child = relationship('Child', back_populates='assessments')
+    features = relationship('AssessmentFeature', uselist=False, lazy='joined', cascade='all, delete-orphan')
+    recommendation_links = relationship('AssessmentRecommendation', order_by='AssessmentRecommendation.position',
+                                        cascade='all, delete-orphan')
+    
+    __table_args__ = (Index('ix_assessment_child_date', 'child_id', 'assessment_date', 'id'),)
+    
+    def feature_dict(self):
+        """facial_features as saved, without the columns that were not set"""
+        if self.features is None:
+            return json.loads(self.facial_features) if self.facial_features else {}
+        return {name: getattr(self.features, name) for name in FEATURE_COLUMNS
+                if getattr(self.features, name) is not None}
+    
+    def recommendation_list(self):
+        if not self.recommendation_links and self.recommendations:
+            return json.loads(self.recommendations)
+        return [link.recommendation.text for link in self.recommendation_links]
+
+# Same tables as the Flask backend's models (backend/app.py)
+FEATURE_COLUMNS = ('face_count', 'eye_contact', 'face_symmetry', 'expression_intensity', 'face_area_ratio',
+                   'head_position')
+
+class AssessmentFeature(Base):
+    __tablename__ = "assessment_feature"
+    assessment_id = Column(Integer, ForeignKey('assessment.id'), primary_key=True)
+    face_count = Column(Integer)
+    eye_contact = Column(Float)
+    face_symmetry = Column(Float)
+    expression_intensity = Column(Float)
+    face_area_ratio = Column(Float)
+    head_position = Column(String(20))
+    confidence = Column(Float)
+    model_version = Column(String(100))
+
+class Recommendation(Base):
+    __tablename__ = "recommendation"
+    id = Column(Integer, primary_key=True)
+    text = Column(String(1000), nullable=False, unique=True)
+
+class AssessmentRecommendation(Base):
+    __tablename__ = "assessment_recommendation"
+    assessment_id = Column(Integer, ForeignKey('assessment.id'), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    recommendation_id = Column(Integer, ForeignKey('recommendation.id'), nullable=False)
+    
+    recommendation = relationship('Recommendation', lazy='joined')
+
+class ChildAssessmentSummary(Base):
+    """Running statistics of a child's assessments, see backend/child_summary.py"""
+    __tablename__ = "child_assessment_summary"
+    child_id = Column(Integer, ForeignKey('child.id'), primary_key=True)
+    assessment_count = Column(Integer, nullable=False, default=0)
+    first_assessment_at = Column(DateTime)
+    latest_assessment_at = Column(DateTime)
+    latest_score = Column(Float)
+    latest_status = Column(String(20))
+    positive_count = Column(Integer, default=0)
+    inconclusive_count = Column(Integer, default=0)
+    negative_count = Column(Integer, default=0)
+    score_count = Column(Integer, default=0)
+    score_mean = Column(Float)
+    score_m2 = Column(Float)
+    score_ema = Column(Float)
+    eye_contact_count = Column(Integer, default=0)
+    eye_contact_mean = Column(Float)
+    eye_contact_m2 = Column(Float)
+    face_symmetry_count = Column(Integer, default=0)
+    face_symmetry_mean = Column(Float)
+    face_symmetry_m2 = Column(Float)
+    expression_intensity_count = Column(Integer, default=0)
+    expression_intensity_mean = Column(Float)
+    expression_intensity_m2 = Column(Float)
+    face_area_ratio_count = Column(Integer, default=0)
+    face_area_ratio_mean = Column(Float)
+    face_area_ratio_m2 = Column(Float)
 
 class Note(Base):
     __tablename__ = "note"
@@ -59,6 +136,8 @@ class Note(Base):
     content = Column(Text)
     
     child = relationship('Child', back_populates='notes')
+    
+    __table_args__ = (Index('ix_note_child_created', 'child_id', 'created_at'),)
 
 class ChatMessage(Base):
     __tablename__ = "chat_message"
@@ -66,6 +145,8 @@ class ChatMessage(Base):
     user_id = Column(Integer, ForeignKey('user.id'), nullable=False)
     message = Column(Text)
     response = Column(Text)
-    created_at = Column(DateTime, default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship('User', back_populates='chat_messages')
+    
+    __table_args__ = (Index('ix_chat_message_user_created', 'user_id', 'created_at', 'id'),)
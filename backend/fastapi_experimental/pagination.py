@@ -0,0 +1,38 @@
+import base64
+import binascii
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (UnicodeError, TypeError, ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_paginate(query, created_column, id_column, limit=50, before=None):
+    """
+    One page, newest first, without COUNT/OFFSET; returns (rows oldest first, next cursor)
+    
+    created_column must be set in Python, not by CURRENT_TIMESTAMP (see
+    keyset_paginate in backend/utils.py).
+    """
+    if before:
+        created_at, row_id = decode_cursor(before)
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < row_id)
+        ))
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        oldest = rows[-1]
+        next_cursor = encode_cursor(getattr(oldest, created_column.key), getattr(oldest, id_column.key))
+    return rows[::-1], next_cursor
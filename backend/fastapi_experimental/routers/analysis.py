@@ -1,4 +1,5 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 from PIL import Image
 import io
@@ -6,8 +7,8 @@ import os
 import sys
 
 # Add parent directory to path so we can import ml_model
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from ml_model.autism_detector import AutismDetector
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from backend.inference_client import InferenceClient, InferenceUnavailable
 
 router = APIRouter(
     prefix="/api/analyze",
@@ -15,16 +16,41 @@ router = APIRouter(
 )
 
 # Initialize ML model
-# We initialize it lazily or globally. Here globally for simplicity.
-try:
-    autism_detector = AutismDetector()
-except Exception as e:
-    print(f"Error initializing model: {e}")
-    autism_detector = None
+# With INFERENCE_SOCKET set, analysis runs in ml_model/inference_server.py
+# and TensorFlow is never loaded here
+inference_client = None
+autism_detector = None
+if os.getenv('INFERENCE_SOCKET'):
+    inference_client = InferenceClient(
+        os.getenv('INFERENCE_SOCKET'),
+        pool_size=int(os.getenv('INFERENCE_POOL_SIZE', '4')),
+        timeout=float(os.getenv('INFERENCE_TIMEOUT', '30')),
+        retries=int(os.getenv('INFERENCE_RETRIES', '2'))
+    )
+else:
+    # We initialize it lazily or globally. Here globally for simplicity.
+    try:
+        from ml_model.autism_detector import AutismDetector
+        from ml_model.ensemble import parse_member_specs
+        autism_detector = AutismDetector(variant=os.getenv('MODEL_VARIANT', 'standard'))
+        if os.getenv('ENSEMBLE_MODELS'):
+            autism_detector.load_ensemble(
+                parse_member_specs(os.getenv('ENSEMBLE_MODELS')),
+                primary_weight=float(os.getenv('ENSEMBLE_PRIMARY_WEIGHT', '1.0')),
+                deadline_ms=float(os.getenv('ENSEMBLE_DEADLINE_MS', '200'))
+            )
+    except Exception as e:
+        print(f"Error initializing model: {e}")
+
+def run_analysis(contents):
+    if inference_client:
+        return inference_client.analyze(contents)
+    pil_image = Image.open(io.BytesIO(contents)).convert('RGB')
+    return autism_detector.predict(np.array(pil_image))
 
 @router.post("/", response_model=dict)
 async def analyze_image(image: UploadFile = File(...)):
-    if not autism_detector:
+    if not autism_detector and not inference_client:
         raise HTTPException(status_code=500, detail="ML Model not initialized")
     
     if not image.filename:
@@ -32,12 +58,9 @@ async def analyze_image(image: UploadFile = File(...)):
     
     try:
         contents = await image.read()
-        pil_image = Image.open(io.BytesIO(contents)).convert('RGB')
-        image_array = np.array(pil_image)
-        
-        result = autism_detector.predict(image_array)
+        result = await run_in_threadpool(run_analysis, contents)
         
-        return {
+        response = {
             "success": True,
             "autism_score": float(result['score']),
             "status": result['status'],
@@ -45,5 +68,13 @@ async def analyze_image(image: UploadFile = File(...)):
             "recommendations": result['recommendations'],
             "confidence": float(result['confidence'])
         }
+        if 'ensemble' in result:
+            response["ensemble"] = result['ensemble']
+        return response
+    except ValueError as e:
+        # Not an image (reported by the inference server)
+        raise HTTPException(status_code=400, detail=str(e))
+    except InferenceUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,28 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-import json
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+from datetime import datetime
+import os
+import sys
 from .. import models, schemas, dependencies
 from ..database import get_db
+from ..pagination import keyset_paginate
+
+# Add the project root to path so the Flask backend's summary math is shared
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+from backend import child_summary
+
+SCORE_TREND_ALPHA = float(os.getenv('SCORE_TREND_ALPHA', '0.3'))
 
 router = APIRouter(
     prefix="/api/assessment",
     tags=["assessments"]
 )
 
+def locked_child_summary(db, child_id):
+    """The child's summary row, created if missing; same as locked_child_summary in backend/app.py"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        summary = db.query(models.ChildAssessmentSummary).filter_by(child_id=child_id).with_for_update().first()
+        if summary is None:
+            summary = models.ChildAssessmentSummary(child_id=child_id)
+            db.add(summary)
+        return summary
+    
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    db.execute(
+        insert(models.ChildAssessmentSummary).values(child_id=child_id)
+        .on_conflict_do_nothing(index_elements=['child_id'])
+    )
+    return db.query(models.ChildAssessmentSummary).filter_by(child_id=child_id).with_for_update().one()
+
+def build_assessment(db, child_id, score, status, features, recommendations, image_path=None):
+    """Assessment with its feature row and links to shared recommendations, as the Flask backend saves it"""
+    features = features if isinstance(features, dict) else {}
+    recommendations = [str(text) for text in recommendations or []]
+    shared = {}
+    if recommendations:
+        shared = {r.text: r for r in db.query(models.Recommendation).filter(
+            models.Recommendation.text.in_(recommendations))}
+    for text in recommendations:
+        if text not in shared:
+            shared[text] = models.Recommendation(text=text)
+            db.add(shared[text])
+    
+    # Counted in the child's summary in the same transaction, so Flask's
+    # analytics include assessments saved here
+    summary = locked_child_summary(db, child_id)
+    assessed_at = datetime.utcnow()
+    child_summary.add_assessment(summary, score, status, features, assessed_at, SCORE_TREND_ALPHA)
+    
+    return models.Assessment(
+        child_id=child_id,
+        assessment_date=assessed_at,
+        autism_score=score,
+        status=status,
+        image_path=image_path,
+        features=models.AssessmentFeature(**{name: features.get(name) for name in models.FEATURE_COLUMNS}),
+        recommendation_links=[
+            models.AssessmentRecommendation(position=i, recommendation=shared[text])
+            for i, text in enumerate(recommendations)
+        ]
+    )
+
 @router.post("/save", response_model=dict, status_code=status.HTTP_201_CREATED)
 def save_assessment(assessment: schemas.AssessmentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
     child = db.query(models.Child).filter(models.Child.id == assessment.child_id, models.Child.parent_id == current_user.id).first()
     if not child:
         raise HTTPException(status_code=404, detail="Child not found")
     
-    new_assessment = models.Assessment(
-        child_id=child.id,
-        autism_score=assessment.autism_score,
-        facial_features=json.dumps(assessment.facial_features) if assessment.facial_features else None,
-        status=assessment.status,
-        image_path=assessment.image_path,
-        recommendations=json.dumps(assessment.recommendations) if assessment.recommendations else None
+    new_assessment = build_assessment(
+        db, child.id, assessment.autism_score, assessment.status, assessment.facial_features,
+        assessment.recommendations, assessment.image_path
     )
     db.add(new_assessment)
     db.commit()
@@ -34,12 +91,16 @@ def save_assessment(assessment: schemas.AssessmentCreate, db: Session = Depends(
     }
 
 @router.get("/{child_id}", response_model=dict)
-def get_assessments(child_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
+def get_assessments(child_id: int, limit: int = Query(50, ge=1, le=200), before: Optional[str] = None, db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
     child = db.query(models.Child).filter(models.Child.id == child_id, models.Child.parent_id == current_user.id).first()
     if not child:
         raise HTTPException(status_code=404, detail="Child not found")
     
-    assessments = db.query(models.Assessment).filter(models.Assessment.child_id == child_id).all()
+    assessments, next_cursor = keyset_paginate(
+        db.query(models.Assessment).options(selectinload(models.Assessment.recommendation_links))
+        .filter(models.Assessment.child_id == child_id),
+        models.Assessment.assessment_date, models.Assessment.id, limit, before
+    )
     
     return {
         "assessments": [{
@@ -47,7 +108,8 @@ def get_assessments(child_id: int, db: Session = Depends(get_db), current_user:
             "date": a.assessment_date.isoformat(),
             "score": a.autism_score,
             "status": a.status,
-            "facial_features": json.loads(a.facial_features) if a.facial_features else {},
-            "recommendations": json.loads(a.recommendations) if a.recommendations else []
-        } for a in assessments]
+            "facial_features": a.feature_dict(),
+            "recommendations": a.recommendation_list()
+        } for a in assessments],
+        "next_cursor": next_cursor
     }
@@ -42,7 +42,7 @@ def login(user_credentials: schemas.UserLogin, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer", "user": user}
 
 @router.get("/profile", response_model=schemas.UserResponse)
-def get_profile(current_user: models.User = Depends(dependencies.get_current_user)):
+def get_profile(db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
     # Add computed field
-    current_user.children_count = len(current_user.children)
+    current_user.children_count = db.query(models.Child).filter(models.Child.parent_id == current_user.id).count()
     return current_user
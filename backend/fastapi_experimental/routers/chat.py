@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from .. import models, schemas, dependencies
 from ..database import get_db
+from ..pagination import keyset_paginate
 
 router = APIRouter(
     prefix="/api/chat",
@@ -57,8 +58,11 @@ def chat(message: schemas.ChatMessageCreate, db: Session = Depends(get_db), curr
     return chat_msg
 
 @router.get("/history", response_model=dict)
-def get_chat_history(db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
-    messages = db.query(models.ChatMessage).filter(models.ChatMessage.user_id == current_user.id).order_by(models.ChatMessage.created_at).all()
+def get_chat_history(limit: int = Query(50, ge=1, le=200), before: Optional[str] = None, db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
+    messages, next_cursor = keyset_paginate(
+        db.query(models.ChatMessage).filter(models.ChatMessage.user_id == current_user.id),
+        models.ChatMessage.created_at, models.ChatMessage.id, limit, before
+    )
     
     return {
         "messages": [{
@@ -66,5 +70,6 @@ def get_chat_history(db: Session = Depends(get_db), current_user: models.User =
             "message": m.message,
             "response": m.response,
             "timestamp": m.created_at.isoformat()
-        } for m in messages]
+        } for m in messages],
+        "next_cursor": next_cursor
     }
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
 from typing import List
 from .. import models, schemas, dependencies
 from ..database import get_db
@@ -33,7 +34,10 @@ def add_child(child: schemas.ChildCreate, db: Session = Depends(get_db), current
 
 @router.get("/", response_model=dict)
 def get_children(db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
-    children = db.query(models.Child).filter(models.Child.parent_id == current_user.id).all()
+    assessments_count = db.query(func.count(models.Assessment.id)).filter(
+        models.Assessment.child_id == models.Child.id
+    ).correlate(models.Child).scalar_subquery()
+    children = db.query(models.Child, assessments_count).filter(models.Child.parent_id == current_user.id).all()
     
     return {
         "children": [{
@@ -41,23 +45,25 @@ def get_children(db: Session = Depends(get_db), current_user: models.User = Depe
             "name": c.name,
             "age": c.age,
             "gender": c.gender,
-            "assessments_count": len(c.assessments)
-        } for c in children]
+            "assessments_count": count
+        } for c, count in children]
     }
 
 @router.get("/{child_id}", response_model=dict)
 def get_child_details(child_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(dependencies.get_current_user)):
-    child = db.query(models.Child).filter(models.Child.id == child_id, models.Child.parent_id == current_user.id).first()
+    child = db.query(models.Child).options(
+        selectinload(models.Child.assessments).selectinload(models.Assessment.recommendation_links),
+        selectinload(models.Child.notes)
+    ).filter(models.Child.id == child_id, models.Child.parent_id == current_user.id).first()
     if not child:
         raise HTTPException(status_code=404, detail="Child not found")
     
-    import json
     assessments = [{
         "id": a.id,
         "date": a.assessment_date.isoformat(),
         "score": a.autism_score,
         "status": a.status,
-        "recommendations": json.loads(a.recommendations) if a.recommendations else []
+        "recommendations": a.recommendation_list()
     } for a in child.assessments]
     
     notes = [{
@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for the Flask backend
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload the app is imported once in the master, so the face detectors,
+the ~100 MB dlib landmark predictor and the imported modules are shared
+copy-on-write by all workers instead of being loaded per worker. The master
+imports TensorFlow but never initializes its runtime: device setup
+(autism_detector.configure_devices) and the model load happen in each
+worker after fork, since TensorFlow's thread pools and GPU contexts don't
+survive fork.
+
+Measure the per-worker memory with scripts/measure_worker_memory.py.
+"""
+
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+# Must cover the model load in post_fork, which runs before the worker's
+# first heartbeat
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+if preload_app:
+    os.environ['DEFER_MODEL_LOAD'] = 'true'
+
+
+def pre_fork(server, worker):
+    # The preloaded objects live as long as the master; moving them to the
+    # permanent generation keeps the collector in the workers from writing
+    # to (and so copying) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import wsgi
+        wsgi.init_worker()
+        server.log.info(f"Worker {worker.pid}: model loaded")
@@ -0,0 +1,145 @@
+"""
+Content-addressed store for uploaded images
+
+Images are stored once under the SHA-256 of their bytes, sharded by the
+first two hex digits, so the same photo uploaded again (or saved for
+several assessments) takes no extra space. Thumbnails are made by a
+background thread after an image is stored and kept next to the originals:
+
+    <root>/ab/abcd...ef.jpg            original
+    <root>/thumbs/256/ab/abcd...ef.jpg 256 px thumbnail
+
+Since a digest always names the same bytes, files can be served with
+immutable cache headers and the digest as ETag.
+"""
+
+import io
+import os
+import re
+import queue
+import hashlib
+import threading
+
+from PIL import Image, ImageOps
+
+# PIL format -> stored extension and MIME type
+FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'GIF': ('gif', 'image/gif'),
+    'BMP': ('bmp', 'image/bmp'),
+}
+
+_RELATIVE_PATH = re.compile(r'^[0-9a-f]{2}/([0-9a-f]{64})\.(\w+)$')
+
+
+def is_digest(value):
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+
+class ImageStore:
+    def __init__(self, root, thumbnail_sizes=(256,)):
+        self.root = root
+        self.thumbnail_sizes = tuple(thumbnail_sizes)
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._worker_pid = None
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, image_bytes):
+        """
+        Store an image unless it is already stored
+
+        Returns the path relative to the store root (kept in
+        Assessment.image_path). Raises ValueError for data that isn't an
+        image in a supported format.
+        """
+        try:
+            image_format = Image.open(io.BytesIO(image_bytes)).format
+        except Exception:
+            raise ValueError("Not a readable image")
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported image format {image_format}")
+
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        relative_path = f'{digest[:2]}/{digest}.{FORMATS[image_format][0]}'
+        path = os.path.join(self.root, relative_path)
+        if not os.path.exists(path):
+            self._write(path, image_bytes)
+        for size in self.thumbnail_sizes:
+            if not os.path.exists(self._thumbnail_path(digest, size)):
+                self._enqueue(digest, size)
+        return relative_path
+
+    def digest_of(self, image_path):
+        """Digest of a store path as returned by put(), None for other paths"""
+        match = _RELATIVE_PATH.match(image_path or '')
+        return match.group(1) if match else None
+
+    def original(self, digest):
+        """(path, MIME type) of a stored image, or None"""
+        for extension, mimetype in FORMATS.values():
+            path = os.path.join(self.root, digest[:2], f'{digest}.{extension}')
+            if os.path.exists(path):
+                return path, mimetype
+        return None
+
+    def _thumbnail_path(self, digest, size):
+        return os.path.join(self.root, 'thumbs', str(size), digest[:2], f'{digest}.jpg')
+
+    def thumbnail(self, digest, size):
+        """
+        Path of a thumbnail, or None while it is still being made
+
+        A missing thumbnail of a stored image is queued, so images stored
+        before a size was configured get one too.
+        """
+        path = self._thumbnail_path(digest, size)
+        if os.path.exists(path):
+            return path
+        if self.original(digest):
+            self._enqueue(digest, size)
+        return None
+
+    def _enqueue(self, digest, size):
+        with self._lock:
+            # The thread doesn't survive a fork (gunicorn preload); start one
+            # per process on first use
+            if self._worker_pid != os.getpid():
+                self._worker_pid = os.getpid()
+                self._pending = set()
+                self._queue = queue.Queue()
+                threading.Thread(target=self._work, args=(self._queue,), name='thumbnailer', daemon=True).start()
+            if (digest, size) in self._pending:
+                return
+            self._pending.add((digest, size))
+        self._queue.put((digest, size))
+
+    def _work(self, tasks):
+        while True:
+            digest, size = tasks.get()
+            try:
+                self._make_thumbnail(digest, size)
+            except Exception as e:
+                print(f"⚠ Could not make a thumbnail of {digest}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard((digest, size))
+
+    def _make_thumbnail(self, digest, size):
+        original = self.original(digest)
+        if original is None:
+            return
+        with Image.open(original[0]) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((size, size))
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=85)
+        self._write(self._thumbnail_path(digest, size), output.getvalue())
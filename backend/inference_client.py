@@ -0,0 +1,113 @@
+"""
+Client for the local inference daemon (ml_model/inference_server.py)
+
+Keeps a small pool of Unix socket connections per process. Requests that
+fail because the connection was lost (e.g. the daemon restarted) are
+retried on a new connection; analysis is idempotent, so a retry is safe.
+Timeouts are not retried, the daemon may still be busy with the request.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+
+from ml_model.explain import AnalysisNotFound
+from ml_model.inference_protocol import (ERROR_NOT_FOUND, ERROR_UNSCORABLE, MSG_ANALYZE,
+                                         MSG_ANALYZE_MULTI, MSG_ERROR, MSG_EXPLAIN, MSG_PNG,
+                                         MSG_STATUS, pack_images, pack_owner, recv_message,
+                                         send_message)
+from ml_model.scheduler import BACKGROUND, INTERACTIVE, LANES
+
+
+class InferenceUnavailable(Exception):
+    """The inference daemon could not be reached or did not answer in time"""
+
+
+class InferenceError(Exception):
+    """The inference daemon reported an error for the request"""
+
+
+class InferenceClient:
+    def __init__(self, socket_path, pool_size=4, timeout=30.0, retries=2, retry_delay=0.2):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+
+    def _acquire(self):
+        with self._lock:
+            # Connections must not be shared with forked worker processes
+            if self._pid != os.getpid():
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _release(self, sock):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.pool_size:
+                self._idle.append(sock)
+                return
+        sock.close()
+
+    def _request(self, msg_type, payload=b'', lane=INTERACTIVE):
+        for attempt in range(self.retries + 1):
+            sock = None
+            try:
+                sock = self._acquire()
+                send_message(sock, msg_type, payload, LANES.index(lane))
+                reply_type, reply, _ = recv_message(sock)
+            except socket.timeout:
+                if sock:
+                    sock.close()
+                raise InferenceUnavailable(f"Inference server did not answer within {self.timeout}s")
+            except OSError as e:  # Includes ConnectionError from a closed connection
+                if sock:
+                    sock.close()
+                if attempt == self.retries:
+                    raise InferenceUnavailable(f"Inference server unavailable: {e}")
+                time.sleep(self.retry_delay * (attempt + 1))
+                continue
+
+            self._release(sock)
+            if reply_type == MSG_PNG:
+                etag, png = reply.split(b'\n', 1)
+                return png, etag.decode('ascii') or None
+            data = json.loads(reply.decode('utf-8'))
+            if reply_type == MSG_ERROR:
+                # Same exceptions as ml_model.explain.Explainer
+                if data.get('code') == ERROR_NOT_FOUND:
+                    raise AnalysisNotFound(data['error'])
+                if data.get('code') == ERROR_UNSCORABLE:
+                    raise ValueError(data['error'])
+                raise InferenceError(data.get('error', 'Inference failed'))
+            return data
+
+    def analyze(self, image_bytes, lane=INTERACTIVE, owner=None):
+        """Result of AutismDetector.predict for the encoded image; owner can explain it later"""
+        return self._request(MSG_ANALYZE, pack_owner(owner, image_bytes), lane)
+
+    def analyze_multi(self, images, lane=INTERACTIVE, owner=None):
+        """Per-image results and their aggregate for several encoded images"""
+        return self._request(MSG_ANALYZE_MULTI, pack_owner(owner, pack_images(images)), lane)
+
+    def explain(self, analysis_id, owner, lane=BACKGROUND):
+        """Grad-CAM heatmap of one of the owner's analyses as (png bytes, etag)"""
+        return self._request(MSG_EXPLAIN, pack_owner(owner, analysis_id.encode('ascii')), lane)
+
+    def status(self):
+        """Served model and batching statistics of the daemon"""
+        return self._request(MSG_STATUS)
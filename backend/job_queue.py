@@ -0,0 +1,275 @@
+"""
+Persistent queue of analysis jobs (POST /api/analyze/jobs)
+
+Jobs and their uploaded image live in a SQLite database, so queued jobs
+survive a restart and every gunicorn worker can pick them up. Each process
+runs a few worker threads; a worker claims a job with a lease, and a job
+whose lease runs out (its worker died) is claimed again, up to max_attempts.
+
+The image of a finished job is kept until the job is purged, so its result
+can be saved with the image as an assessment (see image()).
+
+Submitting is idempotent: a retried POST with the same idempotency key
+(the Idempotency-Key header, or the image's SHA-256) returns the job that
+already exists instead of queueing the image again, unless that job
+failed; a failed job gives up its key so the image can be submitted again.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    image BLOB,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_expires REAL,
+    retry_at REAL,
+    UNIQUE (user_id, idempotency_key)
+);
+CREATE INDEX IF NOT EXISTS ix_analysis_jobs_status ON analysis_jobs (status, created_at);
+"""
+
+_PUBLIC_COLUMNS = ('id', 'status', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at')
+
+
+class JobFailed(Exception):
+    """The job ran but has no usable result (e.g. no face); not retried"""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class JobQueue:
+    def __init__(self, db_path, handler, workers=2, max_attempts=3, lease_seconds=300,
+                 retry_delay=2.0, poll_seconds=1.0, retention_seconds=86400):
+        """
+        Args:
+            handler: called with the image bytes and user id of a job;
+                returns the result dict, or raises JobFailed
+        """
+        self.db_path = db_path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _conn(self):
+        # One connection per thread (and per process, after fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def start(self):
+        """Start the worker threads of this process"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._local = threading.local()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'analysis-job-{i}', daemon=True).start()
+
+    def submit(self, user_id, image_bytes, idempotency_key):
+        """Queue an image; returns (job, created) where created is False for a retry"""
+        conn = self._conn()
+        job_id = uuid.uuid4().hex
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A failed job keeps its id and result under a key of its own
+            conn.execute(
+                "UPDATE analysis_jobs SET idempotency_key = idempotency_key || ':failed:' || id "
+                "WHERE user_id = ? AND idempotency_key = ? AND status = ?",
+                (str(user_id), idempotency_key, FAILED)
+            )
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO analysis_jobs (id, user_id, idempotency_key, status, image, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, str(user_id), idempotency_key, QUEUED, image_bytes, time.time())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        created = cursor.rowcount == 1
+        if created:
+            self._wake.set()
+        row = conn.execute(
+            f"SELECT {', '.join(_PUBLIC_COLUMNS)} FROM analysis_jobs WHERE user_id = ? AND idempotency_key = ?",
+            (str(user_id), idempotency_key)
+        ).fetchone()
+        return self._job(row), created
+
+    def get(self, job_id, user_id):
+        """A job of this user, or None"""
+        row = self._conn().execute(
+            f"SELECT {', '.join(_PUBLIC_COLUMNS)} FROM analysis_jobs WHERE id = ? AND user_id = ?",
+            (job_id, str(user_id))
+        ).fetchone()
+        return self._job(row) if row else None
+
+    def image(self, job_id, user_id):
+        """Uploaded image bytes of a job of this user, or None once they are gone"""
+        row = self._conn().execute(
+            "SELECT image FROM analysis_jobs WHERE id = ? AND user_id = ?", (job_id, str(user_id))
+        ).fetchone()
+        return row['image'] if row else None
+
+    def _job(self, row):
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def _claim(self):
+        """Lease the oldest runnable job; returns (id, user id, image, attempt) or None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, user_id, image, attempts FROM analysis_jobs "
+                    "WHERE (status = ? AND COALESCE(retry_at, 0) <= ?) "
+                    "OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None or row['attempts'] < self.max_attempts:
+                    break
+                # Its worker died on every attempt
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = ?, error = ?, image = NULL, finished_at = ? WHERE id = ?",
+                    (FAILED, 'Analysis did not finish', now, row['id'])
+                )
+            if row is not None:
+                conn.execute(
+                    "UPDATE analysis_jobs SET status = ?, attempts = attempts + 1, "
+                    "started_at = COALESCE(started_at, ?), lease_expires = ? WHERE id = ?",
+                    (RUNNING, now, now + self.lease_seconds, row['id'])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return (row['id'], row['user_id'], row['image'], row['attempts'] + 1) if row else None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        # Only a done job's image can still be saved with its result
+        self._conn().execute(
+            "UPDATE analysis_jobs SET status = ?, result = ?, error = ?, "
+            "image = CASE WHEN ? = ? THEN image END, finished_at = ?, lease_expires = NULL WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, status, DONE, time.time(), job_id)
+        )
+
+    def _requeue(self, job_id, attempt, error):
+        self._conn().execute(
+            "UPDATE analysis_jobs SET status = ?, error = ?, lease_expires = NULL, retry_at = ? WHERE id = ?",
+            (QUEUED, error, time.time() + self.retry_delay * attempt, job_id)
+        )
+
+    def _work(self):
+        last_purge = 0.0
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"⚠ Could not claim an analysis job: {e}")
+                claimed = None
+
+            if claimed is None:
+                if time.monotonic() - last_purge > 3600:
+                    self.purge()
+                    last_purge = time.monotonic()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            job_id, user_id, image_bytes, attempt = claimed
+            try:
+                self._finish(job_id, DONE, result=self.handler(image_bytes, user_id))
+            except JobFailed as e:
+                self._finish(job_id, FAILED, result=e.result, error=str(e))
+            except Exception as e:
+                # Transient (e.g. inference server restarting): try again
+                print(f"⚠ Analysis job {job_id} attempt {attempt} failed: {e}")
+                if attempt >= self.max_attempts:
+                    self._finish(job_id, FAILED, error=str(e))
+                else:
+                    self._requeue(job_id, attempt, str(e))
+
+    def purge(self):
+        """Delete finished jobs older than the retention period"""
+        self._conn().execute(
+            "DELETE FROM analysis_jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - self.retention_seconds)
+        )
+
+    def stats(self, recent=500):
+        """Queue depth by status and latency of recently finished jobs"""
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM analysis_jobs GROUP BY status").fetchall())
+        rows = conn.execute(
+            "SELECT created_at, started_at, finished_at FROM analysis_jobs "
+            "WHERE finished_at IS NOT NULL AND started_at IS NOT NULL "
+            "ORDER BY finished_at DESC LIMIT ?",
+            (recent,)
+        ).fetchall()
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM analysis_jobs WHERE status = ?", (QUEUED,)
+        ).fetchone()[0]
+
+        wait_ms = [(r['started_at'] - r['created_at']) * 1000 for r in rows]
+        run_ms = [(r['finished_at'] - r['started_at']) * 1000 for r in rows]
+        total_ms = [(r['finished_at'] - r['created_at']) * 1000 for r in rows]
+        latency = {}
+        for name, values in (('queue_wait_ms', wait_ms), ('run_ms', run_ms), ('total_ms', total_ms)):
+            latency[name] = {'p50': _percentile(values, 0.5), 'p95': _percentile(values, 0.95)}
+        return {
+            'depth': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'oldest_queued_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+            'latency': latency,
+            'sample_size': len(rows)
+        }
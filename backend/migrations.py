@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Schema migrations for databases created before a model change
+
+db.create_all() creates missing tables but never alters existing ones, so
+indexes and columns added to the models later are applied here. Each
+migration is a numbered list of SQL statements (or functions taking the
+connection, for data backfills), run once in a transaction and recorded in
+the schema_migrations table. Tables new to the models are made by
+create_all() before migrations run. Statements are written to be
+harmless on a database create_all() just made (CREATE INDEX IF NOT EXISTS),
+and to work on both SQLite and PostgreSQL.
+
+wsgi.py runs pending migrations at startup; to run them by hand:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied and pending ones
+"""
+
+import sys
+import json
+import time
+
+
+def _loads(value, default):
+    try:
+        return json.loads(value) if value else default
+    except ValueError:
+        return default
+
+
+def backfill_assessment_features(conn, batch_size=1000):
+    """Move the JSON facial_features/recommendations of older assessments into their tables"""
+    from sqlalchemy import text
+
+    # The AssessmentFeature columns as of this migration
+    feature_columns = ('face_count', 'eye_contact', 'face_symmetry', 'expression_intensity', 'face_area_ratio',
+                       'head_position')
+    recommendation_ids = {row[1]: row[0] for row in conn.execute(text("SELECT id, text FROM recommendation"))}
+    columns = feature_columns + ('assessment_id',)
+    insert_features = text(f"INSERT INTO assessment_feature ({', '.join(columns)}) "
+                           f"VALUES ({', '.join(':' + name for name in columns)})")
+    insert_links = text("INSERT INTO assessment_recommendation (assessment_id, position, recommendation_id) "
+                        "VALUES (:assessment_id, :position, :recommendation_id)")
+    last_id, moved = 0, 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, facial_features, recommendations FROM assessment WHERE id > :last_id "
+            "AND (facial_features IS NOT NULL OR recommendations IS NOT NULL) ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+        features, links = [], []
+        for assessment_id, features_json, recommendations_json in rows:
+            values = _loads(features_json, {})
+            if not isinstance(values, dict):
+                values = {}
+            features.append(dict({name: values.get(name) for name in feature_columns}, assessment_id=assessment_id))
+            for position, recommendation in enumerate(_loads(recommendations_json, [])):
+                recommendation = str(recommendation)
+                if recommendation not in recommendation_ids:
+                    conn.execute(text("INSERT INTO recommendation (text) VALUES (:text)"), {'text': recommendation})
+                    recommendation_ids[recommendation] = conn.execute(
+                        text("SELECT id FROM recommendation WHERE text = :text"), {'text': recommendation}
+                    ).scalar()
+                links.append({'assessment_id': assessment_id, 'position': position,
+                              'recommendation_id': recommendation_ids[recommendation]})
+        conn.execute(insert_features, features)
+        if links:
+            conn.execute(insert_links, links)
+        conn.execute(text(
+            "UPDATE assessment SET facial_features = NULL, recommendations = NULL "
+            "WHERE id > :last_id AND id <= :max_id"
+        ), {'last_id': last_id, 'max_id': rows[-1][0]})
+        last_id = rows[-1][0]
+        moved += len(rows)
+    print(f"  {moved} assessments moved to assessment_feature/assessment_recommendation")
+
+
+def backfill_child_summaries(conn):
+    """Rebuild every child's ChildAssessmentSummary from its assessments, oldest first"""
+    from types import SimpleNamespace
+    from sqlalchemy import text
+    from config import get_config
+    import child_summary
+
+    columns = ['child_id', 'assessment_count', 'first_assessment_at', 'latest_assessment_at', 'latest_score',
+               'latest_status', 'score_ema']
+    for prefix in ('score',) + child_summary.TRACKED_FEATURES:
+        columns += [f'{prefix}_count', f'{prefix}_mean', f'{prefix}_m2']
+    columns += [f'{status}_count' for status in child_summary.STATUSES]
+    insert = text(f"INSERT INTO child_assessment_summary ({', '.join(columns)}) "
+                  f"VALUES ({', '.join(':' + name for name in columns)})")
+    alpha = get_config().SCORE_TREND_ALPHA
+
+    conn.execute(text("DELETE FROM child_assessment_summary"))
+    rows = conn.execute(text(
+        f"SELECT a.child_id, a.autism_score, a.status, a.assessment_date, "
+        f"{', '.join('f.' + name for name in child_summary.TRACKED_FEATURES)} "
+        f"FROM assessment a LEFT JOIN assessment_feature f ON f.assessment_id = a.id "
+        f"ORDER BY a.child_id, a.assessment_date, a.id"
+    ))
+    summaries, summary, rebuilt = [], None, 0
+    for row in rows:
+        if summary is None or summary.child_id != row[0]:
+            summary = SimpleNamespace(**dict(dict.fromkeys(columns), child_id=row[0]))
+            summaries.append(summary)
+            rebuilt += 1
+        features = dict(zip(child_summary.TRACKED_FEATURES, row[4:]))
+        child_summary.add_assessment(summary, row[1], row[2], features, row[3], alpha)
+        if len(summaries) > 1000:
+            # All but the child still being read are complete
+            conn.execute(insert, [vars(done) for done in summaries[:-1]])
+            del summaries[:-1]
+    if summaries:
+        conn.execute(insert, [vars(done) for done in summaries])
+    print(f"  {rebuilt} child assessment summaries rebuilt")
+
+
+def normalize_sqlite_timestamps(conn):
+    """
+    Give CURRENT_TIMESTAMP values of paginated columns the microseconds SQLAlchemy writes
+
+    SQLite keeps DATETIME as text: rows defaulted by the database hold
+    'YYYY-MM-DD HH:MM:SS' but a bound datetime is 'YYYY-MM-DD HH:MM:SS.ffffff',
+    so keyset cursors never matched them. PostgreSQL stores real timestamps.
+    """
+    from sqlalchemy import text
+
+    if conn.dialect.name != 'sqlite':
+        return
+    for table, column in (('assessment', 'assessment_date'), ('chat_message', 'created_at')):
+        updated = conn.execute(text(
+            f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"
+        )).rowcount
+        print(f"  {updated} {table}.{column} values normalized")
+
+
+def add_assessment_job_id(conn):
+    """Column (and unique index) linking an assessment to the analysis job it was saved from"""
+    from sqlalchemy import inspect, text
+
+    if 'job_id' not in {column['name'] for column in inspect(conn).get_columns('assessment')}:
+        conn.execute(text("ALTER TABLE assessment ADD COLUMN job_id VARCHAR(32)"))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_assessment_job_id ON assessment (job_id)"))
+
+
+# (version, description, statements); append only, never edit an applied one
+MIGRATIONS = [
+    (1, 'Foreign-key and time indexes', [
+        "CREATE INDEX IF NOT EXISTS ix_child_parent_id ON child (parent_id)",
+        "CREATE INDEX IF NOT EXISTS ix_assessment_child_date ON assessment (child_id, assessment_date, id)",
+        "CREATE INDEX IF NOT EXISTS ix_note_child_created ON note (child_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_message_user_created ON chat_message (user_id, created_at, id)",
+    ]),
+    (2, 'Structured assessment features and shared recommendations', [
+        backfill_assessment_features,
+    ]),
+    (3, 'Per-child assessment summaries', [
+        backfill_child_summaries,
+    ]),
+    (4, 'Microsecond timestamps for keyset pagination on SQLite', [
+        normalize_sqlite_timestamps,
+    ]),
+    (5, 'Analysis job of saved assessments', [
+        add_assessment_job_id,
+    ]),
+]
+
+_VERSION_TABLE = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations "
+    "(version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at FLOAT)"
+)
+
+
+def applied_versions(engine):
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        conn.execute(text(_VERSION_TABLE))
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def migrate(engine):
+    """Apply pending migrations in order; returns the versions applied"""
+    from sqlalchemy import text
+    done = applied_versions(engine)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version in done:
+            continue
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': time.time()}
+            )
+        applied.append(version)
+        print(f"✓ Migration {version} applied: {description} ({time.perf_counter() - start:.2f}s)")
+    return applied
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    with app.app_context():
+        db.create_all()
+        if '--status' in sys.argv[1:]:
+            done = applied_versions(db.engine)
+            for version, description, _ in MIGRATIONS:
+                print(f"  {version:>3} {'applied' if version in done else 'pending':<8} {description}")
+        elif not migrate(db.engine):
+            print("✓ Database schema is up to date")
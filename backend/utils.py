@@ -1,5 +1,9 @@
 import os
+import base64
+import binascii
+from datetime import datetime
 from functools import wraps
+from sqlalchemy import and_, or_
 from flask import jsonify, request
 from werkzeug.utils import secure_filename
 
@@ -13,22 +17,19 @@ def get_safe_filename(filename):
     """Get safe filename"""
     return secure_filename(filename)
 
-def save_uploaded_file(file, upload_folder):
-    """Save uploaded file and return path"""
+def save_uploaded_file(file, image_store):
+    """Save uploaded file in the app's image store and return its digest (the assessment image_path)"""
     if not file or file.filename == '':
         return None
     
     if not allowed_file(file.filename):
         return None
     
-    os.makedirs(upload_folder, exist_ok=True)
-    
-    filename = get_safe_filename(file.filename)
-    unique_filename = f"{os.urandom(8).hex()}_{filename}"
-    filepath = os.path.join(upload_folder, unique_filename)
-    
-    file.save(filepath)
-    return filepath
+    # Identical uploads share one file (see image_store.py)
+    try:
+        return image_store.put(file.read())
+    except ValueError:
+        return None
 
 def delete_file(filepath):
     """Delete uploaded file"""
@@ -64,18 +65,54 @@ def serialize_datetime(obj):
         return obj.isoformat()
     raise TypeError(f"Type {type(obj)} not serializable")
 
-def paginate_query(query, page=1, per_page=10):
-    """Paginate database query"""
-    total = query.count()
-    items = query.offset((page - 1) * per_page).limit(per_page).all()
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor for a row's (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor; raises ValueError if it is malformed"""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (UnicodeError, TypeError, ValueError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+def keyset_paginate(query, created_column, id_column, limit=50, before=None):
+    """
+    One page of a query, newest rows first, without COUNT or OFFSET
+    
+    Rows older than the `before` cursor are read through the (created_at,
+    id) index; one extra row tells whether there is another page. The
+    cursor's timestamp is compared with the stored ones, so created_column
+    must be set in Python: SQLite stores CURRENT_TIMESTAMP without the
+    microseconds a bound datetime has, and such rows never compare equal to
+    a cursor (migration 4 in migrations.py rewrites existing ones).
+    
+    Returns:
+        (rows oldest first, cursor for the next older page or None)
+    """
+    if before:
+        created_at, row_id = decode_cursor(before)
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < row_id)
+        ))
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1).all()
     
-    return {
-        'items': items,
-        'total': total,
-        'pages': (total + per_page - 1) // per_page,
-        'current_page': page,
-        'per_page': per_page
-    }
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        oldest = rows[-1]
+        next_cursor = encode_cursor(getattr(oldest, created_column.key), getattr(oldest, id_column.key))
+    return rows[::-1], next_cursor
+
+def page_limit(value, default=50, maximum=200):
+    """The limit request parameter, clamped to 1..maximum"""
+    try:
+        return max(1, min(int(value), maximum)) if value is not None else default
+    except (TypeError, ValueError):
+        return default
 
 def success_response(data, message="Success", status_code=200):
     """Generate success response"""
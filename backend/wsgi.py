@@ -0,0 +1,23 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, db, load_serving_model, job_queue
+from migrations import migrate
+
+with app.app_context():
+    db.create_all()
+    # Indexes/columns added to existing tables since they were created
+    migrate(db.engine)
+    # Connections opened here must not be shared by forked workers
+    db.engine.dispose()
+
+
+def init_worker():
+    """Per-worker setup after fork: load the model, open fresh DB connections and start the job workers"""
+    with app.app_context():
+        db.engine.dispose()
+    load_serving_model()
+    job_queue.start()
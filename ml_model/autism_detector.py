@@ -4,6 +4,10 @@ import cv2
 from PIL import Image
 import urllib.request
 import bz2
+import glob
+import time
+import hashlib
+import threading
 
 # GPU Configuration
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Suppress TF warnings
@@ -12,8 +16,47 @@ try:
     import tensorflow as tf
     from tensorflow import keras
     from tensorflow.keras import layers
+except ImportError:
+    import keras
+    from keras import layers
+    print("Using Keras without TensorFlow GPU support")
+
+try:
+    import dlib
+    DLIB_AVAILABLE = True
+except ImportError:
+    DLIB_AVAILABLE = False
+    print("Warning: dlib not available. Using basic OpenCV features only.")
     
-    # Enable GPU
+import json
+
+# Model files next to this module; the fast variant is a distilled student
+# model (see distill.py)
+MODEL_FILENAME = 'autism_model.h5'
+FAST_MODEL_FILENAME = 'autism_model_fast.h5'
+# Model files converted to the current Keras format (see convert_model.py)
+CONVERTED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.converted')
+# Architecture of a new model per variant; the fast one matches distill.py's student
+VARIANT_ARCHITECTURES = {
+    'standard': {'input_size': 224, 'alpha': 1.0},
+    'fast': {'input_size': 128, 'alpha': 0.35},
+}
+
+_devices_configured = False
+
+
+def configure_devices():
+    """
+    Enable GPU memory growth, once per process
+
+    Deferred to the first model load or creation rather than done at import:
+    listing devices initializes the TensorFlow runtime, which a gunicorn
+    master importing this module must not do before forking its workers.
+    """
+    global _devices_configured
+    if _devices_configured or 'tf' not in globals():
+        return
+    _devices_configured = True
     gpus = tf.config.list_physical_devices('GPU')
     if gpus:
         try:
@@ -24,28 +67,130 @@ try:
             print(f"GPU configuration error: {e}")
     else:
         print("No GPU detected - will use CPU")
+
+class ModelLoadError(Exception):
+    """The model file exists but can't be loaded"""
+
+def file_sha256(path):
+    """Hex SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _backend_versions():
+    tf_version = tf.__version__ if 'tf' in globals() else 'none'
+    return f"tf{tf_version}-keras{keras.__version__}"
+
+def converted_model_path(source_path, cache_dir=None):
+    """
+    Cached .keras artifact of a model file
+    
+    Keyed by the file's content hash and the TensorFlow/Keras versions, so a
+    retrained model or a library upgrade gets a fresh conversion.
+    """
+    key = f"{file_sha256(source_path)[:16]}-{_backend_versions()}"
+    return os.path.join(cache_dir or CONVERTED_DIR, key + '.keras')
+
+def cache_converted_model(model, source_path, cache_dir=None):
+    """
+    Save a loaded model as the converted artifact of source_path
+    
+    The artifact is loaded back and must give the same output as the model
+    before it replaces the cache entry. Returns its path, or None.
+    """
+    path = converted_model_path(source_path, cache_dir)
+    tmp_path = f"{path[:-len('.keras')]}.{os.getpid()}.tmp.keras"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        model.save(tmp_path)
         
-except ImportError:
-    import keras
-    from keras import layers
-    print("Using Keras without TensorFlow GPU support")
+        size = model_input_size(model)
+        sample = np.random.RandomState(0).rand(1, size, size, 3).astype('float32')
+        reloaded = keras.models.load_model(tmp_path)
+        if not np.allclose(model.predict(sample, verbose=0), reloaded.predict(sample, verbose=0), atol=1e-5):
+            raise ValueError("converted model output differs from the source model")
+        
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠ Could not cache converted model: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    
+    # Conversions of the same file for other TensorFlow/Keras versions
+    prefix = os.path.basename(path).split('-')[0]
+    for stale_path in glob.glob(os.path.join(os.path.dirname(path), prefix + '-*.keras')):
+        if stale_path != path and '.tmp.' not in stale_path:
+            os.remove(stale_path)
+    return path
 
-try:
-    import dlib
-    DLIB_AVAILABLE = True
-except ImportError:
-    DLIB_AVAILABLE = False
-    print("Warning: dlib not available. Using basic OpenCV features only.")
+def score_to_status(score):
+    """Map a model probability to the screening status reported by predict"""
+    if score > 0.7:
+        return "positive"
+    elif score > 0.4:
+        return "inconclusive"
+    return "negative"
+
+def model_input_size(model, default=224):
+    """Square input resolution a Keras image model expects"""
+    try:
+        height = model.input_shape[1]
+    except (AttributeError, IndexError, TypeError):
+        return default
+    return int(height) if height else default
+
+def load_model_artifact(model_path):
+    """
+    Load a model file for inference, through its converted artifact
     
-import json
+    Returns (model, sidecar metadata). Unlike AutismDetector.load_model there
+    are no compatibility fixes or fallbacks.
+    """
+    configure_devices()
+    converted_path = converted_model_path(model_path)
+    if os.path.exists(converted_path):
+        model = keras.models.load_model(converted_path)
+    else:
+        model = keras.models.load_model(model_path)
+        cache_converted_model(model, model_path)
+    
+    try:
+        with open(os.path.splitext(model_path)[0] + '.meta.json', 'r') as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        metadata = {}
+    return model, metadata
 
 class AutismDetector:
     """
     AI model for detecting potential autism in children through facial expression analysis
     """
     
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, init_model=True, variant='standard'):
         self.model = None
+        # Square input resolution and MobileNetV2 width multiplier of the model
+        self.input_size = 224
+        self.alpha = 1.0
+        # Registry version being served (see model_registry.py), if any
+        self.model_version = None
+        # Extra models voting next to the served one (see load_ensemble)
+        self.ensemble = None
+        # Candidate model scoring sampled inputs in the background (see load_shadow)
+        self.shadow = None
+        # Identifies the served weights across restarts: the registry version
+        # or the model file's hash prefix; None for unsaved models
+        self.model_tag = None
+        # How the last load_model() went: source ('converted' or a result of
+        # _load_model_file) and seconds
+        self.load_stats = {}
+        # Guards model/input_size/input_mode so predict never mixes two models
+        self._swap_lock = threading.Lock()
+        # 'full_image' models score the whole photo, 'face_crop' models score
+        # the aligned face crop produced by align_face()
+        self.input_mode = 'full_image'
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
         )
@@ -75,21 +220,51 @@ class AutismDetector:
             except Exception as e:
                 print(f"Could not load dlib predictor: {e}")
         
-        self.model_path = model_path or os.path.join(os.path.dirname(__file__), 'autism_model.h5')
+        self.variant = variant
+        self.model_path = model_path or os.path.join(os.path.dirname(__file__), MODEL_FILENAME)
+        if model_path is None and variant == 'fast':
+            fast_path = os.path.join(os.path.dirname(__file__), FAST_MODEL_FILENAME)
+            if os.path.exists(fast_path):
+                self.model_path = fast_path
+            else:
+                print(f"Warning: Fast model not found at {fast_path}, using the standard model")
+        
+        # Dataset preparation workers only need the detectors, not the CNN
+        if not init_model:
+            return
         
-        # Load or create model
+        self.load_or_create_model()
+    
+    def load_or_create_model(self):
+        """Load the model file, or create a new model of the variant's architecture if there is none"""
         if os.path.exists(self.model_path):
             self.load_model()
         else:
-            self.create_model()
+            self.create_model(**VARIANT_ARCHITECTURES.get(self.variant, VARIANT_ARCHITECTURES['standard']))
     
-    def create_model(self):
-        """Create a model for autism detection using Transfer Learning (MobileNetV2)"""
+    def create_model(self, learning_rate=0.001, dropout=(0.5, 0.3), input_size=224, alpha=1.0,
+                     weights='imagenet'):
+        """
+        Create a model for autism detection using Transfer Learning (MobileNetV2)
+        
+        input_size and alpha (width multiplier) select smaller, faster variants;
+        ImageNet weights exist for sizes 96/128/160/192/224 and alpha
+        0.35/0.5/0.75/1.0/1.3/1.4. Use weights=None when the weights are set
+        afterwards anyway.
+        """
+        configure_devices()
+        # A single rate applies to both dropout layers of the head
+        if isinstance(dropout, (int, float)):
+            dropout = (dropout, dropout)
+        self.input_size = input_size
+        self.alpha = alpha
+        self.model_tag = None
         try:
             base_model = tf.keras.applications.MobileNetV2(
-                input_shape=(224, 224, 3),
+                input_shape=(input_size, input_size, 3),
+                alpha=alpha,
                 include_top=False,
-                weights='imagenet'
+                weights=weights
             )
             
             # Freeze base model layers
@@ -99,29 +274,28 @@ class AutismDetector:
                 base_model,
                 layers.GlobalAveragePooling2D(),
                 layers.Dense(128, activation='relu'),
-                layers.Dropout(0.5),
+                layers.Dropout(dropout[0]),
                 layers.Dense(64, activation='relu'),
-                layers.Dropout(0.3),
-                layers.Dense(1, activation='sigmoid')
+                layers.Dropout(dropout[1]),
+                # Keep the output in float32 under mixed precision policies
+                layers.Dense(1, activation='sigmoid', dtype='float32')
             ])
             
-            self.model.compile(
-                optimizer=keras.optimizers.Adam(learning_rate=0.001),
-                loss='binary_crossentropy',
-                metrics=['accuracy']
-            )
+            self.compile_model(learning_rate=learning_rate)
             print("Created MobileNetV2 based model")
             
         except Exception as e:
             print(f"Error creating MobileNetV2 model: {e}")
             print("Falling back to simple CNN")
             # Fallback to simple CNN if MobileNetV2 fails (e.g. no internet for weights)
-            self._create_simple_cnn()
+            self._create_simple_cnn(learning_rate=learning_rate, input_size=input_size)
 
-    def _create_simple_cnn(self):
+    def _create_simple_cnn(self, learning_rate=0.001, input_size=224):
         """Fallback simple CNN"""
+        self.input_size = input_size
+        self.model_tag = None
         self.model = keras.Sequential([
-            layers.Input(shape=(224, 224, 3)),
+            layers.Input(shape=(input_size, input_size, 3)),
             layers.Conv2D(32, (3, 3), activation='relu', padding='same'),
             layers.MaxPooling2D((2, 2)),
             layers.Conv2D(64, (3, 3), activation='relu', padding='same'),
@@ -130,22 +304,202 @@ class AutismDetector:
             layers.MaxPooling2D((2, 2)),
             layers.Flatten(),
             layers.Dense(64, activation='relu'),
-            layers.Dense(1, activation='sigmoid')
+            layers.Dense(1, activation='sigmoid', dtype='float32')
         ])
         
+        self.compile_model(learning_rate=learning_rate)
+    
+    def compile_model(self, learning_rate=0.001, **compile_kwargs):
+        """
+        (Re)compile the model with Adam and binary cross-entropy
+        
+        Extra keyword arguments (e.g. jit_compile, steps_per_execution) are
+        passed through to model.compile. Recompiling resets the optimizer.
+        """
         self.model.compile(
-            optimizer='adam',
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
             loss='binary_crossentropy',
-            metrics=['accuracy']
+            metrics=['accuracy'],
+            **compile_kwargs
         )
     
+    def swap_model(self, model, input_mode='full_image', alpha=1.0, version=None):
+        """Atomically replace the served model, e.g. after a hot reload"""
+        input_size = model_input_size(model)
+        with self._swap_lock:
+            self.model = model
+            self.input_size = input_size
+            self.input_mode = input_mode
+            self.alpha = alpha
+            self.model_version = version
+            self.model_tag = version
+    
+    def _serving_snapshot(self):
+        """Model, model tag, input size and input mode as one consistent set"""
+        with self._swap_lock:
+            return self.model, self.model_tag, self.input_size, self.input_mode
+    
+    def serving_model_and_tag(self):
+        """The served model together with its model_tag"""
+        with self._swap_lock:
+            return self.model, self.model_tag
+    
+    def load_ensemble(self, specs, primary_weight=1.0, deadline_ms=200):
+        """
+        Combine the served model with extra models
+        
+        specs are (model_path, weight) pairs. Members run concurrently with
+        the served model and are left out of a prediction if they don't
+        answer within deadline_ms.
+        """
+        try:
+            from .ensemble import EnsembleMember, ModelEnsemble, member_name
+        except ImportError:
+            from ensemble import EnsembleMember, ModelEnsemble, member_name
+        
+        members = []
+        for model_path, weight in specs:
+            model, metadata = load_model_artifact(model_path)
+            member = EnsembleMember(
+                member_name(model_path), model, weight,
+                input_size=model_input_size(model),
+                input_mode=metadata.get('input_mode', 'full_image')
+            )
+            # Trace the member before it gets a deadline
+            size = member.input_size
+            model.predict(np.zeros((1, size, size, 3), dtype='float32'), verbose=0)
+            members.append(member)
+            print(f"✓ Ensemble member {member.name} (weight {weight:g}, {member.input_mode} {size}px)")
+        
+        self.ensemble = ModelEnsemble(members, primary_weight, deadline_ms) if members else None
+    
+    def load_shadow(self, model_path, db_path, sample_rate=0.1, max_queue=100, scheduler=None):
+        """
+        Score a sample of the served inputs with a candidate model
+        
+        Scores, statuses and latencies of both models are logged to the
+        SQLite table at db_path off the request path (see shadow.py). With a
+        PriorityScheduler the candidate runs in its background lane.
+        """
+        try:
+            from .shadow import ShadowScorer
+        except ImportError:
+            from shadow import ShadowScorer
+        
+        self.shadow = ShadowScorer(model_path, db_path, sample_rate, max_queue, scheduler=scheduler)
+        print(f"✓ Shadow scoring {sample_rate:.0%} of inputs with {model_path}")
+    
+    def _metadata_path(self):
+        """Path of the JSON sidecar describing how the model expects its input"""
+        return os.path.splitext(self.model_path)[0] + '.meta.json'
+    
+    def _load_metadata(self):
+        """Read the model sidecar, if the model was saved with one"""
+        try:
+            with open(self._metadata_path(), 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.input_mode = metadata.get('input_mode', self.input_mode)
+        self.alpha = metadata.get('alpha', self.alpha)
+    
+    def _save_metadata(self):
+        """Write the model sidecar next to the model file"""
+        with open(self._metadata_path(), 'w') as f:
+            json.dump({
+                'input_mode': self.input_mode,
+                'input_size': self.input_size,
+                'alpha': self.alpha
+            }, f, indent=2)
+    
     def load_model(self):
-        """Load pre-trained model with enhanced compatibility fixes"""
+        """
+        Load the pre-trained model
+        
+        The converted artifact cached by a previous load is used when there is
+        one; otherwise the model file is loaded (with compatibility fixes if
+        needed) and converted for the next start.
+        """
+        configure_devices()
+        self._load_metadata()
+        start = time.perf_counter()
+        
+        converted_path = converted_model_path(self.model_path)
+        file_tag = os.path.basename(converted_path)[:16]
+        if os.path.exists(converted_path):
+            try:
+                self.model = keras.models.load_model(converted_path)
+                self.input_size = model_input_size(self.model)
+                self.model_tag = file_tag
+                self.load_stats = {'source': 'converted', 'seconds': time.perf_counter() - start}
+                print(f"✓ Model loaded from converted artifact {converted_path} "
+                      f"({self.load_stats['seconds']:.2f}s)")
+                return
+            except Exception as e:
+                print(f"⚠ Converted model could not be loaded, converting again: {e}")
+        
+        source = self._load_model_file()
+        self.load_stats = {'source': source, 'seconds': time.perf_counter() - start}
+        self.model_tag = file_tag
+        print(f"   Model load took {self.load_stats['seconds']:.2f}s ({source})")
+        self.convert_model()
+    
+    def convert_model(self):
+        """
+        Cache the loaded model in the current Keras format
+        
+        Models loaded through the compatibility shims are first rebuilt from
+        standard layers, so the artifact loads without them.
+        """
+        # Only a model loaded from the file on disk is cached as its conversion
+        if self.model is None or self.load_stats.get('source') not in ('standard', 'compatibility') \
+                or not os.path.exists(self.model_path):
+            return None
+        model = self.model
+        if self.load_stats.get('source') == 'compatibility':
+            model = self._rebuild_standard_model()
+            if model is None:
+                print("⚠ Model architecture not recognized, not converting")
+                return None
+        
+        path = cache_converted_model(model, self.model_path)
+        if path:
+            self.model = model
+            self.model_tag = os.path.basename(path)[:16]
+            print(f"✓ Converted model cached at {path}")
+        return path
+    
+    def _rebuild_standard_model(self):
+        """Copy the loaded weights into a freshly built model of the same architecture"""
+        loaded, tag, weights = self.model, self.model_tag, self.model.get_weights()
+        builders = (
+            lambda: self.create_model(input_size=self.input_size, alpha=self.alpha, weights=None),
+            lambda: self._create_simple_cnn(input_size=self.input_size)
+        )
+        for build in builders:
+            try:
+                build()
+                self.model.set_weights(weights)
+                rebuilt = self.model
+                break
+            except Exception:
+                rebuilt = None
+        self.model, self.model_tag = loaded, tag
+        return rebuilt
+    
+    def _load_model_file(self):
+        """
+        Load model_path with enhanced compatibility fixes
+        
+        Returns which path succeeded: 'standard' or 'compatibility'. Raises
+        ModelLoadError when neither can load the file.
+        """
         try:
             # First try standard load
             self.model = keras.models.load_model(self.model_path)
+            self.input_size = model_input_size(self.model)
             print(f"✓ Model loaded successfully from {self.model_path}")
-            return
+            return 'standard'
         except Exception as e:
             print(f"Standard load failed: {e}")
             print("Attempting compatibility fixes...")
@@ -243,8 +597,9 @@ class AutismDetector:
             except:
                 pass  # Model might already be compiled
             
+            self.input_size = model_input_size(self.model)
             print(f"✓ Model loaded with compatibility fixes from {self.model_path}")
-            return
+            return 'compatibility'
             
         except Exception as e2:
             error_msg = str(e2).lower()
@@ -254,35 +609,17 @@ class AutismDetector:
             else:
                 print(f"⚠ Compatibility fix failed: {e2}")
             
-            print("   Creating new model as fallback (this is normal and the API will work fine)...")
-            
-            # If the saved model is incompatible, create a new one
-            # This ensures the API always works, even if the saved model is corrupted/incompatible
-            self.create_model()
-            
-            # Save the new model so it can be loaded next time
-            try:
-                # Backup old incompatible model
-                import shutil
-                if os.path.exists(self.model_path):
-                    backup_path = self.model_path + '.incompatible_backup'
-                    try:
-                        shutil.copy2(self.model_path, backup_path)
-                        print(f"   Old model backed up to: {backup_path}")
-                    except:
-                        pass  # If backup fails, continue anyway
-                
-                # Save new model
-                self.save_model()
-                print("   ✓ New model created and saved. Future startups will load this model.")
-            except Exception as e3:
-                print(f"   Note: Could not save new model: {e3}")
-                print("   The model will work for this session but will need to be recreated on next startup.")
+            # Serving an untrained model in its place would return meaningless scores
+            raise ModelLoadError(
+                f"Could not load the model at {self.model_path}: {e2}. Retrain it with train_model.py "
+                f"or restore a working file; no replacement model is created."
+            ) from e2
     
     def save_model(self):
         """Save trained model"""
         if self.model:
             self.model.save(self.model_path)
+            self._save_metadata()
             print(f"Model saved to {self.model_path}")
     
     def _download_landmark_predictor(self, save_path):
@@ -304,7 +641,7 @@ class AutismDetector:
             print(f"Failed to download predictor: {e}")
             raise
     
-    def preprocess_image(self, image_array):
+    def preprocess_image(self, image_array, size=None):
         """Preprocess image for model input"""
         # Convert to RGB if grayscale
         if len(image_array.shape) == 2:
@@ -313,7 +650,8 @@ class AutismDetector:
             image_array = cv2.cvtColor(image_array, cv2.COLOR_RGBA2RGB)
         
         # Resize to model input size
-        image_resized = cv2.resize(image_array, (224, 224))
+        size = size or self.input_size
+        image_resized = cv2.resize(image_array, (size, size))
         
         # Preprocess for MobileNetV2 (expects values in [-1, 1])
         # tf.keras.applications.mobilenet_v2.preprocess_input does this
@@ -364,6 +702,42 @@ class AutismDetector:
             
         return faces
     
+    def align_face(self, image_array, face_region, size=(224, 224), margin=0.2):
+        """Crop a face region, levelling the eyes first when landmarks are available"""
+        if len(image_array.shape) == 2:
+            image_array = cv2.cvtColor(image_array, cv2.COLOR_GRAY2RGB)
+        elif image_array.shape[2] == 4:
+            image_array = cv2.cvtColor(image_array, cv2.COLOR_RGBA2RGB)
+        
+        x, y, w, h = [int(v) for v in face_region]
+        
+        # Rotate around the face centre so the line between the eyes is horizontal
+        if self.predictor and self.detector:
+            try:
+                gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+                shape = self.predictor(gray, dlib.rectangle(x, y, x + w, y + h))
+                left_eye = np.mean([(shape.part(i).x, shape.part(i).y) for i in range(36, 42)], axis=0)
+                right_eye = np.mean([(shape.part(i).x, shape.part(i).y) for i in range(42, 48)], axis=0)
+                angle = np.degrees(np.arctan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0]))
+                rotation = cv2.getRotationMatrix2D((x + w / 2.0, y + h / 2.0), angle, 1.0)
+                image_array = cv2.warpAffine(
+                    image_array, rotation, (image_array.shape[1], image_array.shape[0]),
+                    flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT
+                )
+            except Exception:
+                pass  # Fall back to the unaligned crop
+        
+        # Expand the box so the crop keeps some context around the face
+        pad_x = int(w * margin)
+        pad_y = int(h * margin)
+        x_start = max(0, x - pad_x)
+        y_start = max(0, y - pad_y)
+        x_end = min(image_array.shape[1], x + w + pad_x)
+        y_end = min(image_array.shape[0], y + h + pad_y)
+        
+        crop = image_array[y_start:y_end, x_start:x_end]
+        return cv2.resize(crop, size)
+    
     def detect_eyes(self, image_array, face_region):
         """Detect eyes in a face region with improved accuracy"""
         if self.predictor and self.detector:
@@ -717,88 +1091,249 @@ class AutismDetector:
         except:
             return 0.5
     
-    def predict(self, image_array):
+    def predict(self, image_array, deadline_ms=None, return_prepared=False):
         """
         Predict autism probability from image
         
         Args:
             image_array: numpy array of image (RGB)
+            deadline_ms: ensemble members slower than this are left out
+                (default: the ensemble's deadline)
+            return_prepared: also return the prepared model input (see
+                prepare_prediction), None if the image wasn't scored
         
         Returns:
             dict with prediction results
         """
         try:
-            # Detect faces
-            faces = self.detect_faces(image_array)
-            
-            # Check if any face is detected
-            if len(faces) == 0:
-                return {
-                    'score': 0.0,
-                    'status': 'no_face_detected',
-                    'confidence': 0.0,
-                    'features': {
-                        'face_count': 0,
-                        'eye_contact': 0.0,
-                        'face_symmetry': 0.0,
-                        'expression_intensity': 0.0,
-                        'head_position': 'unknown'
-                    },
-                    'recommendations': ["No face detected in the image. Please upload an image with a clear view of the face."]
-                }
-            
-            # Extract facial features
-            features = self.extract_facial_features(image_array, faces)
-            
-            # Check if eyes were detected (eye_contact > 0)
-            # If eye_contact is 0.0, it means no eyes were found
-            if features.get('eye_contact', 0.0) < 0.1:
-                return {
-                    'score': 0.0,
-                    'status': 'no_face_detected',
-                    'confidence': 0.0,
-                    'features': features,
-                    'recommendations': ["Face detected but eyes not visible. Please upload an image where the eyes are clearly visible."]
-                }
-            
-            # Preprocess image for model
-            processed_image = self.preprocess_image(image_array)
-            processed_image = np.expand_dims(processed_image, axis=0)
-            
-            # Make prediction
-            prediction = self.model.predict(processed_image, verbose=0)[0][0]
-            
-            # Calculate confidence (distance from 0.5)
-            confidence = abs(prediction - 0.5) * 2
-            
-            # Determine status based on prediction and features
-            if prediction > 0.7:
-                status = "positive"
-                recommendations = self.get_positive_recommendations(features)
-            elif prediction > 0.4:
-                status = "inconclusive"
-                recommendations = self.get_inconclusive_recommendations(features)
+            result, prepared = self.prepare_prediction(image_array)
+            if result is None:
+                result = self.score_prepared([prepared], deadline_ms)[0]
+        
+        except Exception as e:
+            result, prepared = self._error_result(e), None
+        
+        return (result, prepared) if return_prepared else result
+    
+    def predict_batch(self, image_arrays, deadline_ms=None, return_prepared=False):
+        """
+        Predict several images with one model call; results are in input order
+        
+        With return_prepared, returns (results, prepared inputs) where the
+        prepared input is None for images that weren't scored.
+        """
+        results = [None] * len(image_arrays)
+        prepared_inputs = [None] * len(image_arrays)
+        pending = []
+        for i, image_array in enumerate(image_arrays):
+            try:
+                result, prepared = self.prepare_prediction(image_array)
+            except Exception as e:
+                result, prepared = self._error_result(e), None
+            if result is not None:
+                results[i] = result
             else:
-                status = "negative"
-                recommendations = self.get_negative_recommendations()
-            
+                pending.append((i, prepared))
+        
+        if pending:
+            try:
+                scored = self.score_prepared([prepared for _, prepared in pending], deadline_ms)
+            except Exception as e:
+                scored = [self._error_result(e)] * len(pending)
+            for (i, prepared), result in zip(pending, scored):
+                results[i] = result
+                if result['status'] != 'error':
+                    prepared_inputs[i] = prepared
+        return (results, prepared_inputs) if return_prepared else results
+    
+    def aggregate_results(self, results, trim=0.2):
+        """
+        Combine the predictions of several photos of the same child
+        
+        The score is a trimmed mean (the highest and lowest `trim` share of
+        scores are left out) so one badly lit or blurry photo can't swing it.
+        Agreement is the share of scored photos whose own status matches the
+        combined one and scales the confidence down when photos disagree.
+        
+        Returns:
+            dict like predict's, plus median_score, agreement and image
+            counts; None if none of the photos could be scored
+        """
+        scored = [r for r in results if r['status'] not in ('no_face_detected', 'error')]
+        if not scored:
+            return None
+        
+        scores = np.sort([r['score'] for r in scored])
+        cut = int(len(scores) * trim)
+        kept = scores[cut:len(scores) - cut] if len(scores) > 2 * cut else scores
+        score = float(kept.mean())
+        status = score_to_status(score)
+        agreement = sum(r['status'] == status for r in scored) / len(scored)
+        
+        # Features of the photo closest to the combined score
+        closest = min(scored, key=lambda r: abs(r['score'] - score))
+        features = closest['features']
+        if status == "positive":
+            recommendations = self.get_positive_recommendations(features)
+        elif status == "inconclusive":
+            recommendations = self.get_inconclusive_recommendations(features)
+        else:
+            recommendations = self.get_negative_recommendations()
+        
+        return {
+            'score': score,
+            'median_score': float(np.median(scores)),
+            'score_range': [float(scores[0]), float(scores[-1])],
+            'status': status,
+            'confidence': float(abs(score - 0.5) * 2 * agreement),
+            'agreement': float(agreement),
+            'images_scored': len(scored),
+            'images_total': len(results),
+            'features': features,
+            'recommendations': recommendations,
+            'model_version': closest.get('model_version')
+        }
+    
+    def prepare_prediction(self, image_array):
+        """
+        Face checks and model input for one image, everything but the model call
+        
+        Returns:
+            (result, None) when the image can't be scored (no face or eyes),
+            otherwise (None, prepared) to pass to score_prepared()
+        """
+        # Detect faces
+        faces = self.detect_faces(image_array)
+        
+        # Check if any face is detected
+        if len(faces) == 0:
             return {
-                'score': float(prediction),
-                'status': status,
-                'confidence': float(confidence),
-                'features': features,
-                'recommendations': recommendations
-            }
+                'score': 0.0,
+                'status': 'no_face_detected',
+                'confidence': 0.0,
+                'features': {
+                    'face_count': 0,
+                    'eye_contact': 0.0,
+                    'face_symmetry': 0.0,
+                    'expression_intensity': 0.0,
+                    'head_position': 'unknown'
+                },
+                'recommendations': ["No face detected in the image. Please upload an image with a clear view of the face."]
+            }, None
         
-        except Exception as e:
-            print(f"Error during prediction: {e}")
+        # Extract facial features
+        features = self.extract_facial_features(image_array, faces)
+        
+        # Check if eyes were detected (eye_contact > 0)
+        # If eye_contact is 0.0, it means no eyes were found
+        if features.get('eye_contact', 0.0) < 0.1:
             return {
                 'score': 0.0,
-                'status': 'error',
+                'status': 'no_face_detected',
                 'confidence': 0.0,
-                'features': {},
-                'recommendations': [f"Error during analysis: {str(e)}"]
+                'features': features,
+                'recommendations': ["Face detected but eyes not visible. Please upload an image where the eyes are clearly visible."]
+            }, None
+        
+        # Preprocess image for model
+        model, model_tag, input_size, input_mode = self._serving_snapshot()
+        processed_image = self._model_input(image_array, faces[0], input_size, input_mode)
+        
+        # The input only fits the model it was prepared for, even if another
+        # model is swapped in before scoring
+        prepared = {
+            'model': model,
+            'model_tag': model_tag,
+            'input': processed_image,
+            'input_mode': input_mode,
+            'features': features,
+            'ensemble': self.ensemble
+        }
+        if prepared['ensemble'] is not None:
+            prepared['member_inputs'] = {
+                key: self._model_input(image_array, faces[0], key[1], key[0])
+                for key in prepared['ensemble'].input_keys()
             }
+        return None, prepared
+    
+    def _model_input(self, image_array, face, input_size, input_mode):
+        if input_mode == 'face_crop':
+            return self.preprocess_image(
+                self.align_face(image_array, face, size=(input_size, input_size)), size=input_size
+            )
+        return self.preprocess_image(image_array, size=input_size)
+    
+    def score_prepared(self, prepared, deadline_ms=None):
+        """Run the model over prepared inputs, one call per model; results in input order"""
+        results = [None] * len(prepared)
+        by_model = {}
+        for i, item in enumerate(prepared):
+            by_model.setdefault((id(item['model']), id(item['ensemble'])), []).append(i)
+        
+        for indices in by_model.values():
+            first = prepared[indices[0]]
+            batch = np.stack([prepared[i]['input'] for i in indices])
+            start = time.perf_counter()
+            if first['ensemble'] is None:
+                predictions = first['model'].predict(batch, verbose=0)[:, 0]
+                for i, prediction in zip(indices, predictions):
+                    results[i] = self._result_from_score(prediction, prepared[i]['features'])
+            else:
+                member_batches = {
+                    key: np.stack([prepared[i]['member_inputs'][key] for i in indices])
+                    for key in first['member_inputs']
+                }
+                predictions, member_scores, dropped = first['ensemble'].score(
+                    first['model'], batch, member_batches, deadline_ms
+                )
+                for j, (i, prediction) in enumerate(zip(indices, predictions)):
+                    results[i] = self._result_from_score(prediction, prepared[i]['features'])
+                    results[i]['ensemble'] = {
+                        'members': {name: float(scores[j]) for name, scores in member_scores.items()},
+                        'dropped': dropped
+                    }
+            
+            for i in indices:
+                # Kept with a saved assessment
+                results[i]['model_version'] = prepared[i].get('model_tag')
+            
+            shadow = self.shadow
+            if shadow is not None:
+                elapsed_ms = (time.perf_counter() - start) * 1000 / len(indices)
+                for i in indices:
+                    shadow.submit(prepared[i], results[i], elapsed_ms, prepared[i].get('model_tag'))
+        return results
+    
+    def _result_from_score(self, prediction, features):
+        # Calculate confidence (distance from 0.5)
+        confidence = abs(prediction - 0.5) * 2
+        
+        # Determine status based on prediction and features
+        status = score_to_status(prediction)
+        if status == "positive":
+            recommendations = self.get_positive_recommendations(features)
+        elif status == "inconclusive":
+            recommendations = self.get_inconclusive_recommendations(features)
+        else:
+            recommendations = self.get_negative_recommendations()
+        
+        return {
+            'score': float(prediction),
+            'status': status,
+            'confidence': float(confidence),
+            'features': features,
+            'recommendations': recommendations
+        }
+    
+    def _error_result(self, e):
+        print(f"Error during prediction: {e}")
+        return {
+            'score': 0.0,
+            'status': 'error',
+            'confidence': 0.0,
+            'features': {},
+            'recommendations': [f"Error during analysis: {str(e)}"]
+        }
     
     def get_positive_recommendations(self, features):
         """Get recommendations when autism indicators are detected"""
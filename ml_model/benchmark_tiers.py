@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Train and benchmark resolution-tiered model variants
+
+For every input resolution (96/128/160/224 by default) this trains a
+MobileNetV2 model with the given width multiplier, evaluates it on the test
+split and then measures CPU inference latency and memory in a fresh
+process, so each tier's footprint is measured as it would be served.
+Prints a latency/memory/accuracy table and writes it to JSON.
+
+Usage:
+    python benchmark_tiers.py --sizes 96 128 160 224 --alpha 1.0 --epochs 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(ML_MODEL_DIR, 'tiers')
+
+
+def parse_args(argv=None):
+    """Command line options for the tier benchmark"""
+    parser = argparse.ArgumentParser(description='Benchmark resolution-tiered model variants')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[96, 128, 160, 224])
+    parser.add_argument('--alpha', type=float, default=1.0)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=100,
+                        help='Timed single-image predictions per tier')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    # Internal: run one stage of one tier in a child process
+    parser.add_argument('--train-tier', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--measure-tier', type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _model_path(output_dir, size, alpha):
+    return os.path.join(output_dir, f'autism_model_{size}_a{alpha:g}.h5')
+
+
+def train_tier(args, size):
+    """Train one tier and return its test accuracy"""
+    sys.path.insert(0, ML_MODEL_DIR)
+    from autism_detector import AutismDetector, keras
+    from train_model import create_dataset
+
+    result = create_dataset(img_size=(size, size))
+    if result is None:
+        raise SystemExit("Cannot benchmark without dataset")
+    X_train, X_val, X_test, y_train, y_val, y_test = result
+
+    detector = AutismDetector(model_path=_model_path(args.output_dir, size, args.alpha), init_model=False)
+    detector.create_model(input_size=size, alpha=args.alpha)
+    start = time.perf_counter()
+    detector.model.fit(
+        X_train, y_train,
+        validation_data=(X_val, y_val),
+        epochs=args.epochs,
+        batch_size=32,
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+        verbose=2
+    )
+    train_seconds = time.perf_counter() - start
+    _, test_accuracy = detector.model.evaluate(X_test, y_test, verbose=0)
+    detector.save_model()
+
+    return {'test_accuracy': float(test_accuracy), 'train_seconds': round(train_seconds, 1)}
+
+
+def measure_tier(args, size):
+    """Load a trained tier like the API does and time single-image inference"""
+    sys.path.insert(0, ML_MODEL_DIR)
+    import numpy as np
+    from autism_detector import AutismDetector
+    from cpu_tuning import peak_memory_mb
+
+    start = time.perf_counter()
+    detector = AutismDetector(model_path=_model_path(args.output_dir, size, args.alpha))
+    load_seconds = time.perf_counter() - start
+
+    image = np.random.randint(0, 255, (480, 640, 3), dtype='uint8')
+    batch = np.expand_dims(detector.preprocess_image(image), axis=0)
+    detector.model.predict(batch, verbose=0)  # Warm-up
+
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        detector.model.predict(detector.preprocess_image(image)[None], verbose=0)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'parameters': int(detector.model.count_params()),
+        'load_seconds': round(load_seconds, 2),
+        'latency_median_ms': round(float(np.median(timings)), 2),
+        'latency_p95_ms': round(float(np.percentile(timings, 95)), 2),
+        'peak_memory_mb': round(peak_memory_mb(), 1)
+    }
+
+
+def _run_child(args, flag, size):
+    """Run one stage in a fresh interpreter and return its JSON result"""
+    command = [
+        sys.executable, os.path.abspath(__file__), flag, str(size),
+        '--alpha', str(args.alpha), '--epochs', str(args.epochs),
+        '--runs', str(args.runs), '--output-dir', args.output_dir
+    ]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    # The result is the last line; everything before is training output
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_table(rows):
+    """Markdown table of the benchmark results"""
+    header = ('Input', 'Alpha', 'Params', 'Test acc', 'Latency p50 (ms)', 'Latency p95 (ms)', 'Peak RSS (MB)')
+    print('| ' + ' | '.join(header) + ' |')
+    print('|' + '|'.join('---' for _ in header) + '|')
+    for row in rows:
+        print(f"| {row['input_size']} | {row['alpha']:g} | {row['parameters']:,} | "
+              f"{row['test_accuracy']:.2%} | {row['latency_median_ms']} | "
+              f"{row['latency_p95_ms']} | {row['peak_memory_mb']} |")
+
+
+def run_benchmark(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = []
+    for size in args.sizes:
+        print(f"\n=== Tier {size}x{size} (alpha={args.alpha:g}) ===")
+        row = {'input_size': size, 'alpha': args.alpha}
+        row.update(_run_child(args, '--train-tier', size))
+        row.update(_run_child(args, '--measure-tier', size))
+        rows.append(row)
+
+    report_path = os.path.join(args.output_dir, 'tiers_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(rows, f, indent=2)
+
+    print()
+    print_table(rows)
+    print(f"\nReport saved to {report_path}")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.train_tier:
+        print(json.dumps(train_tier(args, args.train_tier)))
+    elif args.measure_tier:
+        print(json.dumps(measure_tier(args, args.measure_tier)))
+    else:
+        run_benchmark(args)
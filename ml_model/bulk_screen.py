@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Bulk screening of an image folder
+
+Walks a directory tree, decodes images and runs face detection/feature
+extraction in parallel worker processes (detectors only, no CNN), and
+scores the prepared inputs in batches with the model in this process.
+Results are appended to a CSV or JSONL file, or bulk inserted into a SQLite
+database, one batch at a time.
+
+After every batch a checkpoint line is appended to <output>.checkpoint. A
+killed run started again with the same arguments skips the images already
+written (and drops any output written after the last checkpoint), so
+nothing is scored twice or lost.
+
+Usage:
+    python bulk_screen.py /data/clinic_photos --output results.csv --workers 8 --batch-size 32
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+from multiprocessing import get_context
+
+import cv2
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ML_MODEL_DIR)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+FIELDS = ('path', 'status', 'score', 'confidence', 'face_count', 'eye_contact', 'face_symmetry',
+          'expression_intensity', 'head_position', 'model', 'error')
+
+# Per-process detector, created once by _init_worker
+_worker_detector = None
+
+
+def list_images(root):
+    """Image paths under root relative to it, in a stable order"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), root))
+    return paths
+
+
+def _init_worker(input_size, input_mode):
+    """Create a detector without the CNN that prepares inputs for the served model"""
+    global _worker_detector
+    from autism_detector import AutismDetector
+    _worker_detector = AutismDetector(init_model=False)
+    _worker_detector.input_size = input_size
+    _worker_detector.input_mode = input_mode
+
+
+def _prepare_image(task):
+    """Decode and prepare one image: (path, result or None, model input, features)"""
+    root, rel_path = task
+    img = cv2.imread(os.path.join(root, rel_path))
+    if img is None:
+        return rel_path, {'status': 'unreadable', 'error': 'Could not read image'}, None, None
+    try:
+        result, prepared = _worker_detector.prepare_prediction(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    except Exception as e:
+        return rel_path, {'status': 'error', 'error': str(e)}, None, None
+    if result is not None:
+        return rel_path, result, None, None
+    return rel_path, None, prepared['input'], prepared['features']
+
+
+def _number(value, cast=float):
+    # Feature values may be numpy scalars, which JSON and SQLite don't take
+    return cast(value) if value is not None else None
+
+
+def _row(rel_path, result, model_tag):
+    features = result.get('features') or {}
+    scored = result['status'] in ('positive', 'inconclusive', 'negative')
+    error = result.get('error')
+    if error is None and not scored and result.get('recommendations'):
+        error = result['recommendations'][0]
+    return {
+        'path': rel_path,
+        'status': result['status'],
+        'score': _number(result['score']) if scored else None,
+        'confidence': _number(result['confidence']) if scored else None,
+        'face_count': _number(features.get('face_count'), int),
+        'eye_contact': _number(features.get('eye_contact')),
+        'face_symmetry': _number(features.get('face_symmetry')),
+        'expression_intensity': _number(features.get('expression_intensity')),
+        'head_position': features.get('head_position'),
+        'model': model_tag if scored else None,
+        'error': error
+    }
+
+
+class _FileWriter:
+    """Appends rows to a CSV or JSONL file; the offset marks what is durable"""
+
+    def __init__(self, path, resume_offset):
+        self.path = path
+        self.is_csv = path.lower().endswith('.csv')
+        exists = os.path.exists(path)
+        self.file = open(path, 'a+', newline='' if self.is_csv else None, encoding='utf-8')
+        if resume_offset is not None:
+            # Rows written after the last checkpoint are scored again
+            self.file.truncate(resume_offset)
+        self.file.seek(0, os.SEEK_END)
+        if self.is_csv:
+            self.csv = csv.DictWriter(self.file, fieldnames=FIELDS)
+            if not exists or self.file.tell() == 0:
+                self.csv.writeheader()
+
+    def write_batch(self, rows):
+        for row in rows:
+            if self.is_csv:
+                self.csv.writerow(row)
+            else:
+                self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class _SqliteWriter:
+    """Bulk inserts each batch in one transaction; re-scored rows replace old ones"""
+
+    def __init__(self, path, resume_offset):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bulk_screening (path TEXT PRIMARY KEY, status TEXT, score REAL, "
+            "confidence REAL, face_count INTEGER, eye_contact REAL, face_symmetry REAL, "
+            "expression_intensity REAL, head_position TEXT, model TEXT, error TEXT, created_at TEXT)"
+        )
+
+    def write_batch(self, rows):
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO bulk_screening ({', '.join(FIELDS)}, created_at) "
+                f"VALUES ({', '.join('?' for _ in FIELDS)}, datetime('now'))",
+                [tuple(row[field] for field in FIELDS) for row in rows]
+            )
+        return None
+
+    def close(self):
+        self.conn.close()
+
+
+def read_checkpoint(path):
+    """Paths already written and the output offset of the last checkpoint"""
+    done, offset = set(), None
+    if not os.path.exists(path):
+        return done, offset
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # Cut off by the kill
+            done.update(entry['paths'])
+            offset = entry['offset']
+    return done, offset
+
+
+def _format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def screen(root, output, model_path=None, variant='standard', workers=None, batch_size=32):
+    from autism_detector import AutismDetector
+
+    detector = AutismDetector(model_path=model_path, init_model=False, variant=variant)
+    if not os.path.exists(detector.model_path):
+        raise SystemExit(f"Model not found: {detector.model_path}")
+    detector.load_model()
+    model_tag = detector.model_tag or os.path.basename(detector.model_path)
+
+    checkpoint_path = output + '.checkpoint'
+    done, offset = read_checkpoint(checkpoint_path)
+    images = list_images(root)
+    pending = [path for path in images if path not in done]
+    print(f"{len(images)} images, {len(images) - len(pending)} already screened, {len(pending)} to go")
+    if not pending:
+        return
+
+    if output.lower().endswith(('.db', '.sqlite', '.sqlite3')):
+        writer = _SqliteWriter(output, offset)
+    else:
+        writer = _FileWriter(output, offset)
+    checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+
+    counts = {}
+    rows, prepared = [], []
+
+    def flush():
+        # Score the prepared inputs in one model call, then write and checkpoint
+        if prepared:
+            results = detector.score_prepared([item for _, item in prepared])
+            rows.extend(_row(path, result, model_tag) for (path, _), result in zip(prepared, results))
+        if not rows:
+            return
+        new_offset = writer.write_batch(rows)
+        checkpoint.write(json.dumps({'paths': [row['path'] for row in rows], 'offset': new_offset}) + '\n')
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        for row in rows:
+            counts[row['status']] = counts.get(row['status'], 0) + 1
+        rows.clear()
+        prepared.clear()
+
+    workers = workers or os.cpu_count() or 1
+    start = last_report = time.monotonic()
+    processed = 0
+    try:
+        # spawn keeps TensorFlow state from this process out of the workers
+        with get_context('spawn').Pool(processes=workers, initializer=_init_worker,
+                                       initargs=(detector.input_size, detector.input_mode)) as pool:
+            tasks = ((root, path) for path in pending)
+            for rel_path, result, model_input, features in pool.imap_unordered(_prepare_image, tasks, chunksize=4):
+                if result is not None:
+                    rows.append(_row(rel_path, result, model_tag))
+                else:
+                    prepared.append((rel_path, {
+                        'model': detector.model, 'input': model_input, 'input_mode': detector.input_mode,
+                        'features': features, 'ensemble': None
+                    }))
+                processed += 1
+                if len(prepared) >= batch_size or len(rows) >= batch_size:
+                    flush()
+
+                now = time.monotonic()
+                if now - last_report >= 5 or processed == len(pending):
+                    last_report = now
+                    rate = processed / (now - start)
+                    eta = (len(pending) - processed) / rate if rate else 0
+                    print(f"  {processed}/{len(pending)} images, {rate:.1f} images/sec, ETA {_format_eta(eta)}")
+            flush()
+    finally:
+        writer.close()
+        checkpoint.close()
+
+    elapsed = time.monotonic() - start
+    print(f"✓ Screened {processed} images in {_format_eta(elapsed)} -> {output}")
+    for status, count in sorted(counts.items()):
+        print(f"  {status}: {count}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Screen every image in a folder tree')
+    parser.add_argument('root', help='Folder of images (searched recursively)')
+    parser.add_argument('--output', required=True, help='Results file: .csv, .jsonl or .db (SQLite)')
+    parser.add_argument('--model', default=None, help='Model file (default: the variant\'s model)')
+    parser.add_argument('--variant', default='standard', choices=['standard', 'fast'])
+    parser.add_argument('--workers', type=int, default=None, help='Decoding/face detection processes')
+    parser.add_argument('--batch-size', type=int, default=32, help='Images per model call')
+    args = parser.parse_args()
+
+    screen(args.root, args.output, args.model, args.variant, args.workers, args.batch_size)
@@ -0,0 +1,230 @@
+"""
+Periodic, asynchronous training checkpoints for the autism detection model
+
+A checkpoint holds the model weights, the optimizer state, the epoch, the
+training history so far and the numpy/python RNG state. Keras shuffles each
+epoch with its own iterator state, which isn't saved, so a resumed run
+continues from the right epoch with the right weights but doesn't replay the
+exact batch order of an uninterrupted run.
+
+Each training run writes into its own directory under the checkpoint
+directory (run-YYYYmmdd-HHMMSS), named in the latest_run file, so a new run
+never mixes its checkpoints with an earlier run's; --resume continues the
+latest run.
+"""
+
+import os
+import json
+import time
+import pickle
+import random
+import threading
+import queue
+
+import numpy as np
+
+try:
+    from tensorflow import keras
+except ImportError:
+    import keras
+
+INDEX_FILENAME = 'checkpoints.json'
+LATEST_RUN_FILENAME = 'latest_run'
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints')
+
+
+def _optimizer_variables(optimizer):
+    """Optimizer variables across Keras versions (property or method)"""
+    variables = optimizer.variables
+    return variables() if callable(variables) else variables
+
+
+def _read_index(checkpoint_dir):
+    """Load the checkpoint index, or an empty one"""
+    try:
+        with open(os.path.join(checkpoint_dir, INDEX_FILENAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'latest': None, 'checkpoints': []}
+
+
+def _atomic_write(path, write):
+    """Write via a temp file and rename so readers never see partial files"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def latest_run_dir(checkpoint_dir):
+    """Directory of the latest run's checkpoints"""
+    try:
+        with open(os.path.join(checkpoint_dir, LATEST_RUN_FILENAME), 'r') as f:
+            name = f.read().strip()
+    except OSError:
+        name = None
+    # Checkpoints written before runs had their own directory sit at the top
+    return os.path.join(checkpoint_dir, name) if name else checkpoint_dir
+
+
+def new_run_dir(checkpoint_dir):
+    """Create a directory for a new run and make it the latest"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    name = time.strftime('run-%Y%m%d-%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(checkpoint_dir, name if suffix == 1 else f'{name}-{suffix}')):
+        suffix += 1
+    name = name if suffix == 1 else f'{name}-{suffix}'
+    os.makedirs(os.path.join(checkpoint_dir, name))
+    _atomic_write(os.path.join(checkpoint_dir, LATEST_RUN_FILENAME), lambda f: f.write(name.encode('utf-8')))
+    return os.path.join(checkpoint_dir, name)
+
+
+class AsyncCheckpointer(keras.callbacks.Callback):
+    """
+    Keras callback writing checkpoints from a background thread
+
+    The weights are copied on the training thread (fast), then pickled and
+    written by a single writer thread so epochs aren't stalled on disk I/O.
+    Besides the latest checkpoint, the best `keep_best` checkpoints by
+    `monitor` are retained and older ones are deleted.
+    """
+
+    def __init__(self, checkpoint_dir=None, every_n_epochs=1, keep_best=3,
+                 monitor='val_loss', history=None, run_dir=None):
+        """
+        Args:
+            run_dir: directory of the run being resumed; a new run
+                directory is created when None
+        """
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir or DEFAULT_CHECKPOINT_DIR
+        self.run_dir = run_dir or new_run_dir(self.checkpoint_dir)
+        self.every_n_epochs = max(1, every_n_epochs)
+        self.keep_best = keep_best
+        self.monitor = monitor
+        # History of the epochs run before a resume, extended as we go
+        self.history = {k: list(v) for k, v in (history or {}).items()}
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def on_train_begin(self, logs=None):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name='checkpoint-writer', daemon=True)
+            self._writer.start()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        for key, value in logs.items():
+            self.history.setdefault(key, []).append(float(value))
+
+        if (epoch + 1) % self.every_n_epochs != 0:
+            return
+
+        state = {
+            'epoch': epoch + 1,  # Next epoch to run
+            'monitor': self.monitor,
+            'monitor_value': float(logs[self.monitor]) if self.monitor in logs else None,
+            'weights': self.model.get_weights(),
+            'optimizer': [np.array(v) for v in _optimizer_variables(self.model.optimizer)],
+            'history': {k: list(v) for k, v in self.history.items()},
+            'numpy_rng': np.random.get_state(),
+            'python_rng': random.getstate(),
+        }
+        self._queue.put(state)
+
+    def on_train_end(self, logs=None):
+        self.wait()
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk"""
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            state = self._queue.get()
+            try:
+                self._write(state)
+            except Exception as e:
+                print(f"Warning: Could not write checkpoint for epoch {state['epoch']}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, state):
+        filename = f"ckpt-epoch{state['epoch']:04d}.pkl"
+        _atomic_write(
+            os.path.join(self.run_dir, filename),
+            lambda f: pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+
+        index = _read_index(self.run_dir)
+        entries = [e for e in index['checkpoints'] if e['file'] != filename]
+        entries.append({
+            'file': filename,
+            'epoch': state['epoch'],
+            'monitor_value': state['monitor_value']
+        })
+
+        # Keep the latest checkpoint plus the best N by the monitored metric
+        scored = sorted(
+            (e for e in entries if e['monitor_value'] is not None),
+            key=lambda e: e['monitor_value']
+        )
+        keep = {e['file'] for e in scored[:self.keep_best]}
+        keep.add(filename)
+        for entry in entries:
+            if entry['file'] not in keep:
+                try:
+                    os.remove(os.path.join(self.run_dir, entry['file']))
+                except OSError:
+                    pass
+
+        index = {
+            'latest': filename,
+            'checkpoints': sorted((e for e in entries if e['file'] in keep), key=lambda e: e['epoch'])
+        }
+        _atomic_write(
+            os.path.join(self.run_dir, INDEX_FILENAME),
+            lambda f: f.write(json.dumps(index, indent=2).encode('utf-8'))
+        )
+        print(f"\n✓ Checkpoint saved: {filename}")
+
+
+def restore_latest_checkpoint(model, checkpoint_dir=None):
+    """
+    Restore the latest checkpoint of the latest run into a compiled model
+
+    Returns:
+        the checkpoint state dict (epoch, history, run_dir, ...) or None if
+        there is nothing to resume from
+    """
+    run_dir = latest_run_dir(checkpoint_dir or DEFAULT_CHECKPOINT_DIR)
+    index = _read_index(run_dir)
+    if not index.get('latest'):
+        return None
+
+    path = os.path.join(run_dir, index['latest'])
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+
+    model.set_weights(state['weights'])
+
+    # Optimizer slots only exist once the optimizer is built for the model
+    optimizer = model.optimizer
+    if hasattr(optimizer, 'build') and not getattr(optimizer, 'built', False):
+        optimizer.build(model.trainable_variables)
+    variables = _optimizer_variables(optimizer)
+    if len(variables) == len(state['optimizer']):
+        for variable, value in zip(variables, state['optimizer']):
+            variable.assign(value)
+    else:
+        print("Warning: Optimizer state does not match the model, starting with a fresh optimizer")
+
+    np.random.set_state(state['numpy_rng'])
+    random.setstate(state['python_rng'])
+    state['run_dir'] = run_dir
+
+    print(f"✓ Resumed from {path} (next epoch: {state['epoch'] + 1})")
+    return state
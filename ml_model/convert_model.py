@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Convert a model file to the current Keras format and compare startup times
+
+AutismDetector.load_model converts models on first load and then loads the
+cached artifact in ml_model/.converted/ directly. This script runs that
+conversion ahead of time (e.g. at deploy) and times, each in a fresh
+process, the legacy load of the model file and the load of the converted
+artifact.
+
+Usage:
+    python convert_model.py autism_model.h5 --runs 3
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args(argv=None):
+    """Command line options for the conversion"""
+    parser = argparse.ArgumentParser(description='Convert a model to the current Keras format')
+    parser.add_argument('model_path', nargs='?', default=os.path.join(ML_MODEL_DIR, 'autism_model.h5'))
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Fresh-process loads timed per path')
+    # Internal: time one load in a child process
+    parser.add_argument('--measure', choices=['legacy', 'converted'], default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def measure_load(model_path, path):
+    """Time one load of the model file or of its converted artifact"""
+    import time
+    sys.path.insert(0, ML_MODEL_DIR)
+    from autism_detector import AutismDetector, converted_model_path, keras
+
+    detector = AutismDetector(model_path=model_path, init_model=False)
+    start = time.perf_counter()
+    if path == 'legacy':
+        source = detector._load_model_file()
+    else:
+        keras.models.load_model(converted_model_path(model_path))
+        source = 'converted'
+    return {'source': source, 'seconds': time.perf_counter() - start}
+
+
+def _run_child(model_path, path):
+    command = [sys.executable, os.path.abspath(__file__), model_path, '--measure', path]
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    # The result is the last line; everything before is load output
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def convert(args):
+    sys.path.insert(0, ML_MODEL_DIR)
+    from autism_detector import AutismDetector
+
+    detector = AutismDetector(model_path=args.model_path, init_model=False)
+    if not os.path.exists(args.model_path):
+        print(f"Model not found: {args.model_path}")
+        return
+    detector.load_model()
+    converted_path = detector.convert_model()
+    if converted_path is None:
+        print("Conversion failed, startup keeps loading the model file")
+        return
+
+    timings = {}
+    for path in ('legacy', 'converted'):
+        runs = [_run_child(args.model_path, path) for _ in range(args.runs)]
+        timings[path] = min(run['seconds'] for run in runs)
+        print(f"{path:>9}: {timings[path]:.2f}s ({runs[0]['source']}, best of {args.runs})")
+    print(f"Converted artifact loads {timings['legacy'] / max(timings['converted'], 1e-6):.1f}x faster")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.measure:
+        print(json.dumps(measure_load(args.model_path, args.measure)))
+    else:
+        convert(args)
@@ -0,0 +1,140 @@
+"""
+CPU training throughput helpers for the autism detection model
+
+Thread pool sizing, bfloat16 mixed precision and a throughput report
+(images/sec, epoch time, peak memory) used by train_model.py to compare
+settings on a given machine.
+"""
+
+import sys
+import json
+import time
+import resource
+
+try:
+    import tensorflow as tf
+    from tensorflow import keras
+except ImportError:
+    tf = None
+    import keras
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Set TensorFlow's thread pool sizes
+
+    Must run before TensorFlow executes its first op, i.e. before the
+    detector/model is created.
+    """
+    if tf is None:
+        return
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        print(f"Warning: Could not set thread counts (TensorFlow already initialized): {e}")
+
+
+def cpu_supports_bf16():
+    """True if the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def enable_bfloat16(force=False):
+    """
+    Switch Keras to the mixed_bfloat16 policy if the CPU supports it
+
+    Returns:
+        True if mixed precision was enabled
+    """
+    if not force and not cpu_supports_bf16():
+        print("Warning: CPU has no native bfloat16 support, keeping float32")
+        return False
+    keras.mixed_precision.set_global_policy('mixed_bfloat16')
+    print("✓ Mixed precision enabled (mixed_bfloat16)")
+    return True
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """Record wall time and images/sec for every epoch"""
+
+    def __init__(self, num_samples):
+        super().__init__()
+        self.num_samples = num_samples
+        self.epoch_times = []
+        self._epoch_start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_times.append(time.perf_counter() - self._epoch_start)
+
+    def summary(self):
+        """Throughput numbers, excluding the first (tracing/compiling) epoch when possible"""
+        if not self.epoch_times:
+            return {}
+        steady = self.epoch_times[1:] or self.epoch_times
+        mean_epoch = sum(steady) / len(steady)
+        return {
+            'epochs': len(self.epoch_times),
+            'first_epoch_seconds': round(self.epoch_times[0], 3),
+            'mean_epoch_seconds': round(mean_epoch, 3),
+            'images_per_second': round(self.num_samples / mean_epoch, 1),
+            'peak_memory_mb': round(peak_memory_mb(), 1)
+        }
+
+
+def write_throughput_report(path, settings, throughput, test_accuracy,
+                            baseline_path=None, tolerance=0.01):
+    """
+    Write the throughput report and check test accuracy against a baseline
+
+    Returns:
+        the report dict
+    """
+    report = {
+        'settings': settings,
+        'throughput': throughput,
+        'test_accuracy': float(test_accuracy)
+    }
+
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        delta = float(test_accuracy) - float(baseline['test_accuracy'])
+        report['parity'] = {
+            'baseline': baseline_path,
+            'baseline_accuracy': baseline['test_accuracy'],
+            'delta': round(delta, 4),
+            'tolerance': tolerance,
+            'passed': abs(delta) <= tolerance
+        }
+
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\nThroughput report:")
+    for key, value in throughput.items():
+        print(f"  {key}: {value}")
+    if 'parity' in report:
+        parity = report['parity']
+        result = 'PASS' if parity['passed'] else 'FAIL'
+        print(f"  accuracy parity vs baseline: {parity['delta']:+.4f} ({result}, tolerance {tolerance})")
+    print(f"Report saved to {path}")
+
+    return report
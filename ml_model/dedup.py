@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash indexing and near-duplicate detection for the dataset
+
+Hashes every image in dataset/ in parallel (64-bit DCT pHash), indexes the
+hashes in a BK-tree to find near-duplicates by Hamming distance without
+comparing every pair, and writes a manifest that assigns each image a
+duplicate group. train_model.py uses the groups to keep near-duplicates on
+the same side of the train/test split.
+
+Usage:
+    python dedup.py --threshold 6 --check-split
+"""
+
+import os
+import sys
+import json
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+import cv2
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(os.path.dirname(ML_MODEL_DIR), 'dataset')
+DEFAULT_MANIFEST = os.path.join(ML_MODEL_DIR, 'dataset_manifest.json')
+
+
+def compute_phash(img_path):
+    """64-bit perceptual hash from the low frequencies of the 32x32 DCT"""
+    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    small = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA).astype('float32')
+    low = cv2.dct(small)[:8, :8].flatten()
+    # Compare against the median of the AC terms (the DC term is skipped)
+    bits = low > np.median(low[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _hash_task(task):
+    img_path, label = task
+    return img_path, label, compute_phash(img_path), os.path.getsize(img_path)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance for radius queries"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, item, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def query(self, value, radius):
+        """Items whose hash is within `radius` bits of `value`"""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append(item)
+            # Triangle inequality: only children in this band can match
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def build_manifest(dataset_path=DEFAULT_DATASET, threshold=6, workers=None):
+    """
+    Hash the dataset and group near-duplicate images
+
+    Within a group the largest file is kept (keep=True) as the representative
+    for a deduplicated training set.
+    """
+    from face_cache import list_dataset_images
+
+    samples = list_dataset_images(dataset_path)
+    print(f"Hashing {len(samples)} images...")
+    with Pool(processes=workers or os.cpu_count() or 1) as pool:
+        hashed = [r for r in pool.imap(_hash_task, samples, chunksize=32) if r[2] is not None]
+
+    # Union every image with the near-duplicates already in the tree
+    tree = BKTree()
+    parent = list(range(len(hashed)))
+    for i, (_, _, phash, _) in enumerate(hashed):
+        for j in tree.query(phash, threshold):
+            root_i, root_j = _find(parent, i), _find(parent, j)
+            if root_i != root_j:
+                parent[root_i] = root_j
+        tree.add(phash, i)
+
+    groups = {}
+    for i in range(len(hashed)):
+        groups.setdefault(_find(parent, i), []).append(i)
+
+    images = []
+    duplicate_groups = 0
+    mixed_label_groups = 0
+    for group_id, members in enumerate(sorted(groups.values(), key=lambda m: m[0])):
+        if len(members) > 1:
+            duplicate_groups += 1
+            if len({hashed[i][1] for i in members}) > 1:
+                mixed_label_groups += 1
+        keep = max(members, key=lambda i: hashed[i][3])
+        for i in members:
+            img_path, label, phash, _ = hashed[i]
+            images.append({
+                'path': os.path.relpath(img_path, dataset_path),
+                'label': label,
+                'phash': f'{phash:016x}',
+                'group': group_id,
+                'keep': i == keep
+            })
+
+    images.sort(key=lambda e: e['path'])
+    kept = sum(1 for e in images if e['keep'])
+    print(f"Found {duplicate_groups} near-duplicate groups; {kept} of {len(images)} images kept")
+    if mixed_label_groups:
+        print(f"Warning: {mixed_label_groups} groups contain both autistic and non_autistic images")
+
+    return {
+        'dataset_path': os.path.abspath(dataset_path),
+        'threshold': threshold,
+        'images': images
+    }
+
+
+def load_manifest(manifest_path, drop_duplicates=True):
+    """
+    Read a manifest as (absolute paths, labels, groups)
+
+    With drop_duplicates only one representative per group is returned.
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    entries = [e for e in manifest['images'] if e['keep'] or not drop_duplicates]
+    paths = [os.path.join(manifest['dataset_path'], e['path']) for e in entries]
+    labels = np.array([e['label'] for e in entries])
+    groups = np.array([e['group'] for e in entries])
+    return paths, labels, groups
+
+
+def check_split_leakage(manifest, test_size=0.2, seed=42):
+    """Count test images with a near-duplicate in train under the plain random split"""
+    from sklearn.model_selection import train_test_split
+
+    labels = np.array([e['label'] for e in manifest['images']])
+    groups = np.array([e['group'] for e in manifest['images']])
+    train_idx, test_idx = train_test_split(
+        np.arange(len(labels)), test_size=test_size, random_state=seed, stratify=labels
+    )
+    train_groups = set(groups[train_idx])
+    leaked = sum(1 for i in test_idx if groups[i] in train_groups)
+    print(f"Random split leakage: {leaked} of {len(test_idx)} test images have a near-duplicate in train")
+    return leaked
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index the dataset by perceptual hash and find near-duplicates')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET)
+    parser.add_argument('--threshold', type=int, default=6,
+                        help='Maximum Hamming distance between near-duplicate hashes')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=DEFAULT_MANIFEST)
+    parser.add_argument('--check-split', action='store_true',
+                        help='Report leakage of the plain random train/test split')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ML_MODEL_DIR)
+    manifest = build_manifest(args.dataset, args.threshold, args.workers)
+    with open(args.output, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest saved to {args.output}")
+
+    if args.check_split:
+        check_split_leakage(manifest)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Knowledge distillation of the production model into a small CPU student
+
+The teacher is the production AutismDetector model. The student (the simple
+CNN or a narrow MobileNetV2 at a lower resolution) is trained with the usual
+distillation loss: cross-entropy between the teacher's and the student's
+logits both divided by the temperature, scaled by T^2, mixed with plain
+cross-entropy on the hard labels. The student is served at T=1, as any other
+model, and saved as the fast variant (AutismDetector(variant='fast')).
+
+The report compares latency, accuracy and how often student and teacher
+land in different positive/inconclusive/negative buckets of predict(). The
+student is only saved if it agrees with the teacher's status on the test
+split at least --min-status-agreement of the time for every status.
+
+Usage:
+    python distill.py --student mobilenet --input-size 128 --alpha 0.35
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import cv2
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ML_MODEL_DIR)
+
+from autism_detector import (AutismDetector, FAST_MODEL_FILENAME, keras,
+                             score_to_status)
+from train_model import create_dataset
+
+STATUSES = ('positive', 'inconclusive', 'negative')
+
+
+def parse_args(argv=None):
+    """Command line options for distillation"""
+    parser = argparse.ArgumentParser(description='Distill the production model into a fast student model')
+    parser.add_argument('--student', choices=['simple_cnn', 'mobilenet'], default='mobilenet')
+    parser.add_argument('--input-size', type=int, default=128)
+    parser.add_argument('--alpha', type=float, default=0.35,
+                        help='MobileNetV2 width multiplier for the student')
+    parser.add_argument('--temperature', type=float, default=2.0,
+                        help='Softening applied to the teacher logits')
+    parser.add_argument('--soft-weight', type=float, default=0.7,
+                        help='Weight of the teacher targets vs the hard labels')
+    parser.add_argument('--min-status-agreement', type=float, default=0.9,
+                        help='Share of test images of each teacher status the student must give the same status')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--manifest', default=None,
+                        help='Dedup manifest for group-aware splits')
+    parser.add_argument('--output', default=os.path.join(ML_MODEL_DIR, FAST_MODEL_FILENAME))
+    parser.add_argument('--report', default=os.path.join(ML_MODEL_DIR, 'distill_report.json'))
+    return parser.parse_args(argv)
+
+
+def soften(probabilities, temperature):
+    """Teacher probabilities with their logits divided by the temperature"""
+    p = np.clip(probabilities, 1e-6, 1 - 1e-6)
+    logits = np.log(p / (1 - p))
+    return 1.0 / (1.0 + np.exp(-logits / temperature))
+
+
+def distillation_loss(temperature, soft_weight):
+    """
+    Loss for y_true = [softened teacher probability, hard label]
+
+    The student's sigmoid output is turned back into a logit and divided by
+    the temperature for the soft term, which is scaled by T^2 so its gradients
+    keep the same size as the hard term's at any temperature. The hard term
+    is plain binary cross-entropy at T=1.
+    """
+    K = keras.backend
+
+    def loss(y_true, y_pred):
+        p = K.clip(y_pred[:, 0], 1e-6, 1 - 1e-6)
+        logits = K.log(p / (1 - p))
+        soft = K.binary_crossentropy(y_true[:, 0], logits / temperature, from_logits=True)
+        hard = K.binary_crossentropy(y_true[:, 1], p)
+        return soft_weight * temperature ** 2 * soft + (1 - soft_weight) * hard
+
+    return loss
+
+
+def resize_batch(images, size):
+    """Resize preprocessed images to the student resolution"""
+    if images.shape[1] == size:
+        return images
+    return np.stack([cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA) for img in images])
+
+
+def measure_latency(model, input_size, runs=50):
+    """Median and p95 single-image latency of model.predict in ms, as served"""
+    sample = np.zeros((1, input_size, input_size, 3), dtype='float32')
+    model.predict(sample, verbose=0)  # Warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.predict(sample, verbose=0)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(float(np.median(timings)), 2),
+        'p95_ms': round(float(np.percentile(timings, 95)), 2)
+    }
+
+
+def compare_models(teacher, student, X_test, y_test):
+    """Latency, accuracy and status agreement of student vs teacher on the test split"""
+    teacher_scores = teacher.model.predict(resize_batch(X_test, teacher.input_size), verbose=0).ravel()
+    student_scores = student.model.predict(resize_batch(X_test, student.input_size), verbose=0).ravel()
+
+    teacher_status = [score_to_status(s) for s in teacher_scores]
+    student_status = [score_to_status(s) for s in student_scores]
+    confusion = {t: {s: 0 for s in STATUSES} for t in STATUSES}
+    for t, s in zip(teacher_status, student_status):
+        confusion[t][s] += 1
+    disagreements = sum(1 for t, s in zip(teacher_status, student_status) if t != s)
+    # Share of each teacher status the student reproduces (None if the teacher never gave it)
+    agreement = {
+        t: confusion[t][t] / sum(confusion[t].values()) if sum(confusion[t].values()) else None
+        for t in STATUSES
+    }
+
+    return {
+        'test_samples': int(len(y_test)),
+        'teacher': {
+            'accuracy': float(np.mean((teacher_scores > 0.5) == y_test)),
+            'parameters': int(teacher.model.count_params()),
+            'input_size': teacher.input_size,
+            'latency': measure_latency(teacher.model, teacher.input_size)
+        },
+        'student': {
+            'accuracy': float(np.mean((student_scores > 0.5) == y_test)),
+            'parameters': int(student.model.count_params()),
+            'input_size': student.input_size,
+            'latency': measure_latency(student.model, student.input_size)
+        },
+        'status_disagreement_rate': disagreements / max(1, len(y_test)),
+        'status_confusion': confusion,  # teacher status -> student status -> count
+        'status_agreement': agreement,
+        'status_rates': {
+            'teacher': {t: teacher_status.count(t) / max(1, len(y_test)) for t in STATUSES},
+            'student': {t: student_status.count(t) / max(1, len(y_test)) for t in STATUSES}
+        },
+        'mean_abs_score_delta': float(np.mean(np.abs(teacher_scores - student_scores)))
+    }
+
+
+def distill(args):
+    """Train the student on the teacher's soft outputs and write the report; True if saved"""
+    teacher = AutismDetector()
+    if teacher.model is None:
+        print("Cannot distill without a teacher model")
+        return False
+
+    # The student sees the same kind of input as the teacher
+    result = create_dataset(
+        use_face_crops=teacher.input_mode == 'face_crop',
+        manifest_path=args.manifest
+    )
+    if result is None:
+        print("Cannot proceed with distillation without dataset")
+        return False
+    X_train, X_val, X_test, y_train, y_val, y_test = result
+
+    print("\nScoring the dataset with the teacher...")
+    targets = {}
+    for name, X, y in (('train', X_train, y_train), ('val', X_val, y_val)):
+        teacher_scores = teacher.model.predict(resize_batch(X, teacher.input_size), verbose=0).ravel()
+        targets[name] = np.stack([soften(teacher_scores, args.temperature), y], axis=1).astype('float32')
+
+    student = AutismDetector(model_path=args.output, init_model=False)
+    student.input_mode = teacher.input_mode
+    if args.student == 'simple_cnn':
+        student._create_simple_cnn(input_size=args.input_size)
+    else:
+        student.create_model(input_size=args.input_size, alpha=args.alpha)
+    student.model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=0.001),
+        loss=distillation_loss(args.temperature, args.soft_weight)
+    )
+
+    print(f"\nTraining {args.student} student at {args.input_size}x{args.input_size}...")
+    student.model.fit(
+        resize_batch(X_train, args.input_size), targets['train'],
+        validation_data=(resize_batch(X_val, args.input_size), targets['val']),
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+        verbose=1
+    )
+    # Served as a plain sigmoid at T=1; save it with the usual loss, not the custom one
+    student.compile_model()
+
+    print("\nComparing student and teacher on the test split...")
+    report = compare_models(teacher, student, X_test, y_test)
+    report['settings'] = vars(args)
+    too_low = {t: a for t, a in report['status_agreement'].items()
+               if a is not None and a < args.min_status_agreement}
+    report['status_check_passed'] = not too_low
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Teacher: accuracy {report['teacher']['accuracy']:.2%}, "
+          f"latency {report['teacher']['latency']['median_ms']} ms")
+    print(f"Student: accuracy {report['student']['accuracy']:.2%}, "
+          f"latency {report['student']['latency']['median_ms']} ms")
+    print(f"Status disagreement: {report['status_disagreement_rate']:.2%}")
+    print(f"Report saved to {args.report}")
+
+    if too_low:
+        for status, share in too_low.items():
+            print(f"⚠ Student gives the teacher's '{status}' status for only {share:.2%} of those test images "
+                  f"(minimum {args.min_status_agreement:.0%}); not saved")
+        return False
+    student.save_model()
+    print(f"✓ Student saved to {args.output}")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if distill(parse_args()) else 1)
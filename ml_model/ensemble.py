@@ -0,0 +1,116 @@
+"""
+Weighted model ensemble with a per-request deadline
+
+The served model always runs on the calling thread. Every extra member runs
+on its own thread at the same time and joins the weighted vote only if it
+answers before the deadline; a member that is still busy with an earlier
+request is skipped. Latency is therefore bounded by the served model or the
+deadline, whichever is longer.
+
+Used through AutismDetector.load_ensemble().
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+PRIMARY = 'primary'
+
+
+class EnsembleMember:
+    """An extra model with its vote weight and input format"""
+
+    def __init__(self, name, model, weight=1.0, input_size=224, input_mode='full_image'):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.input_size = input_size
+        self.input_mode = input_mode
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'ensemble-{name}')
+        self._lock = threading.Lock()
+        self._running = None
+
+    @property
+    def input_key(self):
+        """Members with the same key share one preprocessed batch"""
+        return (self.input_mode, self.input_size)
+
+    def try_submit(self, batch):
+        """Start scoring a batch; None if the previous batch is still running"""
+        with self._lock:
+            if self._running is not None and not self._running.done():
+                return None
+            self._running = self._executor.submit(self.model.predict, batch, verbose=0)
+            return self._running
+
+
+class ModelEnsemble:
+    def __init__(self, members, primary_weight=1.0, deadline_ms=200):
+        if primary_weight <= 0:
+            raise ValueError("The served model needs a positive weight")
+        self.members = members
+        self.primary_weight = primary_weight
+        self.deadline_ms = deadline_ms
+
+    def input_keys(self):
+        return {member.input_key for member in self.members}
+
+    def score(self, primary_model, primary_batch, member_batches, deadline_ms=None):
+        """
+        Score a batch with every member that makes the deadline
+
+        Returns:
+            (combined probabilities, {member name: probabilities}, dropped)
+            where dropped lists {'name', 'reason'} of members left out
+        """
+        deadline = time.monotonic() + (deadline_ms or self.deadline_ms) / 1000.0
+
+        futures, dropped = {}, []
+        for member in self.members:
+            future = member.try_submit(member_batches[member.input_key])
+            if future is None:
+                dropped.append({'name': member.name, 'reason': 'busy'})
+            else:
+                futures[member] = future
+
+        scores = {PRIMARY: primary_model.predict(primary_batch, verbose=0)[:, 0]}
+        weights = {PRIMARY: self.primary_weight}
+        for member, future in futures.items():
+            try:
+                scores[member.name] = future.result(timeout=max(0.0, deadline - time.monotonic()))[:, 0]
+                weights[member.name] = member.weight
+            except TimeoutError:
+                # Keeps running in the background; the member is busy until then
+                dropped.append({'name': member.name, 'reason': 'deadline'})
+            except Exception as e:
+                dropped.append({'name': member.name, 'reason': f'error: {e}'})
+
+        combined = sum(scores[name] * weights[name] for name in scores) / sum(weights.values())
+        return combined, scores, dropped
+
+
+def parse_member_specs(specs):
+    """
+    Parse "path[:weight],path[:weight]" (e.g. the ENSEMBLE_MODELS setting)
+
+    Returns (model_path, weight) pairs; the weight defaults to 1.0.
+    """
+    members = []
+    for spec in (specs or '').split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        path, weight = spec, 1.0
+        head, _, tail = spec.rpartition(':')
+        if head:
+            try:
+                path, weight = head, float(tail)
+            except ValueError:
+                pass  # A colon in the path (e.g. a drive letter)
+        members.append((path, weight))
+    return members
+
+
+def member_name(model_path):
+    return os.path.splitext(os.path.basename(model_path))[0]
@@ -0,0 +1,252 @@
+"""
+On-demand Grad-CAM explanations of analyzed images
+
+Analyses are identified by the SHA-256 of the uploaded image bytes, which is
+also the image's digest in the image store (backend/image_store.py), where
+remember() keeps the upload. Which users may explain an analysis, and which
+model scored it, is recorded in a SQLite index next to the heatmaps, so
+every process using the same cache directory (gunicorn workers, a restarted
+server) can explain it. The model input is rebuilt from the stored image;
+the prepared input of the most recent analyses is also kept in memory so an
+explanation right after the analysis skips face detection.
+
+Heatmap PNGs are stored under a hash of the image digest and the model tag
+and served from disk on repeat requests. Index entries and heatmaps older
+than max_age seconds are removed, and the oldest heatmaps beyond max_bytes.
+
+Layout:
+    <cache_dir>/analyses.db                      analysis index
+    <cache_dir>/heatmaps/ab/abcd...ef.png        heatmap overlay
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+from PIL import Image
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    analysis_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    model_tag TEXT,
+    analyzed_at REAL NOT NULL,
+    PRIMARY KEY (analysis_id, owner)
+);
+CREATE INDEX IF NOT EXISTS ix_analyses_analyzed_at ON analyses (analyzed_at);
+"""
+
+# Seconds between removals of expired entries by one process
+SWEEP_INTERVAL = 60
+
+
+class AnalysisNotFound(Exception):
+    """No remembered analysis with this id for this user (unknown, expired or not theirs)"""
+
+
+def grad_cam(model, image):
+    """
+    Grad-CAM heatmap (values 0..1, input resolution) of one preprocessed image
+
+    Uses the last layer of the model (or of a nested base model such as
+    MobileNetV2) with a spatial output.
+    """
+    import tensorflow as tf
+
+    layers = model.layers
+    target = max(i for i, layer in enumerate(layers) if len(layer.output.shape) == 4)
+
+    with tf.GradientTape() as tape:
+        x = tf.convert_to_tensor(image[None], dtype=tf.float32)
+        for i, layer in enumerate(layers):
+            x = layer(x, training=False)
+            if i == target:
+                activations = x
+                tape.watch(activations)
+        score = x[:, 0]
+
+    gradients = tape.gradient(score, activations)
+    channel_weights = tf.reduce_mean(gradients, axis=(1, 2))
+    cam = tf.nn.relu(tf.reduce_sum(activations * channel_weights[:, None, None, :], axis=-1))[0].numpy()
+    if cam.max() > 0:
+        cam = cam / cam.max()
+    return cv2.resize(cam.astype('float32'), (image.shape[1], image.shape[0]))
+
+
+def render_overlay(image, heatmap, alpha=0.4):
+    """PNG of the heatmap over a preprocessed ([-1, 1]) RGB image"""
+    base = np.clip((image + 1.0) * 127.5, 0, 255).astype('uint8')
+    colored = cv2.applyColorMap((heatmap * 255).astype('uint8'), cv2.COLORMAP_JET)
+    overlay = cv2.addWeighted(cv2.cvtColor(base, cv2.COLOR_RGB2BGR), 1 - alpha, colored, alpha, 0)
+    ok, png = cv2.imencode('.png', overlay)
+    if not ok:
+        raise ValueError("Could not encode the heatmap")
+    return png.tobytes()
+
+
+class Explainer:
+    """Remember analyses and produce their Grad-CAM heatmaps when asked"""
+
+    def __init__(self, detector, image_store, cache_dir, max_prepared=64, max_age=3600,
+                 max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            image_store: backend ImageStore the uploads are kept in
+            max_prepared: analyses whose prepared input is kept in memory
+        """
+        self.detector = detector
+        self.image_store = image_store
+        self.cache_dir = cache_dir
+        self.max_prepared = max_prepared
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._prepared = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._swept_at = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.cache_dir, 'analyses.db'), timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _conn(self):
+        # One connection per thread (and per process, after fork)
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local = threading.local()
+            self._local.pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _heatmap_path(self, analysis_id, model_tag):
+        key = hashlib.sha256(f'{analysis_id}:{model_tag}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'heatmaps', key[:2], key + '.png')
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _sweep(self):
+        """Remove expired index entries and heatmaps, then the oldest heatmaps over max_bytes"""
+        now = time.time()
+        if now - self._swept_at < SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        expired = now - self.max_age
+        self._conn().execute('DELETE FROM analyses WHERE analyzed_at < ?', (expired,))
+
+        heatmaps = []
+        for root, _, names in os.walk(os.path.join(self.cache_dir, 'heatmaps')):
+            for name in names:
+                if not name.endswith('.png'):
+                    continue  # Still being written
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed by another process
+                heatmaps.append((stat.st_mtime, stat.st_size, path))
+        heatmaps.sort()
+        total = sum(size for _, size, _ in heatmaps)
+        for mtime, size, path in heatmaps:
+            if mtime >= expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def remember(self, image_bytes, prepared, owner):
+        """
+        Keep what's needed to explain a scored image for its owner
+
+        Returns the analysis id, or None if the image store doesn't take
+        the image's format.
+        """
+        try:
+            image_path = self.image_store.put(image_bytes)
+        except ValueError:
+            return None
+        analysis_id = self.image_store.digest_of(image_path)
+        self._conn().execute(
+            'INSERT OR REPLACE INTO analyses (analysis_id, owner, image_path, model_tag, analyzed_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (analysis_id, str(owner), image_path, prepared.get('model_tag'), time.time())
+        )
+        with self._lock:
+            self._prepared[analysis_id] = (prepared['model'], prepared['input'])
+            self._prepared.move_to_end(analysis_id)
+            while len(self._prepared) > self.max_prepared:
+                self._prepared.popitem(last=False)
+        self._sweep()
+        return analysis_id
+
+    def _model_input(self, analysis_id, model):
+        """Prepared input for the model, from memory or rebuilt from the stored image"""
+        with self._lock:
+            cached = self._prepared.get(analysis_id)
+        if cached and cached[0] is model:
+            return cached[1]
+
+        original = self.image_store.original(analysis_id)
+        if original is None:
+            raise AnalysisNotFound(analysis_id)
+        with Image.open(original[0]) as image:
+            image_array = np.array(image.convert('RGB'))
+        result, prepared = self.detector.prepare_prediction(image_array)
+        if prepared is None:
+            raise ValueError(result['recommendations'][0])
+        return prepared['input']
+
+    def explain(self, analysis_id, owner):
+        """
+        Heatmap PNG of one of the owner's analyses with the served model
+
+        Returns (png bytes, etag). Raises AnalysisNotFound for an unknown or
+        expired analysis or one of another user, and ValueError if the image
+        can't be scored.
+        """
+        if len(analysis_id) != 64 or any(c not in '0123456789abcdef' for c in analysis_id):
+            raise AnalysisNotFound(analysis_id)
+        row = self._conn().execute(
+            'SELECT 1 FROM analyses WHERE analysis_id = ? AND owner = ? AND analyzed_at >= ?',
+            (analysis_id, str(owner), time.time() - self.max_age)
+        ).fetchone()
+        if row is None:
+            raise AnalysisNotFound(analysis_id)
+
+        model, model_tag = self.detector.serving_model_and_tag()
+        etag = f'{analysis_id}-{model_tag}' if model_tag else None
+        if model_tag:
+            png_path = self._heatmap_path(analysis_id, model_tag)
+            try:
+                with open(png_path, 'rb') as f:
+                    png = f.read()
+                os.utime(png_path)  # Most recently used, for the size limit
+                return png, etag
+            except OSError:
+                pass
+
+        image = self._model_input(analysis_id, model)
+        png = render_overlay(image, grad_cam(model, image))
+        if model_tag:
+            # Only models with a stable tag get cached heatmaps
+            self._write(png_path, png)
+            self._sweep()
+        return png, etag
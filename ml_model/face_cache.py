@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Face-crop dataset cache for training the autism detection model
+
+Runs the production face detector (AutismDetector.detect_faces) once per
+training image and stores the aligned face crop, the handcrafted facial
+features and the label. Later training runs reuse the cached entries and
+only process images that were added or changed since the last run.
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+from multiprocessing import get_context
+
+import numpy as np
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Order of the handcrafted features in the cached feature vectors
+FEATURE_KEYS = ('eye_contact', 'face_symmetry', 'expression_intensity', 'face_area_ratio')
+
+# Bump when the crop/feature extraction changes so stale entries are rebuilt
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'face_cache')
+
+# Per-process detector, created once by _init_worker
+_worker_detector = None
+
+
+def list_dataset_images(folder_path):
+    """
+    List (path, label) pairs for a dataset folder
+
+    Expects the same layout as train_model.load_images_from_folder:
+    autistic/ (label 1) and non_autistic/ (label 0).
+    """
+    samples = []
+    for class_name, label in (('autistic', 1), ('non_autistic', 0)):
+        class_path = os.path.join(folder_path, class_name)
+        if not os.path.exists(class_path):
+            print(f"Warning: '{class_name}' folder not found in {folder_path}")
+            continue
+        for filename in sorted(os.listdir(class_path)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_path, filename), label))
+    return samples
+
+
+def _entry_key(img_path, img_size):
+    """Cache key for an image: changes when the file or crop settings change"""
+    stat = os.stat(img_path)
+    raw = f"{os.path.abspath(img_path)}|{stat.st_size}|{stat.st_mtime_ns}|{img_size[0]}x{img_size[1]}|v{CACHE_VERSION}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _entry_path(cache_dir, key):
+    """Shard entries by key prefix to keep directories small"""
+    return os.path.join(cache_dir, key[:2], key + '.npz')
+
+
+def _init_worker():
+    """Create a detector without the CNN in each worker process"""
+    global _worker_detector
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from autism_detector import AutismDetector
+    _worker_detector = AutismDetector(init_model=False)
+
+
+def _process_image(task):
+    """Detect, align and featurize one image, writing its cache entry"""
+    img_path, label, entry_path, img_size = task
+
+    img = cv2.imread(img_path)
+    if img is None:
+        return img_path, 'unreadable'
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    faces = _worker_detector.detect_faces(img)
+    face_found = len(faces) > 0
+    if face_found:
+        crop = _worker_detector.align_face(img, faces[0], size=img_size)
+        features = _worker_detector.extract_facial_features(img, faces)
+        feature_vector = np.array([features.get(k, 0.0) for k in FEATURE_KEYS], dtype='float32')
+    else:
+        crop = np.zeros((0,), dtype='uint8')
+        feature_vector = np.zeros((len(FEATURE_KEYS),), dtype='float32')
+
+    # Write to a temp file and rename so an interrupted run never leaves a
+    # truncated entry behind
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    tmp_path = entry_path + f'.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            crop=crop,
+            features=feature_vector,
+            label=np.int64(label),
+            face_found=np.bool_(face_found)
+        )
+    os.replace(tmp_path, entry_path)
+
+    return img_path, 'face' if face_found else 'no_face'
+
+
+def build_face_cache(dataset_path, cache_dir=None, img_size=(224, 224), workers=None):
+    """
+    Build (or refresh) the face-crop cache and return the cached dataset
+
+    Returns:
+        (crops, features, labels, paths) where crops are uint8 RGB arrays,
+        or None if the dataset has no usable images
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    img_size = tuple(img_size)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    samples = list_dataset_images(dataset_path)
+    if not samples:
+        print("No images found in dataset!")
+        return None
+
+    entries = []
+    pending = []
+    for img_path, label in samples:
+        entry_path = _entry_path(cache_dir, _entry_key(img_path, img_size))
+        entries.append((img_path, entry_path))
+        if not os.path.exists(entry_path):
+            pending.append((img_path, label, entry_path, img_size))
+
+    print(f"Face cache: {len(samples) - len(pending)} cached, {len(pending)} to process")
+
+    unreadable = []
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        # spawn keeps TensorFlow state from the parent out of the workers
+        with get_context('spawn').Pool(processes=workers, initializer=_init_worker) as pool:
+            for done, (img_path, outcome) in enumerate(pool.imap_unordered(_process_image, pending, chunksize=8), 1):
+                if outcome == 'unreadable':
+                    unreadable.append(img_path)
+                    print(f"Warning: Could not read image {img_path}")
+                if done % 100 == 0 or done == len(pending):
+                    print(f"  Processed {done}/{len(pending)} images")
+
+    crops, features, labels, paths, no_face = [], [], [], [], []
+    for img_path, entry_path in entries:
+        if not os.path.exists(entry_path):
+            continue  # Unreadable image
+        with np.load(entry_path) as entry:
+            if not bool(entry['face_found']):
+                no_face.append(img_path)
+                continue
+            crops.append(entry['crop'])
+            features.append(entry['features'])
+            labels.append(int(entry['label']))
+            paths.append(img_path)
+
+    # Rewritten on every run so it always reflects the current dataset
+    no_face_log = os.path.join(cache_dir, 'no_face.log')
+    with open(no_face_log, 'w') as f:
+        for img_path in no_face:
+            f.write(img_path + '\n')
+    if no_face:
+        print(f"Warning: No face found in {len(no_face)} images (listed in {no_face_log})")
+
+    if not crops:
+        print("No faces found in dataset!")
+        return None
+
+    return np.array(crops), np.array(features), np.array(labels), paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the face-crop training cache')
+    parser.add_argument('--dataset', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset'))
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--img-size', type=int, default=224)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    result = build_face_cache(args.dataset, args.cache_dir, (args.img_size, args.img_size), args.workers)
+    if result is not None:
+        crops, features, labels, paths = result
+        print(f"Face crops: {len(crops)} ({int(np.sum(labels))} autistic, {len(labels) - int(np.sum(labels))} non_autistic)")
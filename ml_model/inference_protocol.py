@@ -0,0 +1,122 @@
+"""
+Wire format of the local inference daemon (inference_server.py)
+
+Every message is a fixed 8-byte header followed by the payload:
+
+    magic  b'AD'   2 bytes
+    type           1 byte   (MSG_*)
+    lane           1 byte   index in scheduler.LANES, 0 (interactive) in replies
+    length         4 bytes, big-endian payload size
+
+ANALYZE carries the raw uploaded image bytes (no base64), ANALYZE_MULTI
+several images packed by pack_images(), EXPLAIN the analysis id, STATUS has
+no payload. ANALYZE, ANALYZE_MULTI and EXPLAIN payloads start with the
+requesting user (see pack_owner()), so only they can fetch explanations of
+their analyses. Replies are RESULT or ERROR with a UTF-8
+JSON payload, or PNG (ETag, a newline, then the PNG bytes) for EXPLAIN. A
+connection carries any number of request/reply pairs, one at a time.
+
+Standard library only, so the web backend can import it without TensorFlow.
+"""
+
+import json
+import struct
+
+HEADER = struct.Struct('!2sBBI')
+COUNT = struct.Struct('!I')
+MAGIC = b'AD'
+
+MSG_ANALYZE = 1
+MSG_STATUS = 2
+MSG_EXPLAIN = 3
+MSG_ANALYZE_MULTI = 4
+MSG_RESULT = 0x81
+MSG_ERROR = 0x82
+MSG_PNG = 0x83
+
+# ERROR codes the client maps back to exceptions
+ERROR_NOT_FOUND = 'not_found'
+ERROR_UNSCORABLE = 'unscorable'
+
+# Same as the upload limit of the web backend
+MAX_PAYLOAD = 50 * 1024 * 1024
+
+
+class ProtocolError(ValueError):
+    """The peer sent something that isn't a valid message"""
+
+
+def send_message(sock, msg_type, payload=b'', lane=0):
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    sock.sendall(HEADER.pack(MAGIC, msg_type, lane, len(payload)) + payload)
+
+
+def send_json(sock, msg_type, data):
+    send_message(sock, msg_type, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def pack_owner(owner, payload):
+    """Prefix a payload with the requesting user's id (empty for none)"""
+    owner = ('' if owner is None else str(owner)).encode('utf-8')
+    return COUNT.pack(len(owner)) + owner + payload
+
+
+def unpack_owner(payload):
+    """(owner or None, rest of the payload) of a pack_owner() payload"""
+    try:
+        (length,) = COUNT.unpack_from(payload)
+    except struct.error:
+        raise ProtocolError("Missing owner")
+    if COUNT.size + length > len(payload):
+        raise ProtocolError("Truncated owner")
+    owner = payload[COUNT.size:COUNT.size + length].decode('utf-8', 'replace')
+    return owner or None, payload[COUNT.size + length:]
+
+
+def pack_images(images):
+    """ANALYZE_MULTI payload: image count, then each image's length and bytes"""
+    parts = [COUNT.pack(len(images))]
+    for image_bytes in images:
+        parts.append(COUNT.pack(len(image_bytes)))
+        parts.append(image_bytes)
+    return b''.join(parts)
+
+
+def unpack_images(payload):
+    """The images of an ANALYZE_MULTI payload"""
+    try:
+        (count,), offset = COUNT.unpack_from(payload), COUNT.size
+        images = []
+        for _ in range(count):
+            (length,) = COUNT.unpack_from(payload, offset)
+            offset += COUNT.size
+            if offset + length > len(payload):
+                raise ProtocolError("Truncated image in payload")
+            images.append(payload[offset:offset + length])
+            offset += length
+    except struct.error:
+        raise ProtocolError("Truncated image list")
+    return images
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    """Read one message; returns (type, payload, lane)"""
+    magic, msg_type, lane, length = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if magic != MAGIC:
+        raise ProtocolError("Bad message header")
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {length} bytes exceeds {MAX_PAYLOAD}")
+    return msg_type, _recv_exactly(sock, length) if length else b'', lane
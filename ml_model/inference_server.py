@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Local inference daemon
+
+Owns the AutismDetector (and TensorFlow) for all web workers, which talk to
+it over a Unix domain socket (see inference_protocol.py and
+backend/inference_client.py). Face detection and feature extraction run on
+the connection threads, limited by --analysis-threads; model calls are
+collected for up to --max-wait-ms and run as one batch of at most
+--max-batch images on a single thread. Both stages serve the priority lanes
+of scheduler.py by weight, so bulk work can't starve interactive requests. The served model follows the model
+registry like the backend does, and Grad-CAM explanations (explain.py) are
+computed here on request, from the backend's image store and analysis cache
+directories (--image-store, --analysis-cache-dir).
+
+Usage:
+    python inference_server.py --socket /tmp/autism-inference.sock --max-batch 8 --max-wait-ms 5
+"""
+
+import io
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from PIL import Image
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(ML_MODEL_DIR)
+UPLOAD_DIR = os.path.join(ROOT_DIR, 'backend', 'uploads')
+sys.path.insert(0, ML_MODEL_DIR)
+sys.path.append(ROOT_DIR)
+
+from backend.image_store import ImageStore
+from explain import AnalysisNotFound, Explainer
+from inference_protocol import (ERROR_NOT_FOUND, ERROR_UNSCORABLE, MSG_ANALYZE,
+                                MSG_ANALYZE_MULTI, MSG_ERROR, MSG_EXPLAIN, MSG_PNG, MSG_RESULT,
+                                MSG_STATUS, ProtocolError, recv_message, send_json,
+                                send_message, unpack_images, unpack_owner)
+from scheduler import (BACKGROUND, INTERACTIVE, LANES, PriorityScheduler, WeightedLanes,
+                       parse_lane_settings)
+
+DEFAULT_SOCKET = '/tmp/autism-inference.sock'
+
+
+def decode_image(image_bytes):
+    """Uploaded image bytes as an RGB array; ValueError if they aren't an image"""
+    try:
+        return np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+    except OSError as e:  # Includes PIL's UnidentifiedImageError
+        raise ValueError(f"Could not read the image: {e}")
+
+
+class MicroBatcher:
+    """Score prepared inputs from many threads in batches on one thread"""
+
+    def __init__(self, detector, max_batch=8, max_wait_ms=5, lane_weights=None):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = 0
+        self.batches = 0
+        self._lanes = WeightedLanes(lane_weights)
+        self._pending = {lane: deque() for lane in LANES}
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, name='inference-batcher', daemon=True).start()
+
+    def submit(self, prepared, lane=INTERACTIVE):
+        future = Future()
+        with self._cond:
+            if not self._pending[lane]:
+                self._lanes.activate(lane, [name for name in LANES if self._pending[name]])
+            self._pending[lane].append((prepared, future))
+            self._cond.notify()
+        return future
+
+    def _queued(self):
+        return sum(len(pending) for pending in self._pending.values())
+
+    def _next_batch(self):
+        """Wait for work, then fill a batch from the lanes by weight"""
+        with self._cond:
+            while not self._queued():
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait
+            while self._queued() < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            items = []
+            while len(items) < self.max_batch:
+                lanes = [lane for lane in LANES if self._pending[lane]]
+                if not lanes:
+                    break
+                items.append(self._pending[self._lanes.pick(lanes)].popleft())
+            return items
+
+    def _run(self):
+        while True:
+            items = self._next_batch()
+
+            try:
+                results = self.detector.score_prepared([prepared for prepared, _ in items])
+            except Exception as e:
+                results = [self.detector._error_result(e)] * len(items)
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+
+            self.requests += len(items)
+            self.batches += 1
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'queued': {lane: len(pending) for lane, pending in self._pending.items()}
+        }
+
+
+class InferenceService:
+    """AutismDetector.predict split over the connection threads and the batcher"""
+
+    def __init__(self, detector, reloader, explainer, max_batch=8, max_wait_ms=5, analysis_threads=4,
+                 scheduler=None):
+        self.detector = detector
+        self.reloader = reloader
+        self.explainer = explainer
+        self.scheduler = scheduler or PriorityScheduler(analysis_threads)
+        self.batcher = MicroBatcher(detector, max_batch, max_wait_ms, self.scheduler.weights)
+
+    def analyze(self, image_bytes, lane=INTERACTIVE, owner=None):
+        """Same result as AutismDetector.predict for the decoded image"""
+        image_array = decode_image(image_bytes)
+        with self.scheduler.slot(lane):
+            try:
+                result, prepared = self.detector.prepare_prediction(image_array)
+            except Exception as e:
+                return self.detector._error_result(e)
+        if result is not None:
+            return result
+        result = self.batcher.submit(prepared, lane).result()
+        if result['status'] != 'error' and owner:
+            analysis_id = self.explainer.remember(image_bytes, prepared, owner)
+            if analysis_id:
+                result['analysis_id'] = analysis_id
+        return result
+
+    def analyze_multi(self, images, lane=INTERACTIVE, owner=None):
+        """
+        Results of several photos of one child and their aggregate
+
+        The photos are handed to the batcher together, so they are scored in
+        as few model calls as --max-batch allows.
+        """
+        results = [None] * len(images)
+        pending = []
+        arrays = [decode_image(image_bytes) for image_bytes in images]
+        for i, image_array in enumerate(arrays):
+            with self.scheduler.slot(lane):
+                try:
+                    results[i], prepared = self.detector.prepare_prediction(image_array)
+                except Exception as e:
+                    results[i], prepared = self.detector._error_result(e), None
+            if results[i] is None:
+                pending.append((i, prepared, self.batcher.submit(prepared, lane)))
+
+        for i, prepared, future in pending:
+            results[i] = future.result()
+            if results[i]['status'] != 'error' and owner:
+                analysis_id = self.explainer.remember(images[i], prepared, owner)
+                if analysis_id:
+                    results[i]['analysis_id'] = analysis_id
+        return {'results': results, 'aggregate': self.detector.aggregate_results(results)}
+
+    def explain(self, analysis_id, owner, lane=BACKGROUND):
+        with self.scheduler.slot(lane):
+            return self.explainer.explain(analysis_id, owner)
+
+    def status(self):
+        return {
+            'model_loaded': self.detector.model is not None,
+            'model': self.reloader.status(),
+            'batching': self.batcher.stats(),
+            'lanes': self.scheduler.stats()
+        }
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    """Serve request/reply pairs until the client disconnects"""
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                msg_type, payload, lane = recv_message(self.request)
+            except (ConnectionError, ProtocolError, OSError):
+                return
+            lane = LANES[lane] if lane < len(LANES) else INTERACTIVE
+
+            # Errors of the request itself are replied to; only a failed
+            # send below means the connection is gone
+            try:
+                reply = self.reply(service, msg_type, payload, lane)
+            except AnalysisNotFound:
+                reply = MSG_ERROR, {'error': 'Analysis not found', 'code': ERROR_NOT_FOUND}
+            except ProtocolError as e:
+                reply = MSG_ERROR, {'error': str(e)}
+            except ValueError as e:
+                reply = MSG_ERROR, {'error': str(e), 'code': ERROR_UNSCORABLE}
+            except Exception as e:
+                reply = MSG_ERROR, {'error': str(e)}
+
+            try:
+                reply_type, body = reply
+                if reply_type == MSG_PNG:
+                    send_message(self.request, MSG_PNG, body)
+                else:
+                    send_json(self.request, reply_type, body)
+            except OSError:
+                return
+
+    def reply(self, service, msg_type, payload, lane):
+        """(reply type, JSON body or PNG payload) of one request"""
+        if msg_type == MSG_ANALYZE:
+            owner, image_bytes = unpack_owner(payload)
+            return MSG_RESULT, service.analyze(image_bytes, lane, owner)
+        if msg_type == MSG_ANALYZE_MULTI:
+            owner, images = unpack_owner(payload)
+            return MSG_RESULT, service.analyze_multi(unpack_images(images), lane, owner)
+        if msg_type == MSG_STATUS:
+            return MSG_RESULT, service.status()
+        if msg_type == MSG_EXPLAIN:
+            owner, analysis_id = unpack_owner(payload)
+            png, etag = service.explain(analysis_id.decode('ascii', 'replace'), owner, lane)
+            return MSG_PNG, (etag or '').encode('ascii') + b'\n' + png
+        return MSG_ERROR, {'error': f"Unknown message type {msg_type}"}
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        self.service = service
+        super().__init__(socket_path, _ConnectionHandler)
+
+
+def create_service(args):
+    """Load the detector and the served model the way the backend does"""
+    from autism_detector import AutismDetector
+    from model_registry import ModelRegistry, ModelHotReloader
+
+    scheduler = PriorityScheduler(args.analysis_threads, parse_lane_settings(args.lane_weights),
+                                  parse_lane_settings(args.lane_caps, int))
+    detector = AutismDetector(init_model=False, variant=args.variant)
+    reloader = ModelHotReloader(detector, ModelRegistry(args.registry), args.poll_seconds)
+    reloader.load_initial()
+    if args.ensemble:
+        from ensemble import parse_member_specs
+        detector.load_ensemble(parse_member_specs(args.ensemble), args.ensemble_primary_weight,
+                               args.ensemble_deadline_ms)
+    if args.shadow_model:
+        detector.load_shadow(args.shadow_model, args.shadow_db, args.shadow_sample_rate,
+                             args.shadow_queue_size, scheduler)
+
+    # Trace the model before the first request
+    size = detector.input_size
+    detector.model.predict(np.zeros((1, size, size, 3), dtype='float32'), verbose=0)
+
+    # Thumbnails of the stored uploads are left to the backend
+    explainer = Explainer(detector, ImageStore(args.image_store, thumbnail_sizes=()), args.analysis_cache_dir,
+                          args.analysis_cache_size, args.analysis_cache_ttl,
+                          int(args.analysis_cache_max_mb * 1024 * 1024))
+    return InferenceService(detector, reloader, explainer, args.max_batch, args.max_wait_ms,
+                            args.analysis_threads, scheduler)
+
+
+def serve(args):
+    service = create_service(args)
+
+    # A socket left behind by a previous run would make bind fail
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    server = InferenceServer(args.socket, service)
+    os.chmod(args.socket, 0o660)
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"✓ Inference server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local inference daemon for the web backend')
+    parser.add_argument('--socket', default=os.getenv('INFERENCE_SOCKET') or DEFAULT_SOCKET)
+    parser.add_argument('--variant', default=os.getenv('MODEL_VARIANT', 'standard'))
+    parser.add_argument('--registry', default=os.getenv('MODEL_REGISTRY_DIR') or os.path.join(ML_MODEL_DIR, 'registry'))
+    parser.add_argument('--poll-seconds', type=float, default=float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '10')))
+    parser.add_argument('--image-store', default=os.getenv('IMAGE_STORE_DIR') or os.path.join(UPLOAD_DIR, 'images'),
+                        help="The backend's IMAGE_STORE_DIR; analyzed images are kept there")
+    parser.add_argument('--analysis-cache-dir', default=os.getenv('ANALYSIS_CACHE_DIR') or os.path.join(UPLOAD_DIR, 'analyses'),
+                        help='Analysis index and heatmaps for explanations')
+    parser.add_argument('--analysis-cache-size', type=int, default=int(os.getenv('ANALYSIS_CACHE_SIZE', '64')),
+                        help='Recent analyses whose model input is kept in memory')
+    parser.add_argument('--analysis-cache-ttl', type=float, default=float(os.getenv('ANALYSIS_CACHE_TTL', '3600')),
+                        help='Seconds an analysis can be explained for')
+    parser.add_argument('--analysis-cache-max-mb', type=float, default=float(os.getenv('ANALYSIS_CACHE_MAX_MB', '256')),
+                        help='Most megabytes of heatmaps kept on disk')
+    parser.add_argument('--ensemble', default=os.getenv('ENSEMBLE_MODELS', ''),
+                        help='Extra models voting with the served one, "path[:weight],..."')
+    parser.add_argument('--ensemble-primary-weight', type=float,
+                        default=float(os.getenv('ENSEMBLE_PRIMARY_WEIGHT', '1.0')))
+    parser.add_argument('--ensemble-deadline-ms', type=float,
+                        default=float(os.getenv('ENSEMBLE_DEADLINE_MS', '200')))
+    parser.add_argument('--shadow-model', default=os.getenv('SHADOW_MODEL_PATH', ''),
+                        help='Candidate model scoring a sample of the inputs in the background')
+    parser.add_argument('--shadow-sample-rate', type=float, default=float(os.getenv('SHADOW_SAMPLE_RATE', '0.1')))
+    parser.add_argument('--shadow-queue-size', type=int, default=int(os.getenv('SHADOW_QUEUE_SIZE', '100')))
+    parser.add_argument('--shadow-db', default=os.getenv('SHADOW_LOG_PATH') or os.path.join(
+        os.path.dirname(ML_MODEL_DIR), 'backend', 'shadow_scores.db'))
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help='How long the first request of a batch waits for others')
+    parser.add_argument('--analysis-threads', type=int, default=os.cpu_count() or 4,
+                        help='Images in face detection/feature extraction at once')
+    parser.add_argument('--lane-weights', default=os.getenv('LANE_WEIGHTS', 'interactive:8,batch:2,background:1'),
+                        help='Share of contended work per priority lane')
+    parser.add_argument('--lane-caps', default=os.getenv('LANE_CAPS', 'batch:2,background:1'),
+                        help='Most --analysis-threads slots a lane may hold')
+    serve(parser.parse_args())
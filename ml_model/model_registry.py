@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Versioned local model registry with hot reload
+
+Layout:
+    registry/
+    ├── registry.json          # active version and activation history
+    ├── v0001/
+    │   ├── model.h5
+    │   ├── model.meta.json    # AutismDetector sidecar (input mode/size)
+    │   └── metadata.json      # hash, input size, backend, metrics
+    └── v0002/ ...
+
+ModelHotReloader loads a version next to the one being served, warms it up
+and swaps it into a running AutismDetector in one step, so requests keep
+flowing during a reload. Unlike AutismDetector.load_model there is no
+fallback: a version that fails to load or warm up is never swapped in.
+
+Usage:
+    python model_registry.py register autism_model.h5 --metrics report.json --activate
+    python model_registry.py list
+    python model_registry.py activate v0002
+    python model_registry.py rollback
+"""
+
+import os
+import json
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes
+    fcntl = None
+
+import numpy as np
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registry')
+STATE_FILENAME = 'registry.json'
+LOCK_FILENAME = 'registry.lock'
+
+
+def _detector_module():
+    """Import autism_detector lazily (pulls in TensorFlow), as package or script"""
+    try:
+        from . import autism_detector
+    except ImportError:
+        import autism_detector
+    return autism_detector
+
+
+def _write_json(path, data):
+    """Atomically replace a JSON file"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """Versioned model artifacts with an active-version pointer"""
+
+    def __init__(self, root=None):
+        self.root = root or DEFAULT_REGISTRY_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold the registry lock across a read-modify-write of registry.json or
+        a new version directory, so the CLI and backend workers don't lose
+        each other's changes
+        """
+        with open(os.path.join(self.root, LOCK_FILENAME), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _state(self):
+        try:
+            with open(os.path.join(self.root, STATE_FILENAME), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'active': None, 'history': []}
+
+    def versions(self):
+        """Metadata of every registered version, oldest first"""
+        found = []
+        for name in sorted(os.listdir(self.root)):
+            metadata_path = os.path.join(self.root, name, 'metadata.json')
+            if os.path.exists(metadata_path):
+                with open(metadata_path, 'r') as f:
+                    found.append(json.load(f))
+        return found
+
+    def metadata(self, version):
+        with open(os.path.join(self.root, version, 'metadata.json'), 'r') as f:
+            return json.load(f)
+
+    def model_path(self, version):
+        return os.path.join(self.root, version, self.metadata(version)['filename'])
+
+    def active_version(self):
+        return self._state()['active']
+
+    def register(self, model_path, metrics=None, version=None, activate=False):
+        """Copy a model (and its sidecar) into the registry as a new version"""
+        detector_module = _detector_module()
+
+        with self._locked():
+            if version is None:
+                # Skips directories of registrations still copying their files
+                number = len(self.versions()) + 1
+                while os.path.exists(os.path.join(self.root, f'v{number:04d}')):
+                    number += 1
+                version = f'v{number:04d}'
+            elif os.path.exists(os.path.join(self.root, version)):
+                raise ValueError(f"Version {version} already exists")
+            # Claims the version; metadata.json is written last, so it only
+            # lists once complete
+            version_dir = os.path.join(self.root, version)
+            os.makedirs(version_dir)
+        filename = 'model' + os.path.splitext(model_path)[1]
+        shutil.copy2(model_path, os.path.join(version_dir, filename))
+
+        sidecar = {}
+        sidecar_path = os.path.splitext(model_path)[0] + '.meta.json'
+        if os.path.exists(sidecar_path):
+            shutil.copy2(sidecar_path, os.path.join(version_dir, 'model.meta.json'))
+            with open(sidecar_path, 'r') as f:
+                sidecar = json.load(f)
+
+        metadata = {
+            'version': version,
+            'filename': filename,
+            'sha256': detector_module.file_sha256(model_path),
+            'source': os.path.abspath(model_path),
+            'input_size': sidecar.get('input_size', 224),
+            'input_mode': sidecar.get('input_mode', 'full_image'),
+            'alpha': sidecar.get('alpha', 1.0),
+            'backend': {
+                'tensorflow': getattr(getattr(detector_module, 'tf', None), '__version__', None),
+                'keras': getattr(detector_module.keras, '__version__', None)
+            },
+            'metrics': metrics or {},
+            'registered_at': datetime.now().isoformat()
+        }
+        _write_json(os.path.join(version_dir, 'metadata.json'), metadata)
+        print(f"✓ Registered {version} ({metadata['sha256'][:12]})")
+
+        if activate:
+            self.activate(version)
+        return metadata
+
+    def activate(self, version):
+        """Point the registry at a version; previous versions form the rollback history"""
+        self.metadata(version)  # Raises if the version doesn't exist
+        with self._locked():
+            state = self._state()
+            if state['active'] and state['active'] != version:
+                state['history'].append(state['active'])
+            state['active'] = version
+            _write_json(os.path.join(self.root, STATE_FILENAME), state)
+
+    def previous_version(self):
+        history = self._state()['history']
+        return history[-1] if history else None
+
+    def rollback(self):
+        """Re-activate the previously active version"""
+        with self._locked():
+            state = self._state()
+            if not state['history']:
+                raise ValueError("No previous version to roll back to")
+            state['active'] = state['history'].pop()
+            _write_json(os.path.join(self.root, STATE_FILENAME), state)
+            return state['active']
+
+
+class ModelHotReloader:
+    """Load, warm up and atomically swap registry versions into a detector"""
+
+    def __init__(self, detector, registry, poll_interval=None):
+        self.detector = detector
+        self.registry = registry
+        self.poll_interval = poll_interval
+        self.current_version = None
+        self.last_error = None
+        self.loading_version = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def _load_and_warm(self, version):
+        detector_module = _detector_module()
+
+        metadata = self.registry.metadata(version)
+        model, _ = detector_module.load_model_artifact(self.registry.model_path(version))
+        # Run one prediction so graph tracing happens before the swap, not
+        # on the first request
+        size = detector_module.model_input_size(model)
+        model.predict(np.zeros((1, size, size, 3), dtype='float32'), verbose=0)
+        return model, metadata
+
+    def swap_to(self, version):
+        """Load a version and swap it in; the served model is untouched on failure"""
+        with self._lock:
+            if version == self.current_version:
+                return
+            self.loading_version = version
+            try:
+                model, metadata = self._load_and_warm(version)
+                self.detector.swap_model(
+                    model,
+                    input_mode=metadata.get('input_mode', 'full_image'),
+                    alpha=metadata.get('alpha', 1.0),
+                    version=version
+                )
+                self.current_version = version
+                self.last_error = None
+                print(f"✓ Serving model {version}")
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                print(f"⚠ Could not load model {version}, keeping {self.current_version}: {e}")
+                raise
+            finally:
+                self.loading_version = None
+
+    def reload_active(self):
+        """Swap in the registry's active version if it changed"""
+        version = self.registry.active_version()
+        if version and version != self.current_version:
+            self.swap_to(version)
+
+    def activate(self, version):
+        """Serve a version, then record it as active for the other workers"""
+        self.swap_to(version)
+        self.registry.activate(version)
+
+    def rollback(self):
+        """Serve the previous version, then record the rollback"""
+        version = self.registry.previous_version()
+        if not version:
+            raise ValueError("No previous version to roll back to")
+        self.swap_to(version)
+        self.registry.rollback()
+        return version
+
+    def load_initial(self):
+        """
+        Serve the registry's active version, or the detector's own model file
+        when there is none (or it can't be loaded), then follow the registry
+        """
+        try:
+            self.reload_active()
+        except Exception:
+            pass  # Fall back to the model file below
+        if self.detector.model is None:
+            self.detector.load_or_create_model()
+        # Follow activations made through other workers or the registry CLI
+        self.start_watching()
+
+    def run_in_background(self, action, *args):
+        """Run activate/rollback on a thread so the caller isn't blocked"""
+        def run():
+            try:
+                action(*args)
+            except Exception:
+                pass  # Already recorded in last_error
+        thread = threading.Thread(target=run, name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def start_watching(self):
+        """Poll the registry so every worker process follows the active version"""
+        if not self.poll_interval or (self._watcher and self._watcher.is_alive()):
+            return
+        stop = threading.Event()
+
+        def watch():
+            while not stop.wait(self.poll_interval):
+                try:
+                    self.reload_active()
+                except Exception:
+                    pass  # Keep serving the current model, retry next poll
+
+        self._watcher = threading.Thread(target=watch, name='model-registry-watcher', daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        return {
+            'serving': self.current_version,
+            'active': self.registry.active_version(),
+            'loading': self.loading_version,
+            'last_error': self.last_error
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the local model registry')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    register = commands.add_parser('register', help='Add a model file as a new version')
+    register.add_argument('model_path')
+    register.add_argument('--version', default=None)
+    register.add_argument('--metrics', default=None, help='JSON file with evaluation metrics')
+    register.add_argument('--activate', action='store_true')
+    commands.add_parser('list', help='List registered versions')
+    activate = commands.add_parser('activate', help='Make a version active')
+    activate.add_argument('version')
+    commands.add_parser('rollback', help='Re-activate the previous version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'register':
+        metrics = None
+        if args.metrics:
+            with open(args.metrics, 'r') as f:
+                metrics = json.load(f)
+        registry.register(args.model_path, metrics=metrics, version=args.version, activate=args.activate)
+    elif args.command == 'list':
+        active = registry.active_version()
+        for metadata in registry.versions():
+            marker = '*' if metadata['version'] == active else ' '
+            print(f"{marker} {metadata['version']}  {metadata['sha256'][:12]}  "
+                  f"{metadata['input_size']}px  {metadata['registered_at']}")
+    elif args.command == 'activate':
+        registry.activate(args.version)
+        print(f"✓ Active version: {args.version}")
+    elif args.command == 'rollback':
+        print(f"✓ Active version: {registry.rollback()}")
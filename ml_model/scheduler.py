@@ -0,0 +1,140 @@
+"""
+Priority lanes for analysis work
+
+Work is tagged with a lane: interactive (a parent waiting on /api/analyze),
+batch (queued jobs, bulk screening) or background (shadow scoring,
+explanations). A PriorityScheduler hands out a fixed number of execution
+slots; when a slot frees up, the waiting lane with the least weighted
+service so far gets it (stride scheduling), and no lane holds more slots
+than its cap. A large batch therefore only gets the share of the slots its
+weight allows, and interactive requests don't queue behind it.
+
+Standard library only, so the web backend can import it without TensorFlow.
+"""
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BACKGROUND = 'background'
+# Order is the lane's number on the inference socket (inference_protocol.py)
+LANES = (INTERACTIVE, BATCH, BACKGROUND)
+
+DEFAULT_WEIGHTS = {INTERACTIVE: 8.0, BATCH: 2.0, BACKGROUND: 1.0}
+
+
+def parse_lane_settings(spec, cast=float):
+    """Parse "lane:value,lane:value" (e.g. the LANE_WEIGHTS setting)"""
+    settings = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        lane, _, value = part.partition(':')
+        lane = lane.strip()
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}', expected one of {', '.join(LANES)}")
+        settings[lane] = cast(value)
+    return settings
+
+
+class WeightedLanes:
+    """Stride scheduling: pick the lane with the least service per weight"""
+
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        for lane, weight in self.weights.items():
+            if weight <= 0:
+                raise ValueError(f"Lane '{lane}' needs a positive weight")
+        self._pass = {lane: 0.0 for lane in LANES}
+
+    def pick(self, lanes):
+        """Choose one of the given (non-empty) lanes and charge it one unit"""
+        lane = min(lanes, key=lambda name: (self._pass[name], LANES.index(name)))
+        self._pass[lane] += 1.0 / self.weights[lane]
+        return lane
+
+    def activate(self, lane, active_lanes):
+        """A lane that was idle can't spend the service it didn't use"""
+        if active_lanes:
+            self._pass[lane] = max(self._pass[lane], min(self._pass[name] for name in active_lanes))
+
+
+class PriorityScheduler:
+    def __init__(self, concurrency=2, weights=None, caps=None):
+        """
+        Args:
+            concurrency: slots shared by all lanes
+            weights: {lane: weight}, share of contended slots
+            caps: {lane: most slots the lane may hold}, default concurrency
+        """
+        self.concurrency = concurrency
+        self.caps = {lane: concurrency for lane in LANES}
+        self.caps.update(caps or {})
+        self._lanes = WeightedLanes(weights)
+        self.weights = self._lanes.weights
+        self._cond = threading.Condition()
+        self._waiting = {lane: deque() for lane in LANES}
+        self._running = {lane: 0 for lane in LANES}
+        self._granted = {lane: 0 for lane in LANES}
+        self._waits = {lane: deque(maxlen=500) for lane in LANES}
+
+    def _dispatch(self):
+        while sum(self._running.values()) < self.concurrency:
+            eligible = [lane for lane in LANES
+                        if self._waiting[lane] and self._running[lane] < self.caps[lane]]
+            if not eligible:
+                break
+            lane = self._lanes.pick(eligible)
+            ticket = self._waiting[lane].popleft()
+            ticket['granted'] = True
+            self._running[lane] += 1
+            self._granted[lane] += 1
+        self._cond.notify_all()
+
+    def acquire(self, lane):
+        if lane not in self._waiting:
+            raise ValueError(f"Unknown lane '{lane}'")
+        ticket = {'granted': False}
+        start = time.perf_counter()
+        with self._cond:
+            if not self._waiting[lane] and not self._running[lane]:
+                self._lanes.activate(lane, [name for name in LANES
+                                            if self._waiting[name] or self._running[name]])
+            self._waiting[lane].append(ticket)
+            self._dispatch()
+            while not ticket['granted']:
+                self._cond.wait()
+            self._waits[lane].append((time.perf_counter() - start) * 1000)
+
+    def release(self, lane):
+        with self._cond:
+            self._running[lane] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, lane):
+        """Run the block in one of the scheduler's slots"""
+        self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def stats(self):
+        """Waiting, running and slot wait p95 per lane"""
+        with self._cond:
+            stats = {}
+            for lane in LANES:
+                waits = sorted(self._waits[lane])
+                stats[lane] = {
+                    'waiting': len(self._waiting[lane]),
+                    'running': self._running[lane],
+                    'granted': self._granted[lane],
+                    'cap': self.caps[lane],
+                    'weight': self._lanes.weights[lane],
+                    'wait_p95_ms': round(waits[int(0.95 * (len(waits) - 1))], 2) if waits else None
+                }
+            return stats
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Shadow scoring of a candidate model on live traffic
+
+A sampled share of the inputs the production model scores is handed to a
+background thread, which scores them with the candidate model and logs both
+scores, their statuses and latencies to SQLite. Handing off never blocks:
+when the bounded queue is full the input is skipped and counted, so shadow
+work can't slow down /api/analyze.
+
+Enabled through AutismDetector.load_shadow(). Report on the logged scores:
+    python shadow.py report --db shadow_scores.db
+"""
+
+import os
+import time
+import queue
+import random
+import sqlite3
+import argparse
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+import cv2
+
+try:
+    from .autism_detector import load_model_artifact, model_input_size, score_to_status
+    from .scheduler import BACKGROUND
+except ImportError:
+    from autism_detector import load_model_artifact, model_input_size, score_to_status
+    from scheduler import BACKGROUND
+
+COLUMNS = (
+    'created_at', 'analysis_id', 'production_model', 'candidate_model',
+    'production_score', 'candidate_score', 'score_delta',
+    'production_status', 'candidate_status', 'agree',
+    'production_ms', 'candidate_ms', 'batch_size'
+)
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS shadow_scores ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT, analysis_id TEXT, "
+        "production_model TEXT, candidate_model TEXT, "
+        "production_score REAL, candidate_score REAL, score_delta REAL, "
+        "production_status TEXT, candidate_status TEXT, agree INTEGER, "
+        "production_ms REAL, candidate_ms REAL, batch_size INTEGER)"
+    )
+    return conn
+
+
+class ShadowScorer:
+    """Score sampled production inputs with a candidate model in the background"""
+
+    def __init__(self, model_path, db_path, sample_rate=0.1, max_queue=100, max_batch=8, scheduler=None):
+        self.model, metadata = load_model_artifact(model_path)
+        self.name = os.path.basename(model_path)
+        self.input_size = model_input_size(self.model)
+        self.input_mode = metadata.get('input_mode', 'full_image')
+        self.db_path = db_path
+        self.sample_rate = sample_rate
+        self.max_batch = max_batch
+        self.scheduler = scheduler
+        self.skipped = 0  # Sampled but dropped because the queue was full
+        self._queue = queue.Queue(maxsize=max_queue)
+        threading.Thread(target=self._run, name='shadow-scorer', daemon=True).start()
+
+    def submit(self, prepared, result, production_ms=None, production_model=None):
+        """Queue a scored input for the candidate; never blocks"""
+        if random.random() >= self.sample_rate:
+            return False
+        # A face crop input can't be turned into a full image input, or back
+        if prepared.get('input_mode', 'full_image') != self.input_mode:
+            return False
+        try:
+            self._queue.put_nowait((prepared['input'], result, production_ms, production_model))
+        except queue.Full:
+            self.skipped += 1
+            return False
+        return True
+
+    def _run(self):
+        conn = _connect(self.db_path)
+        while True:
+            items = [self._queue.get()]
+            # Whatever else is already waiting joins the batch
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                batch = np.stack([self._resize(image) for image, _, _, _ in items])
+                with self.scheduler.slot(BACKGROUND) if self.scheduler else nullcontext():
+                    start = time.perf_counter()
+                    scores = self.model.predict(batch, verbose=0)[:, 0]
+                    candidate_ms = (time.perf_counter() - start) * 1000 / len(items)
+            except Exception as e:
+                print(f"⚠ Shadow scoring failed: {e}")
+                continue
+
+            rows = []
+            # The result dicts are the ones returned to the caller, which may
+            # have added the analysis id by now
+            for (_, result, production_ms, production_model), score in zip(items, scores):
+                candidate_status = score_to_status(score)
+                rows.append((
+                    datetime.now().isoformat(), result.get('analysis_id'), production_model, self.name,
+                    result['score'], float(score), float(score) - result['score'],
+                    result['status'], candidate_status, int(candidate_status == result['status']),
+                    production_ms, candidate_ms, len(items)
+                ))
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO shadow_scores ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    rows
+                )
+
+    def _resize(self, image):
+        if image.shape[0] == self.input_size:
+            return image
+        return cv2.resize(image, (self.input_size, self.input_size), interpolation=cv2.INTER_AREA)
+
+
+def report(db_path, candidate=None):
+    """Agreement, score deltas and latency per candidate model"""
+    conn = _connect(db_path)
+    where, params = ('WHERE candidate_model = ?', (candidate,)) if candidate else ('', ())
+    rows = conn.execute(
+        f"SELECT candidate_model, production_status, candidate_status, score_delta, "
+        f"production_ms, candidate_ms FROM shadow_scores {where}", params
+    ).fetchall()
+    if not rows:
+        print("No shadow scores logged yet")
+        return
+
+    by_candidate = {}
+    for row in rows:
+        by_candidate.setdefault(row[0], []).append(row[1:])
+    for name, entries in by_candidate.items():
+        deltas = np.array([e[2] for e in entries])
+        candidate_ms = [e[4] for e in entries]
+        production_ms = [e[3] for e in entries if e[3] is not None]
+        print(f"\n{name}: {len(entries)} inputs")
+        print(f"  Status agreement: {np.mean([e[0] == e[1] for e in entries]):.2%}")
+        print(f"  Score delta: mean {deltas.mean():+.4f}, mean abs {np.abs(deltas).mean():.4f}, "
+              f"max abs {np.abs(deltas).max():.4f}")
+        print(f"  Candidate latency: p50 {np.percentile(candidate_ms, 50):.1f} ms, "
+              f"p95 {np.percentile(candidate_ms, 95):.1f} ms")
+        if production_ms:
+            print(f"  Production latency: p50 {np.percentile(production_ms, 50):.1f} ms, "
+                  f"p95 {np.percentile(production_ms, 95):.1f} ms")
+        transitions = {}
+        for production_status, candidate_status, _, _, _ in entries:
+            if production_status != candidate_status:
+                key = f"{production_status} -> {candidate_status}"
+                transitions[key] = transitions.get(key, 0) + 1
+        for key, count in sorted(transitions.items(), key=lambda item: -item[1]):
+            print(f"  {key}: {count}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shadow scoring results')
+    commands = parser.add_subparsers(dest='command', required=True)
+    report_parser = commands.add_parser('report', help='Summarize logged shadow scores')
+    report_parser.add_argument('--db', required=True)
+    report_parser.add_argument('--candidate', default=None)
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        report(args.db, args.candidate)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter sweep with stratified k-fold cross-validation
+
+Evaluates a grid or random search over learning rate, head dropout and
+batch size. Each trial runs in its own process with a fixed thread budget,
+reading the same cached preprocessed dataset (memory-mapped .npy files).
+The test split from create_dataset is never used here, it stays held out
+for the final model. Results go to a SQLite or CSV table, one row per trial.
+
+Usage:
+    python sweep.py --learning-rates 0.001 0.0005 --dropouts 0.3 0.5 \
+        --batch-sizes 16 32 --folds 5 --workers 4 --threads-per-trial 4
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import math
+import random
+import sqlite3
+import hashlib
+import argparse
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+
+ML_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(ML_MODEL_DIR, 'sweep_cache')
+DEFAULT_RESULTS = os.path.join(ML_MODEL_DIR, 'sweep_results.sqlite')
+
+RESULT_COLUMNS = (
+    'run_id', 'trial_id', 'learning_rate', 'dropout', 'batch_size', 'folds', 'epochs',
+    'val_accuracy_mean', 'val_accuracy_std', 'val_loss_mean', 'val_loss_std',
+    'wall_time_seconds', 'status', 'error', 'created_at'
+)
+
+
+def parse_args(argv=None):
+    """Command line options for the sweep runner"""
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep with stratified k-fold CV')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--trials', type=int, default=10,
+                        help='Number of random-search trials')
+    parser.add_argument('--learning-rates', type=float, nargs='+', default=[0.001, 0.0005, 0.0001])
+    parser.add_argument('--dropouts', type=float, nargs='+', default=[0.3, 0.5])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[16, 32])
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Trials running concurrently')
+    parser.add_argument('--threads-per-trial', type=int, default=None,
+                        help='TensorFlow threads per trial process (default: CPU count / workers)')
+    parser.add_argument('--face-crops', action='store_true',
+                        help='Sweep on face crops from the face cache')
+    parser.add_argument('--manifest', default=None,
+                        help='Dedup manifest from dedup.py; folds become group-aware')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--results', default=DEFAULT_RESULTS,
+                        help='Results table (.sqlite/.db or .csv)')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def build_trials(args):
+    """List the hyperparameter combinations to evaluate"""
+    if args.search == 'grid':
+        combos = itertools.product(args.learning_rates, args.dropouts, args.batch_sizes)
+        return [
+            {'learning_rate': lr, 'dropout': d, 'batch_size': b}
+            for lr, d, b in combos
+        ]
+
+    # Random search: learning rate log-uniform and dropout uniform within the
+    # given bounds, batch size from the given choices
+    rng = random.Random(args.seed)
+    lr_low, lr_high = math.log10(min(args.learning_rates)), math.log10(max(args.learning_rates))
+    d_low, d_high = min(args.dropouts), max(args.dropouts)
+    return [
+        {
+            'learning_rate': 10 ** rng.uniform(lr_low, lr_high),
+            'dropout': rng.uniform(d_low, d_high),
+            'batch_size': rng.choice(args.batch_sizes)
+        }
+        for _ in range(args.trials)
+    ]
+
+
+def _dataset_fingerprint(dataset_path, use_face_crops, manifest_path=None):
+    """Changes whenever an image (or the manifest) is added, removed or modified"""
+    from face_cache import list_dataset_images
+    digest = hashlib.sha1(f"face_crops={use_face_crops}".encode('utf-8'))
+    if manifest_path:
+        stat = os.stat(manifest_path)
+        digest.update(f"{os.path.abspath(manifest_path)}|{stat.st_mtime_ns}".encode('utf-8'))
+    for img_path, label in list_dataset_images(dataset_path):
+        stat = os.stat(img_path)
+        digest.update(f"{img_path}|{label}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def prepare_sweep_dataset(cache_dir, use_face_crops=False, manifest_path=None):
+    """
+    Preprocess the train+validation pool once and cache it as .npy files
+
+    Returns:
+        directory holding X.npy and y.npy (and groups.npy with a manifest),
+        or None if there is no dataset
+    """
+    from train_model import create_dataset
+
+    dataset_path = os.path.join(os.path.dirname(ML_MODEL_DIR), 'dataset')
+    data_dir = os.path.join(cache_dir, _dataset_fingerprint(dataset_path, use_face_crops, manifest_path))
+    if os.path.exists(os.path.join(data_dir, 'y.npy')):
+        print(f"Reusing cached sweep dataset: {data_dir}")
+        return data_dir
+
+    result = create_dataset(use_face_crops=use_face_crops, manifest_path=manifest_path, return_groups=True)
+    if result is None:
+        return None
+    X_train, X_val, _, y_train, y_val, _, g_train, g_val, _ = result
+
+    os.makedirs(data_dir, exist_ok=True)
+    if g_train is not None:
+        np.save(os.path.join(data_dir, 'groups.npy'), np.concatenate([g_train, g_val]))
+    # y.npy is written last and marks the cache as complete
+    np.save(os.path.join(data_dir, 'X.npy'), np.concatenate([X_train, X_val]))
+    np.save(os.path.join(data_dir, 'y.npy'), np.concatenate([y_train, y_val]))
+    print(f"Cached sweep dataset: {data_dir}")
+    return data_dir
+
+
+def _init_trial_worker(threads):
+    """Limit the threads of a trial process before TensorFlow starts"""
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    if threads:
+        for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[var] = str(threads)
+    sys.path.insert(0, ML_MODEL_DIR)
+    from cpu_tuning import configure_threads
+    configure_threads(threads, 1 if threads else None)
+
+
+def run_trial(trial_id, params, data_dir, folds, epochs, seed):
+    """Cross-validate one hyperparameter combination (runs in a worker process)"""
+    from sklearn.model_selection import StratifiedKFold, StratifiedGroupKFold
+    from autism_detector import AutismDetector, keras
+
+    start = time.perf_counter()
+    X = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, 'y.npy'))
+    groups_path = os.path.join(data_dir, 'groups.npy')
+    groups = np.load(groups_path) if os.path.exists(groups_path) else None
+
+    accuracies, losses = [], []
+    if groups is not None:
+        # Near-duplicates stay within one fold
+        splitter = StratifiedGroupKFold(n_splits=folds, shuffle=True, random_state=seed)
+    else:
+        splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    for fold, (train_idx, val_idx) in enumerate(splitter.split(np.zeros(len(y)), y, groups)):
+        keras.backend.clear_session()
+        keras.utils.set_random_seed(seed + fold)
+
+        detector = AutismDetector(init_model=False)
+        detector.create_model(learning_rate=params['learning_rate'], dropout=params['dropout'])
+        detector.model.fit(
+            X[train_idx], y[train_idx],
+            validation_data=(X[val_idx], y[val_idx]),
+            epochs=epochs,
+            batch_size=params['batch_size'],
+            callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)],
+            verbose=0
+        )
+        loss, accuracy = detector.model.evaluate(X[val_idx], y[val_idx], verbose=0)
+        losses.append(float(loss))
+        accuracies.append(float(accuracy))
+
+    return {
+        'trial_id': trial_id,
+        'val_accuracy_mean': float(np.mean(accuracies)),
+        'val_accuracy_std': float(np.std(accuracies)),
+        'val_loss_mean': float(np.mean(losses)),
+        'val_loss_std': float(np.std(losses)),
+        'wall_time_seconds': round(time.perf_counter() - start, 2),
+        'status': 'ok',
+        'error': None
+    }
+
+
+class ResultsTable:
+    """Append-only trial results in SQLite or CSV, picked by file extension"""
+
+    def __init__(self, path):
+        self.path = path
+        self.is_csv = path.lower().endswith('.csv')
+        if self.is_csv:
+            if not os.path.exists(path):
+                with open(path, 'w', newline='') as f:
+                    csv.writer(f).writerow(RESULT_COLUMNS)
+        else:
+            with sqlite3.connect(path) as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sweep_trials ("
+                    "run_id TEXT, trial_id INTEGER, learning_rate REAL, dropout REAL, "
+                    "batch_size INTEGER, folds INTEGER, epochs INTEGER, "
+                    "val_accuracy_mean REAL, val_accuracy_std REAL, "
+                    "val_loss_mean REAL, val_loss_std REAL, wall_time_seconds REAL, "
+                    "status TEXT, error TEXT, created_at TEXT, "
+                    "PRIMARY KEY (run_id, trial_id))"
+                )
+
+    def add(self, row):
+        values = [row.get(column) for column in RESULT_COLUMNS]
+        if self.is_csv:
+            with open(self.path, 'a', newline='') as f:
+                csv.writer(f).writerow(values)
+        else:
+            with sqlite3.connect(self.path) as conn:
+                conn.execute(
+                    f"INSERT INTO sweep_trials ({', '.join(RESULT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in RESULT_COLUMNS)})",
+                    values
+                )
+
+
+def run_sweep(args):
+    """Run every trial and record the results as they complete"""
+    trials = build_trials(args)
+    data_dir = prepare_sweep_dataset(args.cache_dir, args.face_crops, args.manifest)
+    if data_dir is None:
+        print("Cannot run the sweep without a dataset")
+        return
+
+    # Download the ImageNet weights once instead of racing in every worker
+    from autism_detector import AutismDetector
+    AutismDetector(init_model=False).create_model()
+
+    threads = args.threads_per_trial or max(1, (os.cpu_count() or 1) // args.workers)
+    run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+    table = ResultsTable(args.results)
+    print(f"Sweep {run_id}: {len(trials)} trials, {args.folds} folds, "
+          f"{args.workers} workers x {threads} threads")
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'),
+                             initializer=_init_trial_worker, initargs=(threads,)) as pool:
+        futures = {
+            pool.submit(run_trial, trial_id, params, data_dir, args.folds, args.epochs, args.seed): (trial_id, params)
+            for trial_id, params in enumerate(trials)
+        }
+        for future in as_completed(futures):
+            trial_id, params = futures[future]
+            try:
+                metrics = future.result()
+            except Exception as e:
+                metrics = {'trial_id': trial_id, 'status': 'failed', 'error': str(e)}
+
+            row = dict(params, **metrics)
+            row.update({
+                'run_id': run_id,
+                'folds': args.folds,
+                'epochs': args.epochs,
+                'created_at': datetime.now().isoformat()
+            })
+            table.add(row)
+
+            if row['status'] == 'ok':
+                print(f"Trial {trial_id} {json.dumps(params)}: "
+                      f"val_acc={row['val_accuracy_mean']:.4f}±{row['val_accuracy_std']:.4f} "
+                      f"val_loss={row['val_loss_mean']:.4f} ({row['wall_time_seconds']}s)")
+            else:
+                print(f"Trial {trial_id} {json.dumps(params)} failed: {row['error']}")
+
+    print(f"\nResults saved to {args.results}")
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, ML_MODEL_DIR)
+    run_sweep(parse_args())
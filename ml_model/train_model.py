@@ -7,9 +7,10 @@ import numpy as np
 import cv2
 import os
 from pathlib import Path
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, StratifiedGroupKFold
 from sklearn.preprocessing import StandardScaler
 import pickle
+import argparse
 
 def load_images_from_folder(folder_path, img_size=(224, 224)):
     """
@@ -87,15 +88,57 @@ def load_images_from_folder(folder_path, img_size=(224, 224)):
     
     return np.array(images), np.array(labels)
 
+def load_images_from_manifest(manifest_path, img_size=(224, 224), drop_duplicates=True):
+    """
+    Load the images listed in a dedup manifest (see dedup.py)
+    
+    Returns images, labels and the near-duplicate group of every image.
+    """
+    from dedup import load_manifest
+    paths, labels, groups = load_manifest(manifest_path, drop_duplicates)
+    
+    images, keep = [], []
+    for i, img_path in enumerate(paths):
+        img = cv2.imread(img_path)
+        if img is None:
+            print(f"Warning: Could not read image {img_path}")
+            continue
+        img = cv2.resize(img, img_size)
+        images.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        keep.append(i)
+    
+    if len(images) == 0:
+        print("No images found in manifest!")
+        return None, None, None
+    
+    return np.array(images), labels[keep], groups[keep]
+
+def group_split(y, groups, test_size, seed=42):
+    """Stratified split that never puts members of one group on both sides"""
+    n_splits = max(2, int(round(1 / test_size)))
+    splitter = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    return next(splitter.split(np.zeros(len(y)), y, groups))
+
 def preprocess_images(images):
     """Normalize image pixel values for MobileNetV2"""
     # MobileNetV2 expects inputs in range [-1, 1]
     return (images.astype('float32') / 127.5) - 1.0
 
-def create_dataset(dataset_path='../dataset', test_size=0.2, val_size=0.1):
+def create_dataset(dataset_path='../dataset', test_size=0.2, val_size=0.1,
+                   use_face_crops=False, cache_dir=None, workers=None,
+                   manifest_path=None, drop_duplicates=True, return_groups=False,
+                   img_size=(224, 224)):
     """
     Create training, validation, and test datasets
     
+    With use_face_crops=True the images are the aligned face crops from the
+    face cache (see face_cache.py) instead of the whole resized photos.
+    
+    With a dedup manifest (see dedup.py) near-duplicates are dropped (unless
+    drop_duplicates=False) and the splits are group-aware, so near-duplicate
+    images never end up on both sides of a split. return_groups=True appends
+    the group ids of each split to the result.
+    
     Usage:
     X_train, X_val, X_test, y_train, y_val, y_test = create_dataset()
     """
@@ -106,8 +149,25 @@ def create_dataset(dataset_path='../dataset', test_size=0.2, val_size=0.1):
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         dataset_path = os.path.join(base_dir, 'dataset')
     
-    print(f"Loading images from {dataset_path}...")
-    X, y = load_images_from_folder(dataset_path)
+    groups = None
+    if use_face_crops:
+        from face_cache import build_face_cache
+        print(f"Loading face crops for {dataset_path}...")
+        cached = build_face_cache(dataset_path, cache_dir=cache_dir, img_size=img_size, workers=workers)
+        X, y = (cached[0], cached[2]) if cached is not None else (None, None)
+        if X is not None and manifest_path:
+            from dedup import load_manifest
+            paths, _, manifest_groups = load_manifest(manifest_path, drop_duplicates)
+            group_of = {os.path.abspath(p): g for p, g in zip(paths, manifest_groups)}
+            keep = [i for i, p in enumerate(cached[3]) if os.path.abspath(p) in group_of]
+            X, y = X[keep], y[keep]
+            groups = np.array([group_of[os.path.abspath(cached[3][i])] for i in keep])
+    elif manifest_path:
+        print(f"Loading images listed in {manifest_path}...")
+        X, y, groups = load_images_from_manifest(manifest_path, img_size=img_size, drop_duplicates=drop_duplicates)
+    else:
+        print(f"Loading images from {dataset_path}...")
+        X, y = load_images_from_folder(dataset_path, img_size=img_size)
     
     if X is None:
         print("Failed to load images. Please ensure dataset structure is correct:")
@@ -128,42 +188,163 @@ def create_dataset(dataset_path='../dataset', test_size=0.2, val_size=0.1):
     
     # Split into train+val and test
     print("Splitting dataset...")
-    X_temp, X_test, y_temp, y_test = train_test_split(
-        X, y, test_size=test_size, random_state=42, stratify=y
-    )
-    
-    # Split train+val into train and val
     val_size_adjusted = val_size / (1 - test_size)
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_temp, y_temp, test_size=val_size_adjusted, random_state=42, stratify=y_temp
-    )
+    if groups is not None:
+        print("Using group-aware splits from the dedup manifest")
+        temp_idx, test_idx = group_split(y, groups, test_size)
+        train_idx, val_idx = group_split(y[temp_idx], groups[temp_idx], val_size_adjusted)
+        train_idx, val_idx = temp_idx[train_idx], temp_idx[val_idx]
+        X_train, X_val, X_test = X[train_idx], X[val_idx], X[test_idx]
+        y_train, y_val, y_test = y[train_idx], y[val_idx], y[test_idx]
+        g_train, g_val, g_test = groups[train_idx], groups[val_idx], groups[test_idx]
+    else:
+        X_temp, X_test, y_temp, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=42, stratify=y
+        )
+        
+        # Split train+val into train and val
+        X_train, X_val, y_train, y_val = train_test_split(
+            X_temp, y_temp, test_size=val_size_adjusted, random_state=42, stratify=y_temp
+        )
+        g_train = g_val = g_test = None
     
     print(f"\nDataset split:")
     print(f"Training set: {len(X_train)} samples")
     print(f"Validation set: {len(X_val)} samples")
     print(f"Test set: {len(X_test)} samples")
     
+    if return_groups:
+        return X_train, X_val, X_test, y_train, y_val, y_test, g_train, g_val, g_test
     return X_train, X_val, X_test, y_train, y_val, y_test
 
-def train_model_script():
+def parse_args(argv=None):
+    """Command line options for the training script"""
+    parser = argparse.ArgumentParser(description='Train the autism detection model')
+    parser.add_argument('--face-crops', action='store_true',
+                        help='Train on aligned face crops from the face cache instead of whole photos')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Face cache directory (default: ml_model/face_cache)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Face detection worker processes (default: CPU count)')
+    parser.add_argument('--manifest', default=None,
+                        help='Dedup manifest from dedup.py for deduplicated, group-aware splits')
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help='Keep near-duplicates (still split group-aware)')
+    parser.add_argument('--input-size', type=int, default=None,
+                        help='Model input resolution, e.g. 96/128/160/224 (default: keep the current model)')
+    parser.add_argument('--alpha', type=float, default=None,
+                        help='MobileNetV2 width multiplier (default: keep the current model)')
+    parser.add_argument('--model-path', default=None,
+                        help='Where to save the model (default: ml_model/autism_model.h5)')
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Checkpoint directory (default: ml_model/checkpoints)')
+    parser.add_argument('--checkpoint-every', type=int, default=1,
+                        help='Write a checkpoint every N epochs')
+    parser.add_argument('--keep-best', type=int, default=3,
+                        help='Number of best checkpoints by val_loss to retain')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the latest checkpoint')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--jit-compile', action='store_true',
+                        help='Compile the training step with XLA')
+    parser.add_argument('--intra-op-threads', type=int, default=None,
+                        help='Threads used inside a single op (default: TensorFlow decides)')
+    parser.add_argument('--inter-op-threads', type=int, default=None,
+                        help='Ops run in parallel (default: TensorFlow decides)')
+    parser.add_argument('--mixed-precision', choices=['off', 'bf16'], default='off',
+                        help='bf16 uses mixed_bfloat16 if the CPU supports it')
+    parser.add_argument('--steps-per-execution', type=int, default=1,
+                        help='Training steps per compiled function call')
+    parser.add_argument('--throughput-report', default=None,
+                        help='Write a throughput report (JSON) to this path')
+    parser.add_argument('--parity-baseline', default=None,
+                        help='Throughput report whose test accuracy this run must match')
+    parser.add_argument('--parity-tolerance', type=float, default=0.01)
+    return parser.parse_args(argv)
+
+def train_model_script(args=None):
     """Script to train the model"""
     
     import sys
     # Add current directory to path to import autism_detector
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-    from autism_detector import AutismDetector
+    from autism_detector import AutismDetector, keras
+    from checkpoints import AsyncCheckpointer, restore_latest_checkpoint
+    from cpu_tuning import (configure_threads, enable_bfloat16,
+                            ThroughputCallback, write_throughput_report)
+    
+    if args is None:
+        args = parse_args([])
+    
+    # Thread pools have to be sized before TensorFlow runs its first op
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    use_bf16 = args.mixed_precision == 'bf16' and enable_bfloat16()
+    
+    # Initialize model
+    print("\nInitializing model...")
+    detector = AutismDetector(model_path=args.model_path)
+    # Recorded in the model sidecar so predict() feeds the same kind of input
+    detector.input_mode = 'face_crop' if args.face_crops else 'full_image'
+    
+    # Start a new model when a different resolution tier is requested
+    input_size = args.input_size or detector.input_size
+    alpha = args.alpha or detector.alpha
+    if input_size != detector.input_size or alpha != detector.alpha:
+        print(f"Creating a new {input_size}x{input_size} model (alpha={alpha})")
+        detector.create_model(input_size=input_size, alpha=alpha)
     
     # Create dataset
-    result = create_dataset()
+    result = create_dataset(
+        img_size=(input_size, input_size),
+        use_face_crops=args.face_crops,
+        cache_dir=args.cache_dir,
+        workers=args.workers,
+        manifest_path=args.manifest,
+        drop_duplicates=not args.keep_duplicates
+    )
     if result is None:
         print("Cannot proceed with training without dataset")
         return
     
     X_train, X_val, X_test, y_train, y_val, y_test = result
     
-    # Initialize model
-    print("\nInitializing model...")
-    detector = AutismDetector()
+    if use_bf16:
+        # A loaded model keeps its saved float32 policy, so rebuild it under
+        # the mixed policy and carry the weights over
+        weights = detector.model.get_weights()
+        detector.create_model(input_size=detector.input_size, alpha=detector.alpha)
+        try:
+            detector.model.set_weights(weights)
+        except ValueError:
+            print("Warning: Saved weights do not fit the rebuilt model, training from scratch")
+    
+    detector.compile_model(
+        jit_compile=args.jit_compile,
+        steps_per_execution=args.steps_per_execution
+    )
+    
+    initial_epoch = 0
+    previous_history = None
+    run_dir = None
+    if args.resume:
+        state = restore_latest_checkpoint(detector.model, args.checkpoint_dir)
+        if state is None:
+            print("No checkpoint found, starting a new run")
+        else:
+            initial_epoch = state['epoch']
+            previous_history = state['history']
+            run_dir = state['run_dir']
+    
+    checkpointer = AsyncCheckpointer(
+        checkpoint_dir=args.checkpoint_dir,
+        every_n_epochs=args.checkpoint_every,
+        keep_best=args.keep_best,
+        history=previous_history,
+        run_dir=run_dir
+    )
+    
+    throughput = ThroughputCallback(len(X_train))
     
     # Train model
     print("Training model...")
@@ -177,9 +358,10 @@ def train_model_script():
     history = detector.model.fit(
         X_train, y_train,
         validation_data=(X_val, y_val),
-        epochs=50,
-        batch_size=32,
-        callbacks=[early_stopping],
+        epochs=args.epochs,
+        initial_epoch=initial_epoch,
+        batch_size=args.batch_size,
+        callbacks=[checkpointer, early_stopping, throughput],
         verbose=1
     )
     
@@ -189,16 +371,42 @@ def train_model_script():
     print(f"Test Accuracy: {test_accuracy*100:.2f}%")
     print(f"Test Loss: {test_loss:.4f}")
     
-    # Save training history
+    # Save training history (including the epochs run before a resume)
     history_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training_history.pkl')
     with open(history_path, 'wb') as f:
-        pickle.dump(history.history, f)
+        pickle.dump(checkpointer.history, f)
+    
+    if args.throughput_report:
+        write_throughput_report(
+            args.throughput_report,
+            settings={
+                'jit_compile': args.jit_compile,
+                'intra_op_threads': args.intra_op_threads,
+                'inter_op_threads': args.inter_op_threads,
+                'mixed_precision': 'bf16' if use_bf16 else 'off',
+                'steps_per_execution': args.steps_per_execution,
+                'batch_size': args.batch_size
+            },
+            throughput=throughput.summary(),
+            test_accuracy=test_accuracy,
+            baseline_path=args.parity_baseline,
+            tolerance=args.parity_tolerance
+        )
+    
+    if use_bf16:
+        # Save a float32 model so inference doesn't depend on bf16 hardware
+        weights = detector.model.get_weights()
+        keras.mixed_precision.set_global_policy('float32')
+        detector.create_model(input_size=detector.input_size, alpha=detector.alpha)
+        detector.model.set_weights(weights)
     
     print("\nModel training complete!")
     # Ensure model is saved
     detector.save_model()
 
 if __name__ == '__main__':
+    args = parse_args()
+    
     print("=" * 50)
     print("Autism Detection Model - Training Pipeline")
     print("=" * 50)
@@ -215,7 +423,7 @@ if __name__ == '__main__':
         except ImportError:
             print("Warning: TensorFlow not found or import error.")
             
-        train_model_script()
+        train_model_script(args)
     except Exception as e:
         print(f"Error during training: {e}")
         import traceback
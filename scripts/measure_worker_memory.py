@@ -0,0 +1,125 @@
+"""
+Measure RSS/PSS per gunicorn worker with and without preloading the app
+
+Starts the backend under gunicorn twice (GUNICORN_PRELOAD=false, then true),
+waits for the workers to load the model and reads each process's memory
+from /proc/<pid>/smaps_rollup (Linux only). PSS splits shared pages between
+the processes that map them, so the PSS total is the real memory cost.
+
+Usage (from the project root):
+    python scripts/measure_worker_memory.py --workers 4
+    python scripts/measure_worker_memory.py --pid <gunicorn master pid>
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+
+def read_memory(pid):
+    """Rss, Pss and shared pages of a process in MB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'shared': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0)
+    }
+
+
+def child_pids(pid):
+    """Direct children of a process"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # The parent pid follows the ")" closing the command name
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def report(master_pid, label):
+    """Print the memory of the master and its workers; returns the PSS total"""
+    rows = [('master', master_pid, read_memory(master_pid))]
+    rows += [('worker', pid, read_memory(pid)) for pid in child_pids(master_pid)]
+
+    print(f"\n{label}")
+    print(f"{'process':<8} {'pid':>7} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10}")
+    for role, pid, memory in rows:
+        print(f"{role:<8} {pid:>7} {memory['rss']:>9.1f} {memory['pss']:>9.1f} {memory['shared']:>10.1f}")
+    total_pss = sum(memory['pss'] for _, _, memory in rows)
+    print(f"{'total':<8} {'':>7} {sum(m['rss'] for _, _, m in rows):>9.1f} {total_pss:>9.1f}")
+    return total_pss
+
+
+def wait_for_server(url, timeout):
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(1)
+    return False
+
+
+def measure(preload, args):
+    """Run gunicorn in one mode and report its memory once the workers are up"""
+    env = dict(os.environ,
+               GUNICORN_PRELOAD='true' if preload else 'false',
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_BIND=f'127.0.0.1:{args.port}')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_server(f'http://127.0.0.1:{args.port}/api/health', args.timeout):
+            print("Server did not start")
+            return None
+        # Every worker loads its model before serving, but they don't all
+        # finish at the same time
+        time.sleep(args.settle)
+        return report(server.pid, f"preload={'on' if preload else 'off'}, {args.workers} workers")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure gunicorn worker memory')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=int, default=300,
+                        help='Seconds to wait for the server to start')
+    parser.add_argument('--settle', type=int, default=20,
+                        help='Seconds to wait for all workers after the first response')
+    parser.add_argument('--pid', type=int, default=None,
+                        help='Only measure an already running gunicorn master')
+    args = parser.parse_args()
+
+    if args.pid:
+        report(args.pid, f"gunicorn master {args.pid}")
+        sys.exit(0)
+
+    before = measure(False, args)
+    after = measure(True, args)
+    if before and after:
+        print(f"\nTotal PSS: {before:.1f} MB -> {after:.1f} MB ({before - after:.1f} MB saved)")
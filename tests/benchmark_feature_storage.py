@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON text columns vs structured feature/recommendation tables
+
+Seeds two SQLite databases with the same assessments, one with
+facial_features/recommendations as JSON text (the old layout) and one with
+assessment_feature rows and links to shared recommendation rows (the
+layout after migration 2 in backend/migrations.py), then reports file size,
+the latency of reading an assessment page as GET /api/assessment/<id> does,
+and of averaging a child's eye contact:
+
+    python tests/benchmark_feature_storage.py --children 5000 --rows 40
+
+Standard library only. Recommendation texts are read from the
+get_*_recommendations functions of ml_model/autism_detector.py.
+"""
+
+import os
+import ast
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FEATURES = ('face_count', 'eye_contact', 'face_symmetry', 'expression_intensity', 'face_area_ratio', 'head_position')
+
+JSON_SCHEMA = """
+CREATE TABLE assessment (id INTEGER PRIMARY KEY, child_id INTEGER NOT NULL, assessment_date DATETIME,
+                         autism_score FLOAT, facial_features TEXT, status VARCHAR(20), image_path VARCHAR(500),
+                         recommendations TEXT);
+CREATE INDEX ix_assessment_child_date ON assessment (child_id, assessment_date, id);
+"""
+
+STRUCTURED_SCHEMA = JSON_SCHEMA + """
+CREATE TABLE assessment_feature (assessment_id INTEGER PRIMARY KEY, face_count INTEGER, eye_contact FLOAT,
+                                 face_symmetry FLOAT, expression_intensity FLOAT, face_area_ratio FLOAT,
+                                 head_position VARCHAR(20), confidence FLOAT, model_version VARCHAR(100));
+CREATE TABLE recommendation (id INTEGER PRIMARY KEY, text VARCHAR(1000) NOT NULL UNIQUE);
+CREATE TABLE assessment_recommendation (assessment_id INTEGER NOT NULL, position INTEGER NOT NULL,
+                                        recommendation_id INTEGER NOT NULL, PRIMARY KEY (assessment_id, position));
+"""
+
+
+def recommendation_texts():
+    """{status: recommendation list} from the detector source, without importing it"""
+    with open(os.path.join(ROOT_DIR, 'ml_model', 'autism_detector.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    texts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name.endswith('_recommendations'):
+            status = node.name[len('get_'):-len('_recommendations')]
+            texts[status] = [c.value for c in ast.walk(node)
+                             if isinstance(c, ast.Constant) and isinstance(c.value, str) and len(c.value) > 40]
+    return texts
+
+
+def make_assessments(children, rows):
+    texts = recommendation_texts()
+    for child_id in range(1, children + 1):
+        for i in range(rows):
+            status = random.choice(['positive', 'inconclusive', 'negative'])
+            features = {
+                'face_count': 1,
+                'eye_contact': random.random(),
+                'face_symmetry': random.random(),
+                'expression_intensity': random.random(),
+                'head_position': 'frontal',
+                'face_area_ratio': random.uniform(0.05, 0.6)
+            }
+            yield child_id, f'2025-01-01 00:{i // 60:02d}:{i % 60:02d}', random.random(), status, features, texts[status]
+
+
+def seed(json_conn, structured_conn, children, rows):
+    json_conn.executescript(JSON_SCHEMA)
+    structured_conn.executescript(STRUCTURED_SCHEMA)
+    recommendation_ids = {}
+    with json_conn, structured_conn:
+        for assessment_id, (child_id, date, score, status, features, recommendations) in enumerate(
+                make_assessments(children, rows), 1):
+            json_conn.execute(
+                "INSERT INTO assessment VALUES (?, ?, ?, ?, ?, ?, NULL, ?)",
+                (assessment_id, child_id, date, score, json.dumps(features), status, json.dumps(recommendations))
+            )
+            structured_conn.execute(
+                "INSERT INTO assessment VALUES (?, ?, ?, ?, NULL, ?, NULL, NULL)",
+                (assessment_id, child_id, date, score, status)
+            )
+            structured_conn.execute(
+                "INSERT INTO assessment_feature VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (assessment_id, *(features[name] for name in FEATURES), abs(score - 0.5) * 2, 'v1')
+            )
+            for position, text in enumerate(recommendations):
+                if text not in recommendation_ids:
+                    recommendation_ids[text] = structured_conn.execute(
+                        "INSERT INTO recommendation (text) VALUES (?)", (text,)
+                    ).lastrowid
+                structured_conn.execute("INSERT INTO assessment_recommendation VALUES (?, ?, ?)",
+                                        (assessment_id, position, recommendation_ids[text]))
+    for conn in (json_conn, structured_conn):
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+
+
+def read_json_page(conn, child_id):
+    rows = conn.execute(
+        "SELECT id, assessment_date, autism_score, status, facial_features, recommendations FROM assessment "
+        "WHERE child_id = ? ORDER BY assessment_date DESC, id DESC LIMIT 51", (child_id,)
+    ).fetchall()
+    return [{'id': r[0], 'date': r[1], 'score': r[2], 'status': r[3],
+             'facial_features': json.loads(r[4]), 'recommendations': json.loads(r[5])} for r in rows]
+
+
+def read_structured_page(conn, child_id):
+    # The statements of Assessment.query with the joined features and selectin links
+    rows = conn.execute(
+        f"SELECT a.id, a.assessment_date, a.autism_score, a.status, {', '.join('f.' + n for n in FEATURES)} "
+        "FROM assessment a LEFT JOIN assessment_feature f ON f.assessment_id = a.id "
+        "WHERE a.child_id = ? ORDER BY a.assessment_date DESC, a.id DESC LIMIT 51", (child_id,)
+    ).fetchall()
+    ids = [r[0] for r in rows]
+    links = {}
+    for assessment_id, text in conn.execute(
+            f"SELECT l.assessment_id, r.text FROM assessment_recommendation l "
+            f"JOIN recommendation r ON r.id = l.recommendation_id "
+            f"WHERE l.assessment_id IN ({', '.join('?' for _ in ids)}) ORDER BY l.assessment_id, l.position", ids):
+        links.setdefault(assessment_id, []).append(text)
+    return [{'id': r[0], 'date': r[1], 'score': r[2], 'status': r[3],
+             'facial_features': {name: value for name, value in zip(FEATURES, r[4:]) if value is not None},
+             'recommendations': links.get(r[0], [])} for r in rows]
+
+
+def json_eye_contact(conn, child_id):
+    values = [json.loads(r[0])['eye_contact']
+              for r in conn.execute("SELECT facial_features FROM assessment WHERE child_id = ?", (child_id,))]
+    return sum(values) / len(values)
+
+
+def structured_eye_contact(conn, child_id):
+    return conn.execute(
+        "SELECT AVG(f.eye_contact) FROM assessment a JOIN assessment_feature f ON f.assessment_id = a.id "
+        "WHERE a.child_id = ?", (child_id,)
+    ).fetchone()[0]
+
+
+def mean_ms(function, conn, children, samples):
+    rng = random.Random(1)
+    begin = time.perf_counter()
+    for _ in range(samples):
+        function(conn, rng.randint(1, children))
+    return (time.perf_counter() - begin) * 1000 / samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Assessment storage size and read latency by layout')
+    parser.add_argument('--children', type=int, default=2000)
+    parser.add_argument('--rows', type=int, default=40, help='Assessments per child')
+    parser.add_argument('--samples', type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(0)
+    directory = tempfile.mkdtemp(prefix='feature-bench-')
+    json_path, structured_path = os.path.join(directory, 'json.db'), os.path.join(directory, 'structured.db')
+    json_conn, structured_conn = sqlite3.connect(json_path), sqlite3.connect(structured_path)
+    seed(json_conn, structured_conn, args.children, args.rows)
+    print(f"{args.children * args.rows} assessments ({directory})\n")
+
+    if read_json_page(json_conn, 1) != read_structured_page(structured_conn, 1):
+        raise SystemExit("⚠ The two layouts return different pages")
+
+    rows = [
+        ('database size (MB)', os.path.getsize(json_path) / 1e6, os.path.getsize(structured_path) / 1e6),
+        ('assessment page read (ms)', mean_ms(read_json_page, json_conn, args.children, args.samples),
+         mean_ms(read_structured_page, structured_conn, args.children, args.samples)),
+        ('mean eye contact of a child (ms)', mean_ms(json_eye_contact, json_conn, args.children, args.samples),
+         mean_ms(structured_eye_contact, structured_conn, args.children, args.samples)),
+    ]
+    print(f"  {'':<34} {'JSON text':>12} {'structured':>12}")
+    for name, json_value, structured_value in rows:
+        print(f"  {name:<34} {json_value:>12.3f} {structured_value:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
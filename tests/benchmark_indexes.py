@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark: list-endpoint queries before and after the index migration
+
+Seeds a SQLite database shaped like the backend's tables (without the
+indexes), times the queries the list endpoints run for random users and
+children, applies the statements of backend/migrations.py and times them
+again:
+
+    python tests/benchmark_indexes.py --users 20000 --children 2 --rows 25
+
+Standard library only; the database is a temporary file unless --db is given.
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from migrations import MIGRATIONS
+
+INDEX_MIGRATION = 1
+
+SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(120) UNIQUE NOT NULL, full_name VARCHAR(255));
+CREATE TABLE child (id INTEGER PRIMARY KEY, parent_id INTEGER NOT NULL REFERENCES user (id),
+                    name VARCHAR(255), age INTEGER, gender VARCHAR(10), created_at DATETIME);
+CREATE TABLE assessment (id INTEGER PRIMARY KEY, child_id INTEGER NOT NULL REFERENCES child (id),
+                         assessment_date DATETIME, autism_score FLOAT, facial_features TEXT,
+                         status VARCHAR(20), image_path VARCHAR(500), recommendations TEXT);
+CREATE TABLE note (id INTEGER PRIMARY KEY, child_id INTEGER NOT NULL REFERENCES child (id),
+                   created_at DATETIME, note_type VARCHAR(50), content TEXT);
+CREATE TABLE chat_message (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id),
+                           message TEXT, response TEXT, created_at DATETIME);
+"""
+
+# What the endpoints run, by name; parameters are filled in per call
+QUERIES = {
+    'children (GET /api/children)':
+        "SELECT child.id, (SELECT COUNT(assessment.id) FROM assessment WHERE assessment.child_id = child.id) "
+        "FROM child WHERE child.parent_id = :user",
+    'assessment page (GET /api/assessment/<id>)':
+        "SELECT * FROM assessment WHERE child_id = :child ORDER BY assessment_date DESC, id DESC LIMIT 51",
+    'notes (GET /api/children/<id>)':
+        "SELECT * FROM note WHERE child_id = :child",
+    'chat page (GET /api/chat/history)':
+        "SELECT * FROM chat_message WHERE user_id = :user ORDER BY created_at DESC, id DESC LIMIT 51",
+}
+
+
+def seed(conn, users, children, rows):
+    """Users with children, each with rows assessments and notes, and rows chat messages"""
+    start = datetime(2024, 1, 1)
+    stamp = lambda: (start + timedelta(minutes=random.randrange(1_000_000))).isoformat(sep=' ')
+    conn.executescript(SCHEMA)
+    with conn:
+        conn.executemany("INSERT INTO user (id, email, full_name) VALUES (?, ?, ?)",
+                         ((u, f'user{u}@example.com', f'User {u}') for u in range(1, users + 1)))
+        conn.executemany("INSERT INTO child (id, parent_id, name, age, created_at) VALUES (?, ?, ?, 4, ?)",
+                         ((c, (c - 1) // children + 1, f'Child {c}', stamp()) for c in range(1, users * children + 1)))
+        child_ids = range(1, users * children + 1)
+        # Interleaved as real traffic would be, not grouped by child
+        assessment_rows = [(random.choice(child_ids), stamp()) for _ in range(len(child_ids) * rows)]
+        conn.executemany("INSERT INTO assessment (child_id, assessment_date, autism_score, status, facial_features, "
+                         "recommendations) VALUES (?, ?, 0.4, 'negative', '{}', '[]')", assessment_rows)
+        conn.executemany("INSERT INTO note (child_id, created_at, note_type, content) VALUES (?, ?, 'observation', 'x')",
+                         ((random.choice(child_ids), stamp()) for _ in range(len(child_ids) * rows)))
+        conn.executemany("INSERT INTO chat_message (user_id, message, response, created_at) VALUES (?, 'q', 'a', ?)",
+                         ((random.randint(1, users), stamp()) for _ in range(users * rows)))
+    conn.execute("ANALYZE")
+
+
+def time_queries(conn, users, children, samples):
+    """Mean and p95 latency (ms) per query over random users/children"""
+    results = {}
+    for name, sql in QUERIES.items():
+        latencies = []
+        for _ in range(samples):
+            params = {'user': random.randint(1, users), 'child': random.randint(1, users * children)}
+            begin = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            latencies.append((time.perf_counter() - begin) * 1000)
+        latencies.sort()
+        results[name] = (sum(latencies) / len(latencies), latencies[int(0.95 * (len(latencies) - 1))])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List query latency before and after the index migration')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--children', type=int, default=2, help='Children per user')
+    parser.add_argument('--rows', type=int, default=20, help='Assessments and notes per child, chat messages per user')
+    parser.add_argument('--samples', type=int, default=200, help='Timed calls per query')
+    parser.add_argument('--db', help='Database file to create (default: a temporary file)')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='index-bench-'), 'bench.db')
+    if os.path.exists(path):
+        raise SystemExit(f"{path} already exists")
+    conn = sqlite3.connect(path)
+    random.seed(0)
+
+    begin = time.perf_counter()
+    seed(conn, args.users, args.children, args.rows)
+    print(f"Seeded {args.users} users, {args.users * args.children} children, "
+          f"{args.users * args.children * args.rows} assessments/notes in {time.perf_counter() - begin:.1f}s ({path})\n")
+
+    before = time_queries(conn, args.users, args.children, args.samples)
+    begin = time.perf_counter()
+    with conn:
+        for version, _, statements in MIGRATIONS:
+            if version == INDEX_MIGRATION:
+                for statement in statements:
+                    conn.execute(statement)
+    conn.execute("ANALYZE")
+    print(f"Index migration applied in {time.perf_counter() - begin:.1f}s\n")
+    after = time_queries(conn, args.users, args.children, args.samples)
+
+    print(f"  {'query':<44} {'before mean/p95 ms':>20} {'after mean/p95 ms':>20}")
+    for name in QUERIES:
+        print(f"  {name:<44} {before[name][0]:>9.3f}/{before[name][1]:<10.3f} {after[name][0]:>9.3f}/{after[name][1]:<10.3f}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
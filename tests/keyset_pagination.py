@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination check for the chat history and assessment list endpoints
+
+Seeds an in-memory database with chat messages and assessments that all
+share one timestamp, half of them written the way CURRENT_TIMESTAMP did
+('YYYY-MM-DD HH:MM:SS', no microseconds), applies the migrations and pages
+through both endpoints with a small limit. Every row must come back exactly
+once and the last page must have no next_cursor.
+
+    python tests/keyset_pagination.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Testing config (in-memory database), no model load, scratch job/image/analysis stores
+scratch = tempfile.mkdtemp(prefix='keyset-pagination-')
+os.environ['FLASK_ENV'] = 'testing'
+os.environ['DEFER_MODEL_LOAD'] = 'true'
+os.environ['JOB_QUEUE_PATH'] = os.path.join(scratch, 'jobs.db')
+os.environ['IMAGE_STORE_DIR'] = os.path.join(scratch, 'images')
+os.environ['ANALYSIS_CACHE_DIR'] = os.path.join(scratch, 'analyses')
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import text
+from flask_jwt_extended import create_access_token
+from app import app, db, Assessment, ChatMessage, User, Child
+from migrations import migrate
+
+ROWS = 7
+LIMIT = 3
+SHARED = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def seed():
+    user = User(email='pages@example.com', full_name='Pages')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    child = Child(parent_id=user.id, name='Child', age=4)
+    db.session.add(child)
+    db.session.flush()
+    for i in range(ROWS):
+        db.session.add(ChatMessage(user_id=user.id, message=f'q{i}', response='a', created_at=SHARED))
+        db.session.add(Assessment(child_id=child.id, assessment_date=SHARED, autism_score=0.4, status='negative'))
+    # Rows as a database default stored them before the timestamps were set in Python
+    for i in range(ROWS):
+        db.session.execute(text(
+            "INSERT INTO chat_message (user_id, message, response, created_at) "
+            "VALUES (:user, :message, 'a', '2025-01-01 12:00:00')"
+        ), {'user': user.id, 'message': f'legacy {i}'})
+        db.session.execute(text(
+            "INSERT INTO assessment (child_id, assessment_date, autism_score, status) "
+            "VALUES (:child, '2025-01-01 12:00:00', 0.4, 'negative')"
+        ), {'child': child.id})
+    db.session.commit()
+    return user.id, child.id
+
+
+def page_through(client, path, key, token):
+    """Ids of every page, newest page first; stops after more pages than rows"""
+    ids, cursor = [], None
+    for _ in range(2 * ROWS + 1):
+        query = f'?limit={LIMIT}' + (f'&before={cursor}' if cursor else '')
+        response = client.get(path + query, headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200, f'{path}: {response.status_code} {response.get_data(as_text=True)}'
+        body = response.get_json()
+        ids += [row['id'] for row in body[key]]
+        cursor = body['next_cursor']
+        if not cursor:
+            return ids, True
+    return ids, False
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        user_id, child_id = seed()
+        migrate(db.engine)
+        token = create_access_token(identity=str(user_id))
+
+        expected = {
+            'chat history': set(m.id for m in ChatMessage.query.filter_by(user_id=user_id)),
+            'assessments': set(a.id for a in Assessment.query.filter_by(child_id=child_id)),
+        }
+        failed = False
+        client = app.test_client()
+        for name, path, key in (('chat history', '/api/chat/history', 'messages'),
+                                ('assessments', f'/api/assessment/{child_id}', 'assessments')):
+            ids, finished = page_through(client, path, key, token)
+            if finished and len(ids) == len(set(ids)) and set(ids) == expected[name]:
+                print(f"✓ {name:<13} {len(ids)} rows sharing one timestamp, each returned once")
+            else:
+                failed = True
+                print(f"⚠ {name:<13} {len(ids)} rows returned for {len(expected[name])}, "
+                      f"{len(ids) - len(set(ids))} repeated{'' if finished else ', cursor never ended'}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Load test: interactive latency while a large batch is running
+
+Simulated mode (default) runs the analysis slots of ml_model/scheduler.py
+with a fixed service time per image, once with plain first-come slots and
+once with priority lanes, and prints interactive p50/p95 latency with and
+without a batch flood:
+
+    python tests/load_test_priority.py
+
+HTTP mode measures a running backend instead: it floods /api/analyze/jobs
+with the image and times /api/analyze requests meanwhile:
+
+    python tests/load_test_priority.py --url http://localhost:5000 --token <JWT> --image face.jpg
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml_model'))
+from scheduler import BATCH, INTERACTIVE, PriorityScheduler
+
+
+class FifoSlots:
+    """The analysis path without lanes: one shared pool of slots"""
+
+    def __init__(self, concurrency):
+        self._slots = threading.Semaphore(concurrency)
+
+    def slot(self, lane):
+        return self._slots
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    pick = lambda q: latencies[int(q * (len(latencies) - 1))]
+    return f"p50 {pick(0.5):7.1f} ms   p95 {pick(0.95):7.1f} ms   (n={len(latencies)})"
+
+
+def simulate(slots, service_ms, interactive_rate, duration, batch_size):
+    """Interactive latencies (ms) with batch_size batch images queued at the start"""
+    def analyze(lane):
+        start = time.perf_counter()
+        with slots.slot(lane):
+            time.sleep(service_ms / 1000.0)
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=batch_size + 64) as pool:
+        # Bulk screening submits everything at once
+        batch = [pool.submit(analyze, BATCH) for _ in range(batch_size)]
+
+        interactive = []
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            interactive.append(pool.submit(analyze, INTERACTIVE))
+            time.sleep(random.expovariate(interactive_rate))
+        latencies = [future.result() for future in interactive]
+        for future in batch:
+            future.result()
+    return latencies
+
+
+def run_simulation(args):
+    print(f"{args.concurrency} slots, {args.service_ms:.0f} ms per image, "
+          f"{args.rate:.1f} interactive req/s for {args.duration:.0f}s\n")
+    scenarios = [
+        ('No batch', lambda: PriorityScheduler(args.concurrency), 0),
+        ('Batch, first-come slots', lambda: FifoSlots(args.concurrency), args.batch_size),
+        ('Batch, priority lanes', lambda: PriorityScheduler(args.concurrency, caps={BATCH: args.batch_cap}),
+         args.batch_size),
+    ]
+    for name, make_slots, batch_size in scenarios:
+        latencies = simulate(make_slots(), args.service_ms, args.rate, args.duration, batch_size)
+        print(f"  {name:<26} {percentiles(latencies)}")
+
+
+def _multipart(image_bytes, filename):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + image_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def run_http(args):
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+    body, content_type = _multipart(image_bytes, os.path.basename(args.image))
+
+    def post(path, headers=None):
+        request = urllib.request.Request(args.url + path, data=body, method='POST', headers={
+            'Authorization': f'Bearer {args.token}', 'Content-Type': content_type, **(headers or {})
+        })
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+        return (time.perf_counter() - start) * 1000
+
+    def interactive_latencies():
+        latencies = []
+        end = time.monotonic() + args.duration
+        while time.monotonic() < end:
+            latencies.append(post('/api/analyze'))
+            time.sleep(random.expovariate(args.rate))
+        return latencies
+
+    print(f"Interactive /api/analyze at ~{args.rate:.1f} req/s for {args.duration:.0f}s\n")
+    print(f"  {'No batch':<26} {percentiles(interactive_latencies())}")
+    for _ in range(args.batch_size):
+        # A distinct key per job so the queue doesn't collapse the duplicates
+        post('/api/analyze/jobs', {'Idempotency-Key': uuid.uuid4().hex})
+    print(f"  {f'{args.batch_size} batch jobs queued':<26} {percentiles(interactive_latencies())}")
+
+    if args.admin_token:
+        request = urllib.request.Request(args.url + '/api/admin/jobs', headers={'X-Admin-Token': args.admin_token})
+        with urllib.request.urlopen(request) as response:
+            print(json.dumps(json.loads(response.read())['lanes'], indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Interactive latency under a batch flood')
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--service-ms', type=float, default=50.0)
+    parser.add_argument('--rate', type=float, default=5.0, help='Interactive requests per second')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--batch-cap', type=int, default=1)
+    parser.add_argument('--url', help='Measure a running backend instead of the simulation')
+    parser.add_argument('--token', help='JWT for --url')
+    parser.add_argument('--admin-token', help='ADMIN_TOKEN, to print lane stats for --url')
+    parser.add_argument('--image')
+    args = parser.parse_args()
+
+    if args.url:
+        run_http(args)
+    else:
+        run_simulation(args)
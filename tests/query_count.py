@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Query-count check for the profile, children and analytics endpoints
+
+Seeds users with growing numbers of children, assessments and notes in an
+in-memory database, calls each endpoint through the Flask test client and
+counts the SQL statements it runs. The profile and children endpoints of
+backend/fastapi_experimental are checked the same way through FastAPI's
+TestClient, on a scratch SQLite file. Every endpoint must run the same
+number of statements however much data the user has (no per-row queries).
+
+    python tests/query_count.py
+"""
+
+import os
+import sys
+import tempfile
+
+# Testing config (in-memory database), no model load, scratch job/image stores
+scratch = tempfile.mkdtemp(prefix='query-count-')
+os.environ['FLASK_ENV'] = 'testing'
+os.environ['DEFER_MODEL_LOAD'] = 'true'
+os.environ['JOB_QUEUE_PATH'] = os.path.join(scratch, 'jobs.db')
+os.environ['IMAGE_STORE_DIR'] = os.path.join(scratch, 'images')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch, 'fastapi.db')
+# Neither app loads the model in-process; the socket is never connected to
+os.environ['INFERENCE_SOCKET'] = os.path.join(scratch, 'inference.sock')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import app, db, new_assessment, User, Child, Note
+
+# (children, assessments per child) per seeded user
+SIZES = [(1, 1), (5, 3), (25, 10)]
+
+
+def seed(index, children, assessments):
+    user = User(email=f'user{index}@example.com', full_name=f'User {index}')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    for c in range(children):
+        child = Child(parent_id=user.id, name=f'Child {c}', age=4)
+        db.session.add(child)
+        db.session.flush()
+        for a in range(assessments):
+            # Through the save path, so features, recommendations and the summary exist
+            db.session.add(new_assessment(child.id, 0.4, 'negative', {'eye_contact': 0.6, 'face_symmetry': 0.8},
+                                          ['Continue regular developmental check-ups.'], confidence=0.2))
+            db.session.add(Note(child_id=child.id, note_type='observation', content=f'Note {a}'))
+    db.session.commit()
+    return user.id, child.id
+
+
+def count_statements(client, path, token, engine=None):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    engine = engine or db.engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path, headers={'Authorization': f'Bearer {token}'})
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200, f'{path}: {response.status_code} {response.text}'
+    return len(statements)
+
+
+def check(name, counts):
+    """Print one endpoint's counts; True if they grow with the data"""
+    sizes = ', '.join(f'{c}x{a}: {n}' for (c, a), n in zip(SIZES, counts))
+    if len(set(counts)) == 1:
+        print(f"✓ {name:<22} {counts[0]} statements ({sizes})")
+        return False
+    print(f"⚠ {name:<22} statement count grows with data ({sizes})")
+    return True
+
+
+def seed_fastapi(session, index, children, assessments):
+    from backend.fastapi_experimental import models
+    from backend.fastapi_experimental.routers.assessments import build_assessment
+
+    user = models.User(email=f'user{index}@example.com', full_name=f'User {index}', password_hash='x')
+    session.add(user)
+    session.flush()
+    for c in range(children):
+        child = models.Child(parent_id=user.id, name=f'Child {c}', age=4)
+        session.add(child)
+        session.flush()
+        for a in range(assessments):
+            session.add(build_assessment(session, child.id, 0.4, 'negative',
+                                         {'eye_contact': 0.6, 'face_symmetry': 0.8},
+                                         ['Continue regular developmental check-ups.']))
+            session.add(models.Note(child_id=child.id, note_type='observation', content=f'Note {a}'))
+    session.commit()
+    return user.id, child.id
+
+
+def check_fastapi():
+    """The same check for the FastAPI profile and children routers"""
+    from fastapi.testclient import TestClient
+    from backend.fastapi_experimental.main import app as fastapi_app
+    from backend.fastapi_experimental.database import SessionLocal, engine
+    from backend.fastapi_experimental.dependencies import create_access_token as fastapi_token
+
+    session = SessionLocal()
+    try:
+        users = [seed_fastapi(session, i, children, assessments) for i, (children, assessments) in enumerate(SIZES)]
+    finally:
+        session.close()
+
+    endpoints = {
+        'fastapi profile': lambda child_id: '/api/auth/profile',
+        'fastapi children': lambda child_id: '/api/children/',
+        'fastapi child details': lambda child_id: f'/api/children/{child_id}',
+    }
+    failed = False
+    client = TestClient(fastapi_app)
+    for name, path in endpoints.items():
+        # Every request gets a fresh session from get_db
+        counts = [count_statements(client, path(child_id), fastapi_token({'sub': str(user_id)}), engine)
+                  for user_id, child_id in users]
+        failed = check(name, counts) or failed
+    return failed
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        users = [seed(i, children, assessments) for i, (children, assessments) in enumerate(SIZES)]
+
+        endpoints = {
+            'profile': lambda child_id: '/api/auth/profile',
+            'children': lambda child_id: '/api/children',
+            'child details': lambda child_id: f'/api/children/{child_id}',
+            'assessments': lambda child_id: f'/api/assessment/{child_id}',
+            'chat history': lambda child_id: '/api/chat/history',
+            'analytics': lambda child_id: '/api/analytics/children',
+            'child analytics': lambda child_id: f'/api/analytics/children/{child_id}',
+        }
+
+        failed = False
+        client = app.test_client()
+        for name, path in endpoints.items():
+            counts = []
+            for user_id, child_id in users:
+                # Fresh session so relationships loaded by earlier calls aren't reused
+                db.session.remove()
+                counts.append(count_statements(client, path(child_id), create_access_token(identity=str(user_id))))
+            failed = check(name, counts) or failed
+    failed = check_fastapi() or failed
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())